@@ -0,0 +1,187 @@
+"""
+Module containing the CSV exports of clients, contracts and insured events. Rows are read in chunks by the primary key
+(keyset pagination), so the memory stays flat regardless of the number of exported rows, and each chunk is written out
+before the next one is read. The exports honour the filters of the corresponding list views.
+"""
+import csv
+import io
+from typing import Iterator
+
+from django.db import router
+from django.db.models import QuerySet
+
+from administration import forms
+from insurance_app import models, search
+
+CHUNK_SIZE: int = 2000
+# beginnings of a text which a spreadsheet runs as a formula, the text is prefixed by an apostrophe
+FORMULA_PREFIXES: tuple = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Export:
+    """
+    Base class of an export. Subclasses define the columns as pairs of the header and the field for values_list().
+    """
+    model: type = None
+    columns: tuple = ()
+    filename: str = ''
+
+    def __init__(self, params: dict | None = None) -> None:
+        """
+        :param dict params: filters with the same names as the GET parameters of the list view
+        """
+        self.params: dict = params or {}
+        self.count: int = 0  # rows exported so far
+        # the database is chosen now, the rows are streamed after the view returned
+        self.using: str = router.db_for_read(self.model)
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Return the queryset of the exported objects filtered by the params
+        :return QuerySet:
+        :raises ValueError: if a filter is invalid
+        """
+        return self.model.objects.all()
+
+    def format_row(self, row: tuple) -> list:
+        """
+        Return the CSV row of the values of the fields. The texts entered by the clients are escaped, so a spreadsheet
+        doesn't run them as formulas.
+        :param tuple row:
+        :return list:
+        """
+        return [
+            int(value) if isinstance(value, bool)
+            else f"'{value}" if isinstance(value, str) and value.startswith(FORMULA_PREFIXES)
+            else value
+            for value in row
+        ]
+
+    def rows(self, chunk_size: int = CHUNK_SIZE) -> Iterator[list[list]]:
+        """
+        Return an iterator of the chunks of the CSV rows, the header is not included
+        :param int chunk_size:
+        :return Iterator:
+        """
+        fields = [field for _, field in self.columns]
+        queryset = self.get_queryset().using(self.using).order_by('pk').values_list('pk', *fields)
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                return
+            last_pk = chunk[-1][0]
+            self.count += len(chunk)
+            yield [self.format_row(row[1:]) for row in chunk]
+
+    def stream(self, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+        """
+        Return an iterator of the CSV text, one piece per chunk of rows
+        :param int chunk_size:
+        :return Iterator:
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([header for header, _ in self.columns])
+        for chunk in self.rows(chunk_size):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class ClientExport(Export):
+    """
+    Export of the clients, filtered by the search query 'q' like ClientListView
+    """
+    model = models.Person
+    filename = 'klienti.csv'
+    columns = (
+        ('id', 'pk'),
+        ('email', 'email'),
+        ('last_name', 'last_name'),
+        ('first_name', 'first_name'),
+        ('date_of_birth', 'date_of_birth'),
+        ('phone', 'phone'),
+        ('address1', 'address1'),
+        ('address2', 'address2'),
+        ('postal_code', 'postal_code'),
+        ('city', 'city'),
+        ('country', 'country'),
+    )
+
+    def get_queryset(self) -> QuerySet:
+        queryset = models.Person.objects.filter(is_staff=False)
+        query = (self.params.get('q') or '').strip()
+        if query:
+            queryset = search.search(queryset, query)
+        return queryset
+
+
+class ContractExport(Export):
+    """
+    Export of the contracts with their contract numbers, filtered by the client ('client', like ContractsListView) and
+    the product ('product')
+    """
+    model = models.Contract
+    filename = 'smlouvy.csv'
+    columns = (
+        ('contract_number', 'contract_number'),
+        ('product', 'product__name'),
+        ('client_id', 'insured_id'),
+        ('client_email', 'insured__email'),
+        ('conclusion_date', 'conclusion_date'),
+        ('payment', 'payment'),
+    )
+
+    def get_queryset(self) -> QuerySet:
+        queryset = models.Contract.objects.all()
+        for param, field in (('client', 'insured_id'), ('product', 'product_id')):
+            value = self.params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{field: int(value)})
+                except ValueError:
+                    raise ValueError(f"Invalid {param} '{value}'")
+        return queryset
+
+
+class EventExport(Export):
+    """
+    Export of the insured events filtered like the event queues: by the product and the age of the report
+    (EventQueueFilterForm) and by 'processed' (1 for processed, 0 for pending, all by default)
+    """
+    model = models.InsuredEvent
+    filename = 'pojistne-udalosti.csv'
+    columns = (
+        ('id', 'pk'),
+        ('contract_number', 'contract__contract_number'),
+        ('product', 'contract__product__name'),
+        ('client_email', 'contract__insured__email'),
+        ('event_date', 'event_date'),
+        ('reporting_date', 'reporting_date'),
+        ('processed', 'processed'),
+        ('approved', 'approved'),
+        ('payout', 'payout'),
+        ('description', 'description'),
+    )
+
+    def get_queryset(self) -> QuerySet:
+        form = forms.EventQueueFilterForm(self.params)
+        if not form.is_valid():
+            raise ValueError('; '.join(f"{field}: {' '.join(errors)}" for field, errors in form.errors.items()))
+        queryset = form.filter(models.InsuredEvent.objects.all())
+        processed = self.params.get('processed')
+        if processed in ('0', '1'):
+            queryset = queryset.filter(processed=processed == '1')
+        elif processed:
+            raise ValueError(f"Invalid processed '{processed}'")
+        return queryset
+
+
+EXPORTS: dict[str, type[Export]] = {
+    'clients': ClientExport,
+    'contracts': ContractExport,
+    'events': EventExport,
+}
@@ -2,13 +2,33 @@
 Module containing form classes of the administration app
 """
 
+import datetime
+from functools import partial
+
 from django import forms
-from django.db.models import Model
+from django.db import transaction
+from django.db.models import Model, QuerySet
 
-from insurance_app import models
+from insurance_app import images, models
 
 
-class ProductCreateForm(forms.ModelForm):
+class ProductForm(forms.ModelForm):
+    """
+    Base form of the insurance products, schedules creating the responsive derivatives of an uploaded image
+    """
+    def save(self, commit: bool = True) -> models.Product:
+        """
+        Save the product. If a new image was uploaded, its derivatives are created in the background after the commit.
+        :param bool commit:
+        :return Product:
+        """
+        product = super().save(commit=commit)
+        if commit and 'image' in self.changed_data:
+            transaction.on_commit(partial(images.schedule, product.pk))
+        return product
+
+
+class ProductCreateForm(ProductForm):
     """
     Form for creating new insurance product.
     """
@@ -17,7 +37,7 @@ class ProductCreateForm(forms.ModelForm):
         fields: forms.Field = ['name', 'description', 'image']
 
 
-class ProductUpdateForm(forms.ModelForm):
+class ProductUpdateForm(ProductForm):
     """
     Form for updating an insurance product.
     """
@@ -35,3 +55,134 @@ class EventApproveForm(forms.ModelForm):
     class Meta:
         model = models.InsuredEvent
         fields = ['payout']
+
+
+class IdListField(forms.Field):
+    """
+    Field of a list of primary keys sent as repeated values of one name, e.g. by checkboxes
+    """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value) -> list[int]:
+        if not value:
+            return []
+        try:
+            return [int(pk) for pk in value]
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Neplatný výběr", code='invalid')
+
+
+class EventBulkForm(forms.Form):
+    """
+    Form for approving or rejecting many pending insured events at once: the events selected on the page, each with
+    its own payout (field payout-<pk>) or the uniform payout, or all pending events matching the filter of the queue
+    (the fields of EventQueueFilterForm) with the uniform payout.
+    """
+    scope = forms.ChoiceField(
+        choices=(('selected', 'Vybrané události'), ('filter', 'Všechny události odpovídající filtru')),
+        initial='selected', widget=forms.RadioSelect(), label='Rozsah'
+    )
+    events = IdListField(required=False)
+    approve = forms.ChoiceField(choices=((1, 'Schválit'), (0, 'Zamítnout')), widget=forms.RadioSelect(), label="")
+    payout = forms.IntegerField(required=False, min_value=1, label='Pojistné plnění')  # an approval needs a payout
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.filter_form: EventQueueFilterForm = EventQueueFilterForm(self.data)
+
+    def clean(self) -> dict:
+        """
+        Validate the scope and the payouts of the approved events and collect the individual payouts
+        :return dict:
+        """
+        cleaned_data = super().clean()
+        cleaned_data['payouts'] = {}
+        if self.errors:
+            return cleaned_data
+        if cleaned_data['scope'] == 'filter':
+            if not self.filter_form.is_valid():
+                raise forms.ValidationError("Neplatný filtr událostí", code='invalid_filter')
+            missing = cleaned_data['payout'] is None
+        else:
+            if not cleaned_data['events']:
+                self.add_error('events', "Vyberte alespoň jednu událost")
+                return cleaned_data
+            cleaned_data['payouts'] = self._payouts(cleaned_data['events'])
+            missing = cleaned_data['payout'] is None and len(cleaned_data['payouts']) < len(cleaned_data['events'])
+        if int(cleaned_data['approve']) and missing:
+            self.add_error('payout', "Pro schválení je nutné zadat pojistné plnění")
+        return cleaned_data
+
+    def _payouts(self, pks: list[int]) -> dict[int, int]:
+        """
+        Return the individual payouts of the selected events filled in
+        :param list pks: selected events
+        :return dict: {pk: payout}
+        """
+        payouts = {}
+        field = forms.IntegerField(required=False, min_value=1)
+        for pk in pks:
+            try:
+                value = field.clean(self.data.get(f'payout-{pk}'))
+            except forms.ValidationError:
+                raise forms.ValidationError(
+                    "Neplatné pojistné plnění u události č. %(pk)s", code='invalid_payout', params={'pk': pk}
+                )
+            if value is not None:
+                payouts[pk] = value
+        return payouts
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Return the events of the scope of the valid form. The selected events are returned even if they were
+        processed meanwhile, so the processing can report them as skipped.
+        :return QuerySet:
+        """
+        if self.cleaned_data['scope'] == 'filter':
+            return self.filter_form.filter(models.InsuredEvent.objects.filter(processed=False))
+        return models.InsuredEvent.objects.filter(pk__in=self.cleaned_data['events'])
+
+
+class EventQueueFilterForm(forms.Form):
+    """
+    Form for filtering the lists of insured events by product and by the age of the report.
+    """
+    AGE_BUCKETS: dict[str, tuple[int, int | None]] = {  # bucket: (min days, max days) since the reporting date
+        'new': (0, 7),
+        'week': (8, 30),
+        'month': (31, 90),
+        'old': (91, None),
+    }
+
+    product = forms.ModelChoiceField(queryset=models.Product.objects.all(), required=False, label='Produkt')
+    age = forms.ChoiceField(
+        choices=(
+            ('', 'Všechny'),
+            ('new', 'Do 7 dnů'),
+            ('week', '8 - 30 dnů'),
+            ('month', '31 - 90 dnů'),
+            ('old', 'Starší než 90 dnů'),
+        ),
+        required=False,
+        label='Stáří hlášení'
+    )
+
+    def filter(self, queryset: QuerySet) -> QuerySet:
+        """
+        Return the queryset of insured events filtered by the valid fields of the form
+        :param QuerySet queryset:
+        :return QuerySet:
+        """
+        if not self.is_valid():
+            return queryset
+        product = self.cleaned_data['product']
+        if product:
+            queryset = queryset.filter(contract__product=product)
+        age = self.cleaned_data['age']
+        if age:
+            min_days, max_days = self.AGE_BUCKETS[age]
+            today = datetime.date.today()
+            queryset = queryset.filter(reporting_date__lte=today - datetime.timedelta(days=min_days))
+            if max_days is not None:
+                queryset = queryset.filter(reporting_date__gte=today - datetime.timedelta(days=max_days))
+        return queryset
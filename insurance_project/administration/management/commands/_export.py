@@ -0,0 +1,42 @@
+"""
+Base of the export_* management commands, not a command itself
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from administration import exports
+
+
+class ExportCommand(BaseCommand):
+    """
+    Command writing a CSV export to a file or to the standard output, e.g. for scheduled dumps
+    """
+    export: str = ''
+    filters: tuple = ()  # (option, help) of the filters of the export
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('-o', '--output', help="Output file, the standard output by default")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE, help="Rows read by one query")
+        for option, help_text in self.filters:
+            parser.add_argument(f'--{option}', help=help_text)
+
+    def handle(self, *args, **options) -> None:
+        export = exports.EXPORTS[self.export]({option: options[option] for option, _ in self.filters})
+        try:
+            export.get_queryset()
+        except ValueError as error:
+            raise CommandError(error)
+        start = time.perf_counter()
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for text in export.stream(options['chunk_size']):
+                output.write(text)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if options['output']:
+            self.stdout.write(
+                f"Exported {export.count} rows to {options['output']} in {time.perf_counter() - start:.1f} s"
+            )
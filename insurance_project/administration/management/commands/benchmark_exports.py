@@ -0,0 +1,31 @@
+"""
+Management command measuring the throughput and the memory of the CSV exports
+"""
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from administration import exports
+
+
+class Command(BaseCommand):
+    help = "Measure rows per second and memory growth of the CSV exports streamed to nowhere."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('exports', nargs='*', help="Names of the exports, all by default")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE, help="Rows read by one query")
+
+    def handle(self, *args, **options) -> None:
+        for name in options['exports'] or exports.EXPORTS:
+            export = exports.EXPORTS[name]()
+            # tracemalloc would slow the export down several times, the growth of the peak RSS is measured instead
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            size = sum(len(text) for text in export.stream(options['chunk_size']))
+            elapsed = time.perf_counter() - start
+            growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+            self.stdout.write(
+                f"{name}: {export.count} rows, {size / 2 ** 20:.0f} MiB of CSV in {elapsed:.1f} s, "
+                f"{export.count / elapsed if elapsed else 0:.0f} rows/s, peak memory growth {growth / 1024:.1f} MiB"
+            )
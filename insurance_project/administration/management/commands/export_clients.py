@@ -0,0 +1,10 @@
+"""
+Management command exporting the clients to CSV
+"""
+from ._export import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Export the clients to CSV."
+    export = 'clients'
+    filters = (('q', "Search query like in the list of clients"),)
@@ -0,0 +1,10 @@
+"""
+Management command exporting the contracts to CSV
+"""
+from ._export import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Export the contracts with their contract numbers to CSV."
+    export = 'contracts'
+    filters = (('client', "Primary key of the client"), ('product', "Primary key of the product"))
@@ -0,0 +1,14 @@
+"""
+Management command exporting the insured events to CSV
+"""
+from ._export import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Export the insured events to CSV."
+    export = 'events'
+    filters = (
+        ('product', "Primary key of the product"),
+        ('age', "Age of the report: new, week, month or old"),
+        ('processed', "1 for processed, 0 for pending events, all by default"),
+    )
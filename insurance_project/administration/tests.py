@@ -1,3 +1,261 @@
+import csv
+import datetime
+import io
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from administration import exports, views
+from insurance_app import models, reporting
+
+
+class EventsTestMixin:
+    """
+    Staff member, products and a factory of insured events of new clients
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.staff = models.Person.objects.create_user(
+            email='staff@test.cz', first_name='Jan', last_name='Novák', date_of_birth=datetime.date(1980, 1, 1),
+            is_staff=True
+        )
+        cls.products = [
+            models.Product.objects.create(name=f'Produkt {i}', image='images/962830.jpg') for i in range(2)
+        ]
+
+    def setUp(self) -> None:
+        self.client.force_login(self.staff)
+
+    def _create_events(self, count: int, processed: bool = False, product: models.Product = None) -> list:
+        events = []
+        for i in range(count):
+            person = models.Person.objects.create_user(
+                email=f'klient{models.Person.objects.count()}@test.cz', first_name='Petr', last_name='Dvořák',
+                date_of_birth=datetime.date(1990, 1, 1)
+            )
+            contract = models.Contract.objects.create(
+                product=product or self.products[i % 2], insured=person, payment=1000
+            )
+            events.append(models.InsuredEvent.objects.create(
+                contract=contract, event_date=datetime.date(2023, 1, 1), description='Popis', processed=processed
+            ))
+        return events
+
+
+class EventQueueViewTest(EventsTestMixin, TestCase):
+    """
+    Tests of the pending and processed insured events lists
+    """
+    QUERY_BUDGET: int = 2  # products of the filter form, events page (the session and the user are cached)
+
+    def test_query_count_does_not_depend_on_queue_length(self) -> None:
+        self._create_events(3)
+        self.client.get(reverse('pending-event-list'))  # loads the session and the user into the caches
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self.client.get(reverse('pending-event-list'))
+        self._create_events(30)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self.client.get(reverse('pending-event-list'))
+
+    def test_keyset_pages_cover_the_queue(self) -> None:
+        events = self._create_events(7)
+        per_page = views.PendingEventsListView.per_page
+        views.PendingEventsListView.per_page = 3
+        self.addCleanup(setattr, views.PendingEventsListView, 'per_page', per_page)
+        seen = []
+        url = reverse('pending-event-list')
+        while url:
+            response = self.client.get(url)
+            seen += [event.pk for event in response.context['object_list']]
+            next_query = response.context['next_query']
+            url = f"{reverse('pending-event-list')}?{next_query}" if next_query else None
+        self.assertEqual(seen, [event.pk for event in events])
+        response = self.client.get(f"{reverse('pending-event-list')}?{response.context['previous_query']}")
+        self.assertEqual([event.pk for event in response.context['object_list']], seen[3:6])
+
+    def test_filters(self) -> None:
+        self._create_events(2, product=self.products[0])
+        self._create_events(3, product=self.products[1])
+        self._create_events(4, processed=True, product=self.products[1])
+        response = self.client.get(reverse('pending-event-list'), {'product': self.products[1].pk})
+        self.assertEqual(len(response.context['object_list']), 3)
+        response = self.client.get(reverse('processsed-event-list'), {'age': 'new'})
+        self.assertEqual(len(response.context['object_list']), 4)
+        response = self.client.get(reverse('processsed-event-list'), {'age': 'old'})
+        self.assertEqual(len(response.context['object_list']), 0)
+
+
+class EventBulkProcessTest(EventsTestMixin, TestCase):
+    """
+    Tests of the bulk approval and rejection of the pending insured events
+    """
+    def _summaries(self) -> list:
+        return list(
+            models.ProductMonthSummary.objects.order_by('product', 'month')
+            .values('product', 'month', 'approved_count', 'approved_payout', 'rejected_count')
+        )
+
+    def test_selected_events_with_individual_and_uniform_payouts(self) -> None:
+        events = self._create_events(3)
+        response = self.client.post(reverse('event-bulk-process'), {
+            'scope': 'selected', 'events': [event.pk for event in events], 'approve': 1, 'payout': 1000,
+            f'payout-{events[0].pk}': 2500,
+        }, follow=True)
+        self.assertEqual(
+            list(models.InsuredEvent.objects.order_by('pk').values_list('processed', 'approved', 'payout')),
+            [(True, True, 2500), (True, True, 1000), (True, True, 1000)]
+        )
+        self.assertContains(response, 'Schváleno událostí: 3, pojistné plnění celkem 4500 Kč')
+        summaries = self._summaries()
+        reporting.rebuild()
+        self.assertEqual(summaries, self._summaries())
+
+    def test_filter_scope_rejects_only_the_matching_pending_events(self) -> None:
+        self._create_events(2, product=self.products[0])
+        self._create_events(3, product=self.products[1])
+        self.client.post(
+            reverse('event-bulk-process'), {'scope': 'filter', 'approve': 0, 'product': self.products[1].pk}
+        )
+        rejected = models.InsuredEvent.objects.filter(processed=True, approved=False)
+        self.assertEqual(set(rejected.values_list('contract__product', flat=True)), {self.products[1].pk})
+        self.assertEqual(rejected.count(), 3)
+        summary = models.ProductMonthSummary.objects.get(product=self.products[1], month=datetime.date(2023, 1, 1))
+        self.assertEqual(summary.rejected_count, 3)
+
+    def test_approval_needs_payout(self) -> None:
+        events = self._create_events(2)
+        response = self.client.post(reverse('event-bulk-process'), {
+            'scope': 'selected', 'events': [event.pk for event in events], 'approve': 1,
+            f'payout-{events[0].pk}': 2500,
+        }, follow=True)
+        self.assertContains(response, 'Pro schválení je nutné zadat pojistné plnění')
+        self.assertFalse(models.InsuredEvent.objects.filter(processed=True).exists())
+
+    def test_invalid_payouts_are_rejected(self) -> None:
+        events = self._create_events(2)
+        for individual in ('²', '0', '-5'):
+            response = self.client.post(reverse('event-bulk-process'), {
+                'scope': 'selected', 'events': [event.pk for event in events], 'approve': 1, 'payout': 1000,
+                f'payout-{events[0].pk}': individual,
+            }, follow=True)
+            self.assertContains(response, f'Neplatné pojistné plnění u události č. {events[0].pk}')
+        response = self.client.post(reverse('event-bulk-process'), {
+            'scope': 'selected', 'events': [event.pk for event in events], 'approve': 1, 'payout': 0,
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(models.InsuredEvent.objects.filter(processed=True).exists())
+
+    def test_processed_events_are_skipped(self) -> None:
+        events = self._create_events(2)
+        processed = self._create_events(1, processed=True)
+        response = self.client.post(reverse('event-bulk-process'), {
+            'scope': 'selected', 'events': [event.pk for event in events + processed], 'approve': 0,
+        }, follow=True)
+        self.assertContains(response, 'Zamítnuto událostí: 2')
+        self.assertContains(response, 'Přeskočeno již zpracovaných událostí: 1')
+
+    def test_query_count_does_not_depend_on_number_of_events(self) -> None:
+        counts = []
+        for count in (2, 2, 40):  # the first run creates the summaries
+            self._create_events(count)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('event-bulk-process'), {'scope': 'filter', 'approve': 1, 'payout': 100})
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[2])
+        self.assertFalse(models.InsuredEvent.objects.filter(processed=False).exists())
+
+
+class EventUpdateTest(EventsTestMixin, TestCase):
+    """
+    Tests of the decision of an insured event by the staff
+    """
+    def test_staff_decision_clears_the_rule(self) -> None:
+        event, = self._create_events(1, product=self.products[0])
+        rule = models.AdjudicationRule.objects.create(
+            product=self.products[0], name='Drobná škoda', priority=0, approve=True, payout=3000
+        )
+        models.InsuredEvent.objects.filter(pk=event.pk).update(processed=True, approved=True, payout=3000, rule=rule)
+        self.client.post(reverse('event-detail', kwargs={'pk': event.pk}), {'approve': 0, 'payout': ''})
+        event.refresh_from_db()
+        self.assertEqual((event.processed, event.approved, event.rule), (True, False, None))
+
+
+class ExportTest(EventsTestMixin, TestCase):
+    """
+    Tests of the streaming CSV exports
+    """
+    def _rows(self, response) -> list:
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))  # the byte order mark for Excel
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_clients_export_follows_the_search(self) -> None:
+        events = self._create_events(3)
+        person = events[1].contract.insured
+        person.last_name = 'Nováková'
+        person.save()
+        response = self.client.get(reverse('export', kwargs={'name': 'clients'}), {'q': 'novakova'})
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename="klienti.csv"')
+        rows = self._rows(response)
+        self.assertEqual(rows[0][:3], ['id', 'email', 'last_name'])
+        self.assertEqual([row[:3] for row in rows[1:]], [[str(person.pk), person.email, 'Nováková']])
+        self.assertEqual(len(self._rows(self.client.get(reverse('export', kwargs={'name': 'clients'})))), 4)
+
+    def test_formulas_are_escaped(self) -> None:
+        events = self._create_events(2)
+        person = events[0].contract.insured
+        person.last_name, person.city = '=HYPERLINK("http://example.com")', '@SUM(A1)'
+        person.save()
+        models.InsuredEvent.objects.filter(pk=events[1].pk).update(description='-1+1')
+        rows = self._rows(self.client.get(reverse('export', kwargs={'name': 'clients'}), {'q': person.email}))
+        self.assertIn('\'=HYPERLINK("http://example.com")', rows[1])
+        self.assertIn("'@SUM(A1)", rows[1])
+        self.assertNotIn("'Petr", rows[1])
+        rows = self._rows(self.client.get(reverse('export', kwargs={'name': 'events'})))
+        self.assertEqual([row[0] for row in rows[1:] if "'-1+1" in row], [str(events[1].pk)])
+
+    def test_contracts_export_in_chunks(self) -> None:
+        events = self._create_events(5)
+        export = exports.ContractExport({'product': str(self.products[0].pk)})
+        chunks = list(export.stream(chunk_size=2))
+        self.assertEqual(len(chunks), 3)  # the header with two chunks of rows and the rest
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(
+            [int(row[0]) for row in rows[1:]],
+            [event.contract.contract_number for event in events if event.contract.product_id == self.products[0].pk]
+        )
+        self.assertEqual(export.count, 3)
+
+    def test_events_export_follows_the_queue_filters(self) -> None:
+        self._create_events(2, product=self.products[0])
+        processed = self._create_events(1, processed=True, product=self.products[1])
+        response = self.client.get(reverse('export', kwargs={'name': 'events'}), {'processed': '1', 'age': 'new'})
+        rows = self._rows(response)
+        self.assertEqual([(row[0], row[6]) for row in rows[1:]], [(str(processed[0].pk), '1')])
+        response = self.client.get(reverse('export', kwargs={'name': 'events'}), {'product': self.products[0].pk})
+        self.assertEqual(len(self._rows(response)), 3)
+
+    def test_invalid_filters_are_rejected(self) -> None:
+        for name, params in (
+            ('contracts', {'client': 'abc'}), ('events', {'processed': 'yes'}), ('events', {'age': 'ancient'})
+        ):
+            response = self.client.get(reverse('export', kwargs={'name': name}), params)
+            self.assertEqual(response.status_code, 400, name)
+        self.assertEqual(self.client.get(reverse('export', kwargs={'name': 'unknown'})).status_code, 404)
+        with self.assertRaisesMessage(CommandError, "Invalid client 'abc'"):
+            call_command('export_contracts', client='abc', stdout=io.StringIO())
 
-# Create your tests here.
+    def test_export_command_writes_file(self) -> None:
+        self._create_events(2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'udalosti.csv')
+            stdout = io.StringIO()
+            call_command('export_events', output=path, processed='0', stdout=stdout)
+            with open(path, encoding='utf-8', newline='') as file:
+                self.assertEqual(len(list(csv.reader(file))), 3)
+        self.assertIn(f'Exported 2 rows to {path}', stdout.getvalue())
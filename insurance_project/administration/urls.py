@@ -15,5 +15,9 @@ urlpatterns = [
     path('seznam-smluv/<int:pk>/', views.ContractsListView.as_view(), name='contracts-list'),
     path('nezpracovane-pojistne-udalosti/', views.PendingEventsListView.as_view(), name='pending-event-list'),
     path('zpracovane-pojistne-udalosti/', views.ProcessedEventsListView.as_view(), name='processsed-event-list'),
-    path('udalost-<int:pk>/', views.EventUpdateView.as_view(), name='event-detail')
+    path('zpracovat-pojistne-udalosti/', views.process_events, name='event-bulk-process'),
+    path('udalost-<int:pk>/', views.EventUpdateView.as_view(), name='event-detail'),
+    path('export/<slug:name>.csv', views.export_csv, name='export'),
+    path('prehledy/', views.AnalyticsView.as_view(), name='analytics'),
+    path('monitoring/prihlaseni/', views.login_throttle_stats, name='login-throttle-stats'),
 ]
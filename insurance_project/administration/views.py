@@ -1,20 +1,29 @@
 """
 Views for the administration app.
 """
+import datetime
+import itertools
 from typing import Any
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import RestrictedError, QuerySet, Model
 from django.forms import Form
-from django.http import HttpResponse, HttpRequest
+from django.http import (
+    Http404, HttpResponse, HttpRequest, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+)
 from django.shortcuts import redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
 from django.views import generic
+from django.views.decorators.http import require_POST
 
-from administration import forms
-from insurance_app import models
+from administration import exports, forms
+from insurance_app import claims, models, search
+from insurance_app.pagination import KeysetPaginator
+from insurance_app.routers import replica_reads
+from insurance_app.throttling import throttle
 from insurance_project import template_names as template
 
 
@@ -150,6 +159,7 @@ class ProductDeleteView(generic.UpdateView):
 
 
 @method_decorator(staff_member_required, name='get')
+@method_decorator(replica_reads, name='get')
 class ClientListView(generic.ListView):
     """
     View for displaying list of clients
@@ -161,13 +171,14 @@ class ClientListView(generic.ListView):
 
     def get_queryset(self) -> QuerySet:
         """
-        Return the list of clients sorted by name, eventually filtered by the search field value.
+        Return the list of clients sorted by name, eventually filtered by the search query given in the URL.
         :return:
         :rtype: QuerySet
         """
         queryset = models.Person.objects.filter(is_staff=False).order_by('last_name', 'first_name')
-        if 'name-search' in self.request.POST:
-            queryset = queryset.filter(last_name__contains=self.request.POST['name-search'])
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            queryset = search.search(queryset, query)
         return queryset
 
     def get_context_data(self, *, object_list: QuerySet = None, **kwargs) -> dict:
@@ -180,24 +191,10 @@ class ClientListView(generic.ListView):
         """
         context = super().get_context_data(**kwargs)
         context['title'] = self.title
-        page = self.request.GET.get('page', 1)
-        context['page_range'] = self.get_paginator(self.get_queryset(), self.paginate_by)\
-            .get_elided_page_range(page, on_each_side=2)
-        if 'name-search' in self.request.POST:
-            context['name_search'] = self.request.POST['name-search']
+        context['page_range'] = context['paginator'].get_elided_page_range(context['page_obj'].number, on_each_side=2)
+        context['name_search'] = self.request.GET.get('q', '').strip()
         return context
 
-    def post(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
-        """
-        Return the same response as for the GET method
-        :param request:
-        :param args:
-        :param kwargs:
-        :return:
-        :rtype: HttpResponse
-        """
-        return super().get(request, *args, **kwargs)
-
 
 @method_decorator(staff_member_required, name='get')
 class ContractsListView(generic.ListView):
@@ -232,66 +229,105 @@ class ContractsListView(generic.ListView):
         return queryset
 
 
-@method_decorator(staff_member_required, name='get')
-class PendingEventsListView(generic.ListView):
+class EventQueueView(generic.ListView):
     """
-    View for displaying all unprocessed insured events
+    Base view for the work queues of insured events. Events are paginated by the (reporting_date, pk) key and loaded
+    together with their contract, product and client, so the number of queries doesn't depend on the queue length.
     """
     model: models.InsuredEvent = models.InsuredEvent
     template_name: str = template.PENDING_EVENT_LIST
-    title: str = "Nezpracované pojistné události"
+    per_page: int = 50
+    processed: bool = False
+    descending: bool = False
+    title: str = ""
 
-    def get_context_data(self, *, object_list: QuerySet = None, **kwargs) -> dict:
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
         """
-        Get the context for this view.
-        Extends the parent method with additional context of the page title.
-        :param QuerySet object_list:
+        Handle GET requests. Validates the filter form before the queryset is built.
+        :param HttpRequest request:
+        :param args:
         :param kwargs:
-        :return:
-        :rtype: dict
+        :return HttpResponse:
         """
-        context = super().get_context_data(object_list=object_list, **kwargs)
-        context['title'] = self.title
-        return context
+        self.filter_form = forms.EventQueueFilterForm(request.GET)
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self) -> QuerySet:
         """
-        Return pending events sorted by date.
+        Return the events of this queue with the related objects joined, filtered by the filter form.
         :return:
         :rtype: QuerySet
         """
-        return super().get_queryset().filter(processed=False).order_by('reporting_date')
-
-
-@method_decorator(staff_member_required, name='get')
-class ProcessedEventsListView(generic.ListView):
-    """
-    View for displaying all processed insured events
-    """
-    model: models.InsuredEvent = models.InsuredEvent
-    template_name: str = template.PENDING_EVENT_LIST
-    title: str = "Zpracované pojistné události"
+        queryset = super().get_queryset().filter(processed=self.processed)\
+            .select_related('contract__product', 'contract__insured')
+        return self.filter_form.filter(queryset)
 
     def get_context_data(self, *, object_list: QuerySet = None, **kwargs) -> dict:
         """
         Get the context for this view.
-        Extends the parent method with additional context of the page title.
+        Replaces the default pagination with the keyset pagination and adds the filter form, the links to the
+        neighbouring pages and the page title.
         :param QuerySet object_list:
         :param kwargs:
         :return:
         :rtype: dict
         """
-        context = super().get_context_data(object_list=object_list, **kwargs)
+        queryset = object_list if object_list is not None else self.object_list
+        paginator = KeysetPaginator(queryset, 'reporting_date', self.per_page, descending=self.descending)
+        page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context['page_obj'] = page
+        context['is_paginated'] = page.has_next or page.has_previous
+        context['filter_form'] = self.filter_form
+        context['next_query'] = self._page_query('after', page.next_cursor) if page.has_next else None
+        context['previous_query'] = self._page_query('before', page.previous_cursor) if page.has_previous else None
+        context['export_query'] = self._export_query()
+        context['bulk_form'] = None if self.processed else forms.EventBulkForm()
         context['title'] = self.title
         return context
 
-    def get_queryset(self) -> QuerySet:
+    def _export_query(self) -> str:
         """
-        Return processed events sorted by date in descending order
-        :return:
-        :rtype: QuerySet
+        Return the query string of the CSV export of this queue keeping the current filters.
+        :return str:
+        """
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query['processed'] = int(self.processed)
+        return query.urlencode()
+
+    def _page_query(self, direction: str, cursor: str) -> str:
+        """
+        Return the query string of a neighbouring page keeping the current filters.
+        :param str direction: 'after' or 'before'
+        :param str cursor:
+        :return str:
         """
-        return super().get_queryset().filter(processed=True).order_by('-reporting_date')
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query[direction] = cursor
+        return query.urlencode()
+
+
+@method_decorator(staff_member_required, name='get')
+class PendingEventsListView(EventQueueView):
+    """
+    View for displaying unprocessed insured events, the oldest reports first
+    """
+    title: str = "Nezpracované pojistné události"
+
+
+@method_decorator(staff_member_required, name='get')
+@method_decorator(replica_reads, name='get')
+class ProcessedEventsListView(EventQueueView):
+    """
+    View for displaying processed insured events, the newest reports first
+    """
+    processed: bool = True
+    descending: bool = True
+    title: str = "Zpracované pojistné události"
 
 
 @method_decorator(staff_member_required, name='get')
@@ -342,6 +378,7 @@ class EventUpdateView(generic.UpdateView):
         :return:
         :rtype
         """
+        form.instance.rule = None  # decided by the staff, not by the rule which may have decided it before
         if int(form.cleaned_data['approve']):
             if form.cleaned_data['payout']:
                 form.instance.approved = True
@@ -357,6 +394,34 @@ class EventUpdateView(generic.UpdateView):
         return super().form_valid(form)
 
 
+@staff_member_required
+@require_POST
+def process_events(request: HttpRequest) -> HttpResponse:
+    """
+    View function approving or rejecting pending insured events in bulk (insurance_app.claims), the selected events
+    or all events matching the filter of the queue. Redirects back to the queue with the summary in the messages.
+    :param HttpRequest request:
+    :return HttpResponse:
+    """
+    form = forms.EventBulkForm(request.POST)
+    query = {name: request.POST[name] for name in form.filter_form.fields if request.POST.get(name)}
+    back = f"{reverse('pending-event-list')}?{urlencode(query)}" if query else reverse('pending-event-list')
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect(back)
+    approve = bool(int(form.cleaned_data['approve']))
+    result = claims.process(form.get_queryset(), approve, form.cleaned_data['payout'], form.cleaned_data['payouts'])
+    if approve:
+        messages.success(request, f"Schváleno událostí: {result.processed}, pojistné plnění celkem {result.payout} Kč")
+    else:
+        messages.success(request, f"Zamítnuto událostí: {result.processed}")
+    if result.skipped:
+        messages.warning(request, f"Přeskočeno již zpracovaných událostí: {result.skipped}")
+    return redirect(back)
+
+
 @staff_member_required
 def delete_person(request: HttpRequest, pk: int) -> HttpResponse:
     """
@@ -376,3 +441,86 @@ def delete_person(request: HttpRequest, pk: int) -> HttpResponse:
     else:
         messages.success(request, 'Klientský účet byl úspěšně odstraněn')
     return redirect('clients-list')
+
+
+@method_decorator(staff_member_required, name='get')
+@method_decorator(replica_reads, name='get')
+class AnalyticsView(generic.TemplateView):
+    """
+    Dashboard of the payouts, claims and premium volume per product and month. It reads only the summaries maintained
+    by insurance_app.reporting, so its cost doesn't grow with the number of contracts and events.
+    """
+    template_name: str = template.ANALYTICS
+    title: str = 'Přehled plnění a smluv'
+    months: int = 12
+    max_months: int = 60
+
+    def get_context_data(self, **kwargs) -> dict:
+        """
+        Get the context for this view.
+        Extends the parent method with the summaries of the last months (GET parameter 'mesice') grouped by month and
+        their totals per product.
+        :param dict kwargs: additional keyword arguments
+        :return dict: context data
+        """
+        context = super().get_context_data(**kwargs)
+        try:
+            months = min(max(int(self.request.GET.get('mesice', self.months)), 1), self.max_months)
+        except ValueError:
+            months = self.months
+        today = datetime.date.today()
+        first = today.year * 12 + today.month - months  # months since the year 0 of the first reported month
+        start = datetime.date(first // 12, first % 12 + 1, 1)
+        summaries = (
+            models.ProductMonthSummary.objects.filter(month__gte=start)
+            .select_related('product')
+            .order_by('-month', 'product__name')
+        )
+        by_month = {}
+        totals = {}
+        for summary in summaries:
+            by_month.setdefault(summary.month, []).append(summary)
+            total = totals.setdefault(summary.product_id, models.ProductMonthSummary(product=summary.product))
+            for name in ('approved_count', 'approved_payout', 'rejected_count', 'contracts_count', 'premium'):
+                setattr(total, name, getattr(total, name) + getattr(summary, name))
+        context['by_month'] = by_month.items()
+        context['totals'] = sorted(totals.values(), key=lambda total: total.product.name)
+        context['months'] = months
+        context['start'] = start
+        context['title'] = self.title
+        return context
+
+
+@staff_member_required
+def login_throttle_stats(request: HttpRequest) -> HttpResponse:
+    """
+    View function returning the login throttling counters of all processes for monitoring
+    :param HttpRequest request:
+    :return HttpResponse:
+    """
+    return JsonResponse(throttle.counters())
+
+
+@staff_member_required
+@replica_reads
+def export_csv(request: HttpRequest, name: str) -> HttpResponse:
+    """
+    View function streaming a CSV export of clients, contracts or insured events, filtered by the GET parameters of
+    the corresponding list view
+    :param HttpRequest request:
+    :param str name: name of the export, a key of exports.EXPORTS
+    :return HttpResponse:
+    """
+    if name not in exports.EXPORTS:
+        raise Http404("Unknown export")
+    export = exports.EXPORTS[name](request.GET)
+    try:
+        export.get_queryset()
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    # the byte order mark makes Excel read the file as UTF-8
+    response = StreamingHttpResponse(
+        itertools.chain(['\ufeff'], export.stream()), content_type='text/csv; charset=utf-8'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+    return response
@@ -1,3 +1,77 @@
+import datetime
+
 from django.test import TestCase
+from django.urls import reverse
+
+from insurance_app import models
+from insurance_app.profiling import QueryBudgetMixin
+
+
+class PortalQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """
+    The pages of the client portal load the related objects by a constant number of queries
+    """
+    QUERY_BUDGET: int = 1  # the listed objects (the session and the user are cached in the process)
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        products = [models.Product.objects.create(name=f'Produkt {i}', image='images/962830.jpg') for i in range(3)]
+        for i in range(9):
+            contract = models.Contract.objects.create(product=products[i % 3], insured=cls.person, payment=1000)
+            models.InsuredEvent.objects.create(
+                contract=contract, event_date=datetime.date(2023, 1, 1), description='Popis', processed=i % 2 == 0
+            )
+
+    def setUp(self) -> None:
+        self.client.force_login(self.person)
+        self.client.get(reverse('my-contracts'))  # loads the session and the user into the local caches
+
+    def test_contracts(self) -> None:
+        with self.assertQueryBudget(self.QUERY_BUDGET):
+            response = self.client.get(reverse('my-contracts'))
+        self.assertEqual(len(response.context['object_list']), 9)
+
+    def test_insured_events(self) -> None:
+        with self.assertQueryBudget(self.QUERY_BUDGET):
+            response = self.client.get(reverse('event-list'))
+        self.assertEqual(len(response.context['pending']), 4)
+        self.assertEqual(len(response.context['processed']), 5)
+
+
+class ContractDetailAccessTest(TestCase):
+    """
+    A client can view and cancel only their own contracts
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.owner, cls.other = (
+            models.Person.objects.create_user(
+                email=f'klient{i}@test.cz', first_name='Petr', last_name='Dvořák',
+                date_of_birth=datetime.date(1990, 1, 1)
+            )
+            for i in range(2)
+        )
+        cls.staff = models.Person.objects.create_user(
+            email='staff@test.cz', first_name='Jan', last_name='Novák', date_of_birth=datetime.date(1980, 1, 1),
+            is_staff=True
+        )
+        product = models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+        cls.contract = models.Contract.objects.create(product=product, insured=cls.owner, payment=1000)
+        cls.url = reverse('contract-detail', kwargs={'contract_number': cls.contract.contract_number})
+
+    def test_owner_and_staff_see_the_contract(self) -> None:
+        for user in (self.owner, self.staff):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(self.url).status_code, 200)
 
-# Create your tests here.
+    def test_other_client_can_neither_view_nor_delete_the_contract(self) -> None:
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.post(self.url, {'delete': 1}).status_code, 404)
+        self.assertTrue(models.Contract.objects.filter(pk=self.contract.pk).exists())
+        self.client.force_login(self.owner)
+        self.assertRedirects(self.client.post(self.url, {'delete': 1}), reverse('my-contracts'))
+        self.assertFalse(models.Contract.objects.filter(pk=self.contract.pk).exists())
@@ -1,10 +1,14 @@
 """
 Url patterns for the client_account app.
 """
-from django.urls import path
+from django.urls import path, register_converter
+
+from insurance_app import numbering
 
 from . import views
 
+register_converter(numbering.ContractNumberConverter, 'contract_number')
+
 urlpatterns = [
     path('logout/', views.logout, name='logout'),
     path("smlouvy/", views.ContractsListView.as_view(), name="my-contracts"),
@@ -12,8 +16,8 @@ urlpatterns = [
     path('odstranit-ucet/', views.delete_person, name='account-delete'),
     path("zmena-hesla/", views.PasswordChangeView.as_view(), name="password-change"),
     path("register-contract/", views.RegisterContractView.as_view(), name="register-contract"),
-    path("<int:contract_number>/detail/", views.ContractDetailView.as_view(), name="contract-detail"),
-    path("<int:contract_number>/upravit/", views.UpdateContractView.as_view(), name="contract-update"),
+    path("<contract_number:contract_number>/detail/", views.ContractDetailView.as_view(), name="contract-detail"),
+    path("<contract_number:contract_number>/upravit/", views.UpdateContractView.as_view(), name="contract-update"),
     path("skodni-udalosti/", views.InsuredEventListView.as_view(), name='event-list'),
-    path("<int:contract_number>/nova-udalost/", views.CreateInsuredEventView.as_view(), name='event-create')
+    path("<contract_number:contract_number>/nova-udalost/", views.CreateInsuredEventView.as_view(), name='event-create')
 ]
@@ -1,54 +1,81 @@
 """
 Views for the client_account app.
+
+The read-only pages of the client portal (contracts, contract detail, insured events) are async views. They load the
+user and the data with the async ORM and render the already loaded objects, so a request waiting for the database
+doesn't occupy a worker thread when the project is served by an ASGI server (insurance_project.asgi).
 """
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import views as auth_views, logout as auth_logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+from django.contrib.auth.views import redirect_to_login
 
 from django.db.models import RestrictedError, Model, QuerySet
 from django.forms import Form
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import redirect
+from django.http import Http404, HttpRequest, HttpResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views import generic
 
 from client_account import forms
-from insurance_app import models
+from insurance_app import authentication, models
 from insurance_project import template_names as template
 
 
-@method_decorator(login_required, name='get')
-class ContractsListView(generic.ListView):
+async def aget_user(request: HttpRequest) -> authentication.CachedUser | AbstractBaseUser | AnonymousUser:
     """
-    View for displaying client's contracts
+    Return the user of the request without blocking the event loop. The session and the user are loaded in a worker
+    thread and cached on the request as CachedAuthenticationMiddleware does, so request.user, the session and the
+    messages can be used by the async code and the templates afterwards. A user from the cache answers only its header
+    fields (insurance_app.authentication.HEADER_FIELDS) without a query, the async code must not read the others.
+    :param HttpRequest request:
+    :return CachedUser | AbstractBaseUser | AnonymousUser:
     """
-    model: Model = models.Contract
-    template_name: str = template.CONTRACTS
-    title: str = "Moje smlouvy"
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = await sync_to_async(authentication.get_user)(request)
+    return request._cached_user
 
-    def get_context_data(self, *, object_list: QuerySet = None, **kwargs) -> dict:
+
+class AsyncLoginRequiredMixin:
+    """
+    Mixin of the async views redirecting anonymous users to the login page, login_required doesn't support async views
+    """
+    def dispatch(self, request: HttpRequest, *args, **kwargs):
         """
-        Get the context for this view.
-        Extends the parent method with additional context of the page title.
-        :param QuerySet object_list:
+        Return the coroutine checking the user and dispatching the request
+        :param HttpRequest request:
+        :param args:
         :param kwargs:
-        :return dict:
+        :return Coroutine:
         """
-        context = super().get_context_data(object_list=object_list, **kwargs)
-        context['title'] = self.title
-        return context
+        return self._dispatch(request, *args, **kwargs)
+
+    async def _dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ContractsListView(AsyncLoginRequiredMixin, generic.View):
+    """
+    View for displaying client's contracts
+    """
+    model: Model = models.Contract
+    template_name: str = template.CONTRACTS
+    title: str = "Moje smlouvy"
 
     def get_queryset(self) -> QuerySet:
         """
         Filter default queryset by logged in client
         :return QuerySet:
         """
-        queryset = super().get_queryset()
-        queryset = queryset.filter(insured=self.request.user)
-        return queryset
+        return self.model.objects.filter(insured_id=self.request.user.pk).select_related('product')
 
-    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+    async def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
         """
         If user is staff, redirect to client's list
         :param request:
@@ -59,7 +86,8 @@ class ContractsListView(generic.ListView):
         """
         if request.user.is_staff:
             return redirect('clients-list')
-        return super().get(request, *args, **kwargs)
+        object_list = [contract async for contract in self.get_queryset()]
+        return render(request, self.template_name, {'object_list': object_list, 'title': self.title})
 
 
 @method_decorator(login_required, name='get')
@@ -94,7 +122,7 @@ class RegisterContractView(generic.CreateView):
         form = self.form_class(request.POST)
         if hasattr(request, "user"):
             contract = form.save(commit=False)
-            contract.insured = request.user
+            contract.insured_id = request.user.pk
             contract.save()
         if form.is_valid():
             messages.success(request, 'Vaše smlouva byla úspěšně sjednána. Děkujeme Vám za Vaši důvěru')
@@ -104,8 +132,7 @@ class RegisterContractView(generic.CreateView):
             return self.form_invalid(form)
 
 
-@method_decorator(login_required, name='get')
-class ContractDetailView(generic.DetailView):
+class ContractDetailView(AsyncLoginRequiredMixin, generic.View):
     """
     View for displaying details of a given contract
     """
@@ -113,18 +140,34 @@ class ContractDetailView(generic.DetailView):
     template_name: str = template.CONTRACT_DETAIL
     # title = None  # Title is the name of the contract
 
-    def get_context_data(self, **kwargs) -> dict:
+    async def get_object(self) -> models.Contract:
         """
-        Get the context for this view.
-        Extends the parent method with additional context of the page title.
-        :param kwargs:
-        :return dict:
+        The contract is identified by a contract number in the URL, not by pk. A client gets only their own contracts,
+        the staff get any contract.
+        :return Contract:
         """
-        context = super().get_context_data(**kwargs)
-        context['title'] = self.object.product.name
-        return context
+        queryset = self.model.objects.select_related('product')
+        user = await aget_user(self.request)
+        if not user.is_staff:
+            queryset = queryset.filter(insured_id=user.pk)
+        try:
+            return await queryset.aget(contract_number=self.kwargs.get('contract_number'))
+        except self.model.DoesNotExist:
+            raise Http404(f"No {self.model._meta.verbose_name} found matching the query")
 
-    def post(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+    async def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        """
+        Handle GET requests
+        :param HttpRequest request:
+        :param list args:
+        :param dict kwargs:
+        :return HttpResponse:
+        """
+        self.object = await self.get_object()
+        context = {'object': self.object, 'contract': self.object, 'title': self.object.product.name}
+        return render(request, self.template_name, context)
+
+    async def post(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
         """
         Handle POST requests
         :param HttpRequest request:
@@ -139,19 +182,10 @@ class ContractDetailView(generic.DetailView):
             return redirect("contract-update", contract_number)
         if "delete" in request.POST:
             if not hasattr(self, 'object'):
-                self.object = self.get_object()
-            self._delete_object()
+                self.object = await self.get_object()
+            await sync_to_async(self._delete_object)()
             return redirect("my-contracts")
 
-    def get_queryset(self) -> QuerySet:
-        """
-        The contract is identified by a contract number in the URL, not by pk. This method determines the pk and adds it
-        to the self.kwargs attribute and returns a default queryset.
-        :return QuerySet:
-        """
-        self.kwargs['pk'] = self.model.get_pk_by_contract_number(self.kwargs.get('contract_number'))
-        return super().get_queryset()
-
     def _delete_object(self) -> None:
         """
         Delete a contract.
@@ -174,6 +208,9 @@ class UpdateContractView(generic.UpdateView):
     model: models.Contract = models.Contract
     title: str = 'Upravit {} číslo {}'
     success_url = reverse_lazy('my-contracts')
+    # the contract is identified by a contract number in the URL, not by pk
+    slug_field: str = 'contract_number'
+    slug_url_kwarg: str = 'contract_number'
 
     def get_context_data(self, **kwargs) -> dict:
         """
@@ -196,16 +233,6 @@ class UpdateContractView(generic.UpdateView):
         messages.success(self.request, 'Detaily smlouvy byly upraveny')
         return response
 
-    def get_queryset(self) -> QuerySet:
-        """
-        The contract is identified by a contract number in the URL, not by pk. This method determines the pk and adds it
-        to the self.kwargs attribute and returns the default queryset.
-        :return QuerySet:
-        """
-        queryset = super().get_queryset()
-        self.kwargs['pk'] = self.model.get_pk_by_contract_number(self.kwargs.get('contract_number'))
-        return queryset
-
 
 @method_decorator(login_required, name='get')
 class CreateInsuredEventView(generic.CreateView):
@@ -247,8 +274,7 @@ class CreateInsuredEventView(generic.CreateView):
             return self.form_invalid(form)
 
 
-@method_decorator(login_required, name='get')
-class InsuredEventListView(generic.ListView):
+class InsuredEventListView(AsyncLoginRequiredMixin, generic.View):
     """
     View for displaying the list of the client's insured events
     """
@@ -256,31 +282,31 @@ class InsuredEventListView(generic.ListView):
     template_name = template.EVENT_LIST
     title = 'Seznam pojistných událostí'
 
-    def get_context_data(self, *, object_list: QuerySet = None, **kwargs) -> dict:
-        """
-        Get the context for this view.
-        Extends the parent method with additional context of the page title.
-        :param object_list:
-        :param kwargs:
-        :return:
-        :rtype: dict
-        """
-        if not object_list:
-            object_list = self.get_queryset()
-        context = super().get_context_data(object_list=object_list, **kwargs)
-        context['pending'] = object_list.filter(processed=False)
-        context['processed'] = object_list.filter(processed=True)
-        context['title'] = self.title
-        return context
-
     def get_queryset(self) -> QuerySet:
         """
         Return client's events ordered by date in descending order
         :return:
         :rtype: QuerySet
         """
-        queryset = super().get_queryset()
-        return queryset.filter(contract__insured=self.request.user).order_by('reporting_date')
+        queryset = self.model.objects.filter(contract__insured_id=self.request.user.pk)
+        return queryset.select_related('contract__product').order_by('reporting_date')
+
+    async def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        """
+        Load the events by a single query and split them to the pending and the processed ones
+        :param HttpRequest request:
+        :param list args:
+        :param dict kwargs:
+        :return HttpResponse:
+        """
+        object_list = [event async for event in self.get_queryset()]
+        context = {
+            'object_list': object_list,
+            'pending': [event for event in object_list if not event.processed],
+            'processed': [event for event in object_list if event.processed],
+            'title': self.title,
+        }
+        return render(request, self.template_name, context)
 
 
 @method_decorator(login_required, name='get')
@@ -0,0 +1,170 @@
+"""
+Module containing the automatic adjudication of the pending insured events by the rules of their products
+(AdjudicationRule). The pending events are read in chunks of primary keys by one query returning just the columns the
+rules need, each condition of a rule is evaluated over a whole column of the chunk at once and the matching events are
+decided by the set-based updates of insurance_app.claims. Each chunk is decided in one short transaction, so the web
+workers wait for the write lock at most one chunk and an interrupted run continues by running again.
+"""
+import contextlib
+import itertools
+import operator
+from collections import Counter, defaultdict
+from typing import Callable, Iterable, NamedTuple
+
+from django.db import router, transaction
+from django.db.models import Count, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from . import claims, models
+
+CHUNK_SIZE: int = 5000  # events evaluated and decided in one transaction
+
+
+class Columns(NamedTuple):
+    """
+    Columns of a chunk of pending events, the values of one event have the same index
+    """
+    pk: list[int]
+    product: list[int]
+    contract_age: list[int]  # days between the conclusion of the contract and the event
+    report_delay: list[int]  # days between the event and its report
+    prior_claims: list[int]  # events reported on the contract before, the same day by a lower primary key
+
+    def select(self, indices: Iterable[int]) -> 'Columns':
+        """
+        Return the columns of the events at the indices
+        :param Iterable indices:
+        :return Columns:
+        """
+        indices = list(indices)
+        return Columns(*([column[index] for index in indices] for column in self))
+
+
+class Result(NamedTuple):
+    """
+    Summary of an adjudication run
+    """
+    evaluated: int
+    decided: Counter  # {AdjudicationRule: number of the decided events}
+
+
+def active_rules(using: str = 'default') -> dict[int, list[models.AdjudicationRule]]:
+    """
+    Return the active rules of the products in the order of their priority
+    :param str using: database alias
+    :return dict: {product_id: [AdjudicationRule]}
+    """
+    rules = defaultdict(list)
+    for rule in models.AdjudicationRule.objects.using(using).filter(active=True).order_by('priority', 'pk'):
+        rules[rule.product_id].append(rule)
+    return dict(rules)
+
+
+def load(events: QuerySet, prior_claims: bool = True) -> Columns:
+    """
+    Read the columns of the events evaluated by the rules by one query
+    :param QuerySet events: insured events
+    :param bool prior_claims: count the prior claims, the only column aggregated by the database
+    :return Columns:
+    """
+    fields = ['pk', 'contract__product_id', 'contract__conclusion_date', 'event_date', 'reporting_date']
+    if prior_claims:
+        prior = (
+            # the primary keys don't follow the reporting order, e.g. of the generated datasets
+            models.InsuredEvent.objects.filter(
+                Q(reporting_date__lt=OuterRef('reporting_date'))
+                | Q(reporting_date=OuterRef('reporting_date'), pk__lt=OuterRef('pk')),
+                contract=OuterRef('contract'),
+            ).order_by().values('contract').annotate(count=Count('pk')).values('count')
+        )
+        events = events.annotate(prior_claims=Coalesce(Subquery(prior), 0))
+        fields.append('prior_claims')
+    rows = list(events.values_list(*fields))
+    if not rows:
+        return Columns([], [], [], [], [])
+    pks, products, conclusion_dates, event_dates, reporting_dates, *prior_counts = zip(*rows)
+    event_days = [date.toordinal() for date in event_dates]
+    return Columns(
+        list(pks),
+        list(products),
+        [day - date.toordinal() for day, date in zip(event_days, conclusion_dates)],
+        [date.toordinal() - day for date, day in zip(reporting_dates, event_days)],
+        list(prior_counts[0]) if prior_counts else [0] * len(rows),
+    )
+
+
+def matches(rule: models.AdjudicationRule, columns: Columns) -> list[bool]:
+    """
+    Return the mask of the events meeting all conditions of the rule, the product is not checked
+    :param AdjudicationRule rule:
+    :param Columns columns:
+    :return list:
+    """
+    mask = [True] * len(columns.pk)
+    for name, minimum, maximum in rule.conditions():
+        column = getattr(columns, name)
+        if minimum is not None:
+            mask = [selected and value >= minimum for selected, value in zip(mask, column)]
+        if maximum is not None:
+            mask = [selected and value <= maximum for selected, value in zip(mask, column)]
+    return mask
+
+
+def decide(columns: Columns, rules: dict[int, list[models.AdjudicationRule]]) -> dict[models.AdjudicationRule, list]:
+    """
+    Return the events decided by each rule: the first rule of the product of the event which the event matches
+    :param Columns columns: pending events
+    :param dict rules: {product_id: [AdjudicationRule]} in the order of their priority
+    :return dict: {AdjudicationRule: [pk]}
+    """
+    indices = defaultdict(list)
+    for index, product in enumerate(columns.product):
+        indices[product].append(index)
+    decisions = {}
+    for product, product_indices in indices.items():
+        undecided = columns.select(product_indices)
+        for rule in rules.get(product, ()):
+            if not undecided.pk:
+                break
+            mask = matches(rule, undecided)
+            decided = list(itertools.compress(undecided.pk, mask))
+            if decided:
+                decisions[rule] = decided
+                undecided = undecided.select(itertools.compress(range(len(mask)), map(operator.not_, mask)))
+    return decisions
+
+
+def run(
+    chunk_size: int = CHUNK_SIZE, dry_run: bool = False, using: str | None = None,
+    progress: Callable[[int, Counter], None] | None = None
+) -> Result:
+    """
+    Evaluate the rules on all pending events and decide the matching events
+    :param int chunk_size: events evaluated and decided in one transaction
+    :param bool dry_run: only count the events the rules would decide
+    :param str using: database alias, the database for writing the events by default
+    :param Callable progress: called with the numbers of the evaluated and the decided events after each chunk
+    :return Result:
+    """
+    using = using or router.db_for_write(models.InsuredEvent)
+    rules = active_rules(using)
+    prior_claims = any(rule.max_prior_claims is not None for rule in itertools.chain(*rules.values()))
+    # the products are filtered by decide(), a filter in the query would make the database walk all their contracts
+    # for each chunk instead of the events in the order of the primary key
+    pending = models.InsuredEvent.objects.using(using).filter(processed=False).order_by('pk')
+    last, evaluated, decided = 0, 0, Counter()
+    while rules:
+        # a dry run doesn't take the write lock
+        with contextlib.nullcontext() if dry_run else transaction.atomic(using=using):
+            columns = load(pending.filter(pk__gt=last)[:chunk_size], prior_claims)
+            for rule, pks in decide(columns, rules).items():
+                if not dry_run:
+                    claims.update(pks, rule.approve, rule.payout, rule=rule, using=using)
+                decided[rule] += len(pks)
+        if not columns.pk:
+            break
+        last = columns.pk[-1]
+        evaluated += len(columns.pk)
+        if progress is not None:
+            progress(evaluated, decided)
+    return Result(evaluated, decided)
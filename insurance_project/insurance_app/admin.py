@@ -39,7 +39,27 @@ class PersonAdmin(UserAdmin):
     ordering = ('email',)
 
 
+class AdjudicationRuleAdmin(admin.ModelAdmin):
+    """
+    Adjudication rules of the products evaluated by the adjudicate_events command
+    """
+    list_display: tuple = ('name', 'product', 'priority', 'approve', 'payout', 'active')
+    list_filter: tuple = ('product', 'active', 'approve')
+    list_editable: tuple = ('priority', 'active')
+
+
+class InvoiceAdmin(admin.ModelAdmin):
+    """
+    Invoices generated by the run_billing command
+    """
+    list_display: tuple = ('contract', 'period', 'amount', 'issue_date', 'due_date')
+    list_filter: tuple = ('period',)
+    list_select_related: tuple = ('contract__product',)
+
+
 admin.site.register(models.Person, PersonAdmin)
 admin.site.register(models.Contract)
 admin.site.register(models.Product)
+admin.site.register(models.AdjudicationRule, AdjudicationRuleAdmin)
+admin.site.register(models.Invoice, InvoiceAdmin)
 admin.site.unregister(Group)
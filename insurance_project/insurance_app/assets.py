@@ -0,0 +1,248 @@
+"""
+Module containing the static asset pipeline. collectstatic (or the build_assets command) copies from the local apps
+only the assets referenced by the templates and their dependencies, stores them under names with a content hash and
+writes gzip compressed siblings. AssetMiddleware serves the collected files with far-future immutable cache headers.
+
+Before collectstatic has been run, the templates refer to the unhashed files served from the apps as usual.
+"""
+import gzip
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from typing import Iterator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.finders import AppDirectoriesFinder
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+TEMPLATE_PATTERN: re.Pattern = re.compile(r"""\{%\s*static\s+['"]([^'"]+)['"]""")
+DEPENDENCY_PATTERNS: dict[str, tuple] = {  # extension: patterns of the files referenced by an asset
+    '.css': (
+        re.compile(r"""url\(\s*['"]?(?!data:|https?:|//|#)([^'")?#]+)"""),
+        re.compile(r'sourceMappingURL=(\S+)'),
+    ),
+    '.js': (re.compile(r'sourceMappingURL=(\S+)'),),
+}
+HASHED_PATTERN: re.Pattern = re.compile(r'\.[0-9a-f]{12}(\.[^./]+)?(\.gz)?$')  # names written by AssetStorage
+COMPRESSIBLE: tuple = ('.css', '.js', '.map', '.svg', '.ico', '.json', '.txt')
+IMMUTABLE_CACHE_CONTROL: str = 'public, max-age=31536000, immutable'
+CACHE_CONTROL: str = 'public, max-age=60'
+
+
+def is_local(path: str | Path) -> bool:
+    """
+    Return True if the path belongs to this project, not to an installed third-party package
+    :param path:
+    :return bool:
+    """
+    return Path(path).resolve().is_relative_to(Path(settings.BASE_DIR).resolve())
+
+
+def template_directories() -> list[Path]:
+    """
+    Return the template directories of this project
+    :return list:
+    """
+    directories = [Path(directory) for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+    directories += [path for path in Path(settings.BASE_DIR).glob('*/templates') if path.is_dir()]
+    return directories
+
+
+def dependencies(name: str, content: str) -> Iterator[str]:
+    """
+    Return the names of the assets referenced by the content of an asset
+    :param str name: name of the asset
+    :param str content:
+    :return Iterator:
+    """
+    for pattern in DEPENDENCY_PATTERNS.get(posixpath.splitext(name)[1], ()):
+        for reference in pattern.findall(content):
+            yield posixpath.normpath(posixpath.join(posixpath.dirname(name), reference.strip()))
+
+
+def referenced_assets() -> set[str]:
+    """
+    Return the names of the static assets referenced by the templates of this project, including the assets they
+    reference themselves (fonts and images of stylesheets, source maps)
+    :return set:
+    """
+    pending = [
+        name
+        for directory in template_directories()
+        for path in directory.rglob('*.html')
+        for name in TEMPLATE_PATTERN.findall(path.read_text(encoding='utf-8'))
+    ]
+    found = set()
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        path = finders.find(name)
+        if path is None:
+            continue
+        found.add(name)
+        if posixpath.splitext(name)[1] in DEPENDENCY_PATTERNS:
+            pending.extend(dependencies(name, Path(path).read_text(encoding='utf-8', errors='replace')))
+    return found
+
+
+def prune(storage, keep: set[str]) -> list[str]:
+    """
+    Delete the hashed files (and their gzip siblings) of the earlier builds which are not in the given names. The files
+    are not deleted by collectstatic itself, so the pages rendered by the workers still running the previous build
+    keep loading their assets during a rolling deploy.
+    :param storage: storage of the collected files
+    :param set keep: hashed names still referenced, usually of the current and the previous manifest
+    :return list: deleted names
+    """
+    deleted = []
+    pending = ['']
+    while pending:
+        directory = pending.pop()
+        directories, files = storage.listdir(directory)
+        pending.extend(posixpath.join(directory, name) for name in directories)
+        for filename in files:
+            name = posixpath.join(directory, filename)
+            if HASHED_PATTERN.search(filename) and name.removesuffix('.gz') not in keep:
+                storage.delete(name)
+                deleted.append(name)
+    return deleted
+
+
+class ReferencedAssetsFinder(AppDirectoriesFinder):
+    """
+    Finder of the static files of the apps which lists only the referenced assets of the local apps, so collectstatic
+    doesn't copy e.g. all the unused Bootstrap variants. Files of third-party apps (admin) are listed completely, they
+    are referenced from Python code too. Finding a single file is not restricted.
+    """
+    def list(self, ignore_patterns: list) -> Iterator[tuple]:
+        referenced = referenced_assets()
+        for path, storage in super().list(ignore_patterns):
+            if path in referenced or not is_local(storage.location):
+                yield path, storage
+
+
+class AssetStorage(ManifestStaticFilesStorage):
+    """
+    Storage of the collected static files with the content hash in their names and gzip compressed siblings
+    """
+    def stored_name(self, name: str) -> str:
+        """
+        Return the hashed name of the file, or the name itself if collectstatic has not been run yet
+        :param str name:
+        :return str:
+        """
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths: dict, dry_run: bool = False, **options) -> Iterator[tuple]:
+        """
+        Hash the files and write the gzip compressed siblings of the compressible ones
+        :param dict paths:
+        :param bool dry_run:
+        :param options:
+        :return Iterator:
+        """
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name: str) -> None:
+        """
+        Write the gzip compressed sibling of the file if it is smaller than the file
+        :param str name:
+        :return None:
+        """
+        with self.open(name) as file:
+            content = file.read()
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if self.exists(f"{name}.gz"):
+            self.delete(f"{name}.gz")
+        if len(compressed) < len(content):
+            self._save(f"{name}.gz", ContentFile(compressed))
+
+
+class AssetMiddleware:
+    """
+    Middleware serving the files collected in STATIC_ROOT. Files with the content hash in their names are cached by
+    browsers for a year without revalidation, the gzip compressed sibling is sent to the clients accepting it.
+    The middleware is async capable, so under ASGI the other requests pass through it without switching to a thread.
+    """
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response) -> None:
+        if not settings.STATIC_ROOT or not settings.STATIC_URL:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix: str = '/' + settings.STATIC_URL.lstrip('/')
+        self.root: Path = Path(settings.STATIC_ROOT).resolve()
+        # names with the content hash from the manifest written by collectstatic, which runs before the server starts
+        self.hashed_names: set[str] = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.is_asset(request):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_asset(request):
+            response = await sync_to_async(self.serve, thread_sensitive=False)(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def is_asset(self, request: HttpRequest) -> bool:
+        """
+        Return True if the request may ask for a collected file
+        :param HttpRequest request:
+        :return bool:
+        """
+        return request.path.startswith(self.prefix) and request.method in ('GET', 'HEAD')
+
+    def serve(self, request: HttpRequest, name: str) -> HttpResponse | None:
+        """
+        Return the response with the collected file, or None if there is no such file
+        :param HttpRequest request:
+        :param str name: name of the file relative to STATIC_ROOT
+        :return HttpResponse | None:
+        """
+        path = (self.root / name).resolve()
+        if not path.is_relative_to(self.root) or not path.is_file():
+            return None
+        stat = path.stat()
+        immutable = name in self.hashed_names
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            compressed = path.with_name(f"{path.name}.gz")
+            if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '') and compressed.is_file():
+                response = FileResponse(compressed.open('rb'), content_type=content_type)
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = FileResponse(path.open('rb'), content_type=content_type)
+            response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else CACHE_CONTROL
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
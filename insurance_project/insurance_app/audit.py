@@ -0,0 +1,194 @@
+"""
+Module containing the audit of the query plans of the list pages. Each audited page is requested with representative
+parameters, the SELECT queries it executes are explained by EXPLAIN QUERY PLAN and the steps reading a whole table
+without an index (a full SCAN) or sorting the rows in a temporary B-tree are reported as problems. Scans of an index
+are fine, they read the rows in the requested order and stop at the LIMIT of the page.
+
+Run by the audit_queries command against a real database and by the tests, so a list falling back to a scan after a
+change of its queryset or of the indexes fails the build.
+"""
+import contextlib
+from typing import Iterator, NamedTuple
+
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from insurance_app import models
+from insurance_app.pagination import KeysetPaginator
+
+# tables whose size doesn't grow with the portfolio, reading them whole is cheaper than an index
+SMALL_TABLES: tuple = (
+    models.Product._meta.db_table,
+    models.ProductMonthSummary._meta.db_table,
+)
+SORT: str = 'USE TEMP B-TREE'
+
+
+class Page(NamedTuple):
+    """
+    List page requested by the audit. The values of the query parameters are formatted with the representative
+    objects returned by objects().
+    """
+    url_name: str
+    role: str  # 'client' or 'staff'
+    query: dict = {}
+    allowed: tuple = ()  # beginnings of the plan steps accepted on this page, with the reason in a comment
+
+
+PAGES: tuple = (
+    Page('clients-list', 'staff'),
+    Page('clients-list', 'staff', {'page': '{last_page}'}),
+    # the matches are sorted by the relevance computed by the full-text index
+    Page('clients-list', 'staff', {'q': '{surname}'}, allowed=('USE TEMP B-TREE FOR ORDER BY',)),
+    Page('contracts-list', 'staff'),
+    Page('products-list', 'staff'),
+    Page('pending-event-list', 'staff'),
+    Page('pending-event-list', 'staff', {'after': '{pending_cursor}'}),
+    Page('pending-event-list', 'staff', {'before': '{pending_cursor}'}),
+    Page('pending-event-list', 'staff', {'age': 'month'}),
+    # the events of the product are collected through the index of its contracts and sorted, the queue index can't
+    # be used without copying the product to the events
+    Page('pending-event-list', 'staff', {'product': '{product}'}, allowed=('USE TEMP B-TREE FOR ORDER BY',)),
+    Page('processsed-event-list', 'staff'),
+    Page('processsed-event-list', 'staff', {'after': '{processed_cursor}'}),
+    Page(
+        'processsed-event-list', 'staff', {'age': 'old', 'product': '{product}'},
+        allowed=('USE TEMP B-TREE FOR ORDER BY',)
+    ),
+    Page('my-contracts', 'client'),
+    # the events of all contracts of one client are sorted together
+    Page('event-list', 'client', allowed=('USE TEMP B-TREE FOR ORDER BY',)),
+)
+
+
+class Finding(NamedTuple):
+    """
+    Problematic step of the plan of a query executed by a page
+    """
+    page: str
+    step: str
+    sql: str
+
+
+def objects(using: str = 'default') -> dict:
+    """
+    Return the representative objects of the audited pages: the client of the oldest pending event and its product
+    :param str using: database alias
+    :return dict:
+    """
+    event = models.InsuredEvent.objects.using(using).select_related('contract__insured')\
+        .filter(processed=False).order_by('reporting_date', 'pk').first()
+    processed = models.InsuredEvent.objects.using(using).filter(processed=True)\
+        .order_by('reporting_date', 'pk').first()
+    if event is None or processed is None:
+        raise ValueError("The audit needs at least one pending and one processed insured event")
+    staff = models.Person.objects.using(using).filter(is_staff=True).first()
+    if staff is None:
+        raise ValueError("The audit needs a staff member")
+    paginator = KeysetPaginator(models.InsuredEvent.objects.none(), 'reporting_date', 1)
+    clients = models.Person.objects.using(using).filter(is_staff=False).count()
+    return {
+        'client': event.contract.insured,
+        'staff': staff,
+        'surname': event.contract.insured.last_name,
+        'product': event.contract.product_id,
+        'pending_cursor': paginator.encode_cursor(event),
+        'processed_cursor': paginator.encode_cursor(processed),
+        'last_page': max(1, -(-clients // 10)),
+    }
+
+
+def url(page: Page, representatives: dict) -> str:
+    """
+    Return the URL of the page with its query parameters
+    :param Page page:
+    :param dict representatives: objects returned by objects()
+    :return str:
+    """
+    kwargs = {'pk': representatives['client'].pk} if page.url_name == 'contracts-list' else {}
+    path = reverse(page.url_name, kwargs=kwargs)
+    query = '&'.join(f'{name}={value.format(**representatives)}' for name, value in page.query.items())
+    return f"{path}?{query}" if query else path
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[list]:
+    """
+    Context manager collecting the (alias, sql, params) of the SELECT queries executed in the block on every database,
+    a router may send the reads of a page to another database than the default one
+    :return Iterator[list]:
+    """
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            queries.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield queries
+
+
+def plan(sql: str, params, using: str = 'default') -> list[str]:
+    """
+    Return the steps of the query plan
+    :param str sql:
+    :param params:
+    :param str using: database alias
+    :return list: details of the steps
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(steps: list[str], allowed: tuple = ()) -> list[str]:
+    """
+    Return the steps of the plan reading a whole table which isn't small without an index or sorting the rows in
+    a temporary B-tree
+    :param list steps: details of the steps returned by plan()
+    :param tuple allowed: beginnings of the accepted steps
+    :return list:
+    """
+    return [step for step in steps if (is_full_scan(step) or step.startswith(SORT)) and not step.startswith(allowed)]
+
+
+def is_full_scan(step: str) -> bool:
+    """
+    Return True if the step of the plan reads a whole table which isn't small without an index
+    :param str step:
+    :return bool:
+    """
+    words = step.split()
+    return words[0] == 'SCAN' and 'USING' not in words and 'VIRTUAL' not in words and words[1] not in SMALL_TABLES
+
+
+def audit(pages: tuple = PAGES, using: str = 'default') -> tuple[list[Finding], int]:
+    """
+    Request the pages and explain their queries
+    :param tuple pages: audited pages
+    :param str using: database alias
+    :return tuple: the findings and the number of explained queries
+    """
+    if connections[using].vendor != 'sqlite':
+        raise NotImplementedError("The query plans are audited only on SQLite")
+    representatives = objects(using)
+    clients = {}
+    for role in {page.role for page in pages}:
+        clients[role] = Client(HTTP_HOST='localhost')
+        clients[role].force_login(representatives[role])
+    findings, explained = [], 0
+    for page in pages:
+        path = url(page, representatives)
+        with collect() as queries:
+            response = clients[page.role].get(path)
+        if response.status_code != 200:
+            raise ValueError(f"{path} returned {response.status_code}")
+        for alias, sql, params in dict.fromkeys((alias, sql, tuple(params or ())) for alias, sql, params in queries):
+            explained += 1
+            # explained on the database which executed the query
+            findings += [Finding(path, step, sql) for step in problems(plan(sql, params, alias), page.allowed)]
+    return findings, explained
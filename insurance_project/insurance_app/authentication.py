@@ -0,0 +1,147 @@
+"""
+Module containing the cached loading of the authenticated user (CachedAuthenticationMiddleware replacing Django's
+AuthenticationMiddleware). Most requests need only a few fields of the user: the pk for filtering its objects and the
+name and the flags rendered by the header, so the full row of the Person isn't loaded for them. The header fields are
+cached per user and session hash in the cache configured in settings.USER_CACHE['CACHE'], request.user answers them
+from the cache and loads the full model (with the usual verification of the session) only when a view reads another
+attribute.
+
+The session hash is derived from the password, so a changed password gives a new key. Every save and delete of a
+Person replaces the version of its entries. With the default per-process cache another worker process sees the change
+at most settings.USER_CACHE['TIMEOUT'] seconds late, a cache shared by the processes sees it immediately. Updates of
+the persons by a queryset bypass the invalidation and should call invalidate().
+"""
+import uuid
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpRequest
+from django.utils.functional import SimpleLazyObject, empty
+
+DEFAULTS: dict = {
+    'CACHE': 'default',
+    'TIMEOUT': 5,  # seconds an entry is used, the delay of the changes made by the other processes
+}
+KEY_PREFIX: str = 'auth-user'
+HEADER_FIELDS: tuple = ('pk', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'USER_CACHE', {})}
+
+
+class CachedUser(SimpleLazyObject):
+    """
+    Authenticated user answering the header fields from the cache and loading the full model on the first access to
+    any other attribute
+    """
+    def __init__(self, header: dict, func) -> None:
+        self.__dict__['_header'] = header
+        super().__init__(func)
+
+    def __getattr__(self, name: str):
+        if self._wrapped is empty and name in self._header:
+            return self._header[name]
+        return super().__getattr__(name)
+
+    @property
+    def __class__(self) -> type:
+        # the templates and the ORM check the class of the objects, the cached user is an instance of the user model
+        if self._wrapped is empty:
+            return get_user_model()
+        return type(self._wrapped)
+
+    def __getitem__(self, key):
+        if self._wrapped is empty:
+            # the templates try the item before the attribute, the user isn't subscriptable
+            raise TypeError(f"'{get_user_model().__name__}' object is not subscriptable")
+        return self._wrapped[key]
+
+    def __str__(self) -> str:
+        if self._wrapped is empty:
+            return self._header['str']
+        return str(self._wrapped)
+
+
+def header(user: AbstractBaseUser) -> dict:
+    """
+    Return the cached fields of the user
+    :param AbstractBaseUser user:
+    :return dict:
+    """
+    fields = {name: getattr(user, name) for name in HEADER_FIELDS}
+    return {**fields, 'id': user.pk, 'is_authenticated': True, 'is_anonymous': False, 'str': str(user)}
+
+
+def _version_key(pk) -> str:
+    return f'{KEY_PREFIX}:{pk}'
+
+
+def get_user(request: HttpRequest) -> CachedUser | AbstractBaseUser | AnonymousUser:
+    """
+    Return the user of the request, the cached header of the user if it exists, otherwise the user loaded by Django.
+    The user is cached on the request like by AuthenticationMiddleware.
+    :param HttpRequest request:
+    :return CachedUser | AbstractBaseUser | AnonymousUser:
+    """
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = _get_user(request)
+    return request._cached_user
+
+
+def _get_user(request: HttpRequest) -> CachedUser | AbstractBaseUser | AnonymousUser:
+    session = request.session
+    try:
+        pk = session[auth.SESSION_KEY]
+        backend = session[auth.BACKEND_SESSION_KEY]
+        session_hash = session[auth.HASH_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+    if backend not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+    options = config()
+    cache = caches[options['CACHE']]
+    # the version is read before the user, an entry of the user loaded before a change is saved under the old version
+    version = cache.get_or_set(_version_key(pk), _new_version, timeout=None)
+    key = f'{KEY_PREFIX}:{pk}:{version}:{session_hash}'
+    cached = cache.get(key)
+    if cached is not None:
+        return CachedUser(cached, lambda: auth.get_user(request))
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, header(user), options['TIMEOUT'])
+    return user
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex
+
+
+def invalidate(pk, using: str | None = None) -> None:
+    """
+    Drop the cached entries of the user now and after the commit of the transaction, a request which read the user
+    before the commit doesn't keep the old values
+    :param pk: primary key of the user
+    :param str using: database alias of the transaction
+    :return None:
+    """
+    def replace_version() -> None:
+        caches[config()['CACHE']].set(_version_key(pk), _new_version(), timeout=None)
+
+    replace_version()
+    transaction.on_commit(replace_version, using=using)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware setting request.user by get_user() of this module
+    """
+    def process_request(self, request: HttpRequest) -> None:
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
@@ -5,13 +5,16 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
 from django.http import HttpRequest
 
+from .throttling import throttle
+
 
 UserModel = get_user_model()
 
 
 class EmailBackend(ModelBackend):
     """
-    Backend allowing authentication via e-mail address and password
+    Backend allowing authentication via e-mail address and password. Attempts are throttled before any password is
+    hashed, the time until the next allowed attempt is stored in request.login_retry_after.
     """
     def authenticate(self, request: HttpRequest, username: str = None, password: str = None, **kwargs):
         """
@@ -26,6 +29,11 @@ class EmailBackend(ModelBackend):
             username = kwargs.get(UserModel.USERNAME_FIELD)
         if username is None or password is None:
             return
+        decision = throttle.check(username, throttle.client_ip(request) if request is not None else None)
+        if decision.retry_after:
+            if request is not None:
+                request.login_retry_after = decision.retry_after
+            return
         try:
             user = UserModel.objects.get_by_natural_key(username)
         except UserModel.DoesNotExist:
@@ -34,4 +42,6 @@ class EmailBackend(ModelBackend):
             UserModel().set_password(password)
         else:
             if user.check_password(password):
+                throttle.succeeded(username, decision)
                 return user
+        throttle.failed(username, decision)
@@ -0,0 +1,84 @@
+"""
+Module containing the annual billing: an Invoice of the annual premium (Contract.payment) of each contract concluded
+by the end of the billed year. The invoices are generated by set-based INSERT ... SELECT statements over ranges of the
+primary keys of the contracts, each range in a short transaction together with the checkpoint of the run
+(ImportCheckpoint), so the web workers wait for the write lock at most one range and an interrupted run continues
+behind the last billed range. The NOT EXISTS condition backed by the unique constraint of the contract and the period
+makes a repeated run generate only the missing invoices.
+"""
+import datetime
+from typing import Callable
+
+from django.db import connections, transaction
+from django.db.models import Max
+
+from . import models
+
+CHUNK_SIZE: int = 10_000  # primary keys of the contracts billed in one transaction
+DUE_DAYS: int = 30  # days between the issue and the due date of an invoice
+
+
+def checkpoint_source(period: int) -> str:
+    """
+    Return the source of the ImportCheckpoint of the billing run of the period
+    :param int period: the year
+    :return str:
+    """
+    return f'billing:{period}'
+
+
+def reset(period: int, using: str = 'default') -> None:
+    """
+    Forget the checkpoint, the next run goes through all contracts again (and generates only the missing invoices)
+    :param int period: the year
+    :param str using: database alias
+    :return None:
+    """
+    models.ImportCheckpoint.objects.using(using).filter(source=checkpoint_source(period)).delete()
+
+
+def run(
+    period: int, issue_date: datetime.date | None = None, chunk_size: int = CHUNK_SIZE, using: str = 'default',
+    progress: Callable[[int, int, int], None] | None = None
+) -> int:
+    """
+    Generate the invoices of the period for the contracts behind the checkpoint of the previous run
+    :param int period: the billed year
+    :param datetime.date issue_date: today by default
+    :param int chunk_size: primary keys of the contracts billed in one transaction
+    :param str using: database alias
+    :param Callable progress: called with the last billed primary key, the last primary key and the number of the
+        generated invoices after each range
+    :return int: number of the generated invoices
+    """
+    issue_date = issue_date or datetime.date.today()
+    connection = connections[using]
+    ops = connection.ops
+    invoice, contract = models.Invoice._meta, models.Contract._meta
+    sql = (
+        f"INSERT INTO {invoice.db_table} (contract_id, period, amount, issue_date, due_date) "
+        f"SELECT c.id, %s, c.payment, %s, %s FROM {contract.db_table} c "
+        f"WHERE c.id > %s AND c.id <= %s AND c.conclusion_date <= %s AND NOT EXISTS "
+        f"(SELECT 1 FROM {invoice.db_table} i WHERE i.contract_id = c.id AND i.period = %s)"
+    )
+    dates = [
+        ops.adapt_datefield_value(issue_date),
+        ops.adapt_datefield_value(issue_date + datetime.timedelta(days=DUE_DAYS)),
+    ]
+    end = ops.adapt_datefield_value(datetime.date(period, 12, 31))
+    checkpoints = models.ImportCheckpoint.objects.using(using)
+    checkpoint, _ = checkpoints.get_or_create(source=checkpoint_source(period))
+    last = checkpoint.position
+    maximum = models.Contract.objects.using(using).aggregate(maximum=Max('pk'))['maximum'] or 0
+    created = 0
+    while last < maximum:
+        upper = min(last + chunk_size, maximum)
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [period, *dates, last, upper, end, period])
+                created += cursor.rowcount
+            checkpoints.filter(pk=checkpoint.pk).update(position=upper)
+        last = upper
+        if progress is not None:
+            progress(last, maximum, created)
+    return created
@@ -0,0 +1,51 @@
+"""
+Module containing the database cache shared by the worker processes. Django's DatabaseCache increments a value by a
+get() and a set() in separate statements, so the concurrent increments of the processes overwrite each other, and the
+set() replaces the expiry of the value with the default timeout. DatabaseCache.incr() of this module reads and writes
+the value in one transaction and keeps its expiry: the transaction takes the write lock of SQLite at its start
+(BEGIN IMMEDIATE of insurance_app.sqlite), other databases lock the row by SELECT ... FOR UPDATE.
+
+    CACHES = {'shared': {'BACKEND': 'insurance_app.cache.DatabaseCache', 'LOCATION': ...}}
+"""
+import base64
+import pickle
+
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+
+class DatabaseCache(BaseDatabaseCache):
+    """
+    Database cache incrementing the values atomically
+    """
+    def incr(self, key, delta: int = 1, version=None) -> int:
+        """
+        Add the delta to the value of the key without changing its expiry
+        :param key:
+        :param int delta:
+        :param version:
+        :return int: new value
+        """
+        key = self.make_and_validate_key(key, version=version)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now().replace(microsecond=0, tzinfo=None))
+        lock = " FOR UPDATE" if connection.features.has_select_for_update else ""
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {quote_name('value')} FROM {table} "
+                f"WHERE {quote_name('cache_key')} = %s AND {quote_name('expires')} > %s{lock}",
+                [key, now]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(base64.b64decode(connection.ops.process_clob(row[0]).encode())) + delta
+            cursor.execute(
+                f"UPDATE {table} SET {quote_name('value')} = %s WHERE {quote_name('cache_key')} = %s",
+                [base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1'), key]
+            )
+        return value
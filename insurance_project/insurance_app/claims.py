@@ -0,0 +1,86 @@
+"""
+Module containing the processing of insured events in bulk. The events are approved or rejected by set-based UPDATEs
+of batches of primary keys in one transaction and their contribution to the reporting summaries is aggregated by the
+database, the events are never loaded as model instances. Only the events still pending when the transaction starts
+are processed, the events processed meanwhile by somebody else are skipped. The events decided by an adjudication
+rule (insurance_app.adjudication) remember the rule.
+"""
+from typing import NamedTuple
+
+from django.db import router, transaction
+from django.db.models import Case, IntegerField, QuerySet, Value, When
+
+from . import models, reporting, utils
+
+BATCH_SIZE: int = 500  # primary keys in one UPDATE, below the limit of the SQL variables
+
+
+class Result(NamedTuple):
+    """
+    Summary of a bulk processing
+    """
+    processed: int
+    payout: int  # sum of the approved payouts
+    skipped: int  # requested events which weren't pending anymore
+
+
+def process(
+    events: QuerySet, approve: bool, payout: int | None = None, payouts: dict[int, int] | None = None,
+    using: str | None = None
+) -> Result:
+    """
+    Approve or reject the pending events of the queryset
+    :param QuerySet events: insured events, the processed ones are skipped
+    :param bool approve: True to approve, False to reject the events
+    :param int payout: payout of the approved events without their own payout
+    :param dict payouts: {pk: payout} of the individual approved events
+    :param str using: database alias, the database for writing the events by default
+    :return Result:
+    """
+    using = using or router.db_for_write(models.InsuredEvent)
+    payouts = payouts or {}
+    with transaction.atomic(using=using):
+        requested = list(events.using(using).select_for_update().order_by('pk').values_list('pk', 'processed'))
+        pending = [pk for pk, processed in requested if not processed]
+        if approve and payout is None and any(pk not in payouts for pk in pending):
+            raise ValueError("Approved events need a payout")
+        total = update(pending, approve, payout, payouts, using=using)
+    return Result(len(pending), total, len(requested) - len(pending))
+
+
+def update(
+    pks: list[int], approve: bool, payout: int | None = None, payouts: dict[int, int] | None = None,
+    rule: models.AdjudicationRule | None = None, using: str = 'default'
+) -> int:
+    """
+    Mark the events processed and add them to the summaries. Must be called in a transaction which found the events
+    pending, an event processed twice would be counted twice in the summaries.
+    :param list pks: primary keys of the pending events
+    :param bool approve: True to approve, False to reject the events
+    :param int payout: payout of the approved events without their own payout
+    :param dict payouts: {pk: payout} of the individual approved events
+    :param AdjudicationRule rule: rule which decided the events, None for a decision of the staff
+    :param str using: database alias
+    :return int: sum of the approved payouts
+    """
+    payouts = payouts or {}
+    deltas = {}
+    for batch in utils.chunks(pks, BATCH_SIZE):
+        rows = models.InsuredEvent.objects.using(using).filter(pk__in=batch)
+        rows.update(processed=True, approved=approve, payout=_payout(batch, approve, payout, payouts), rule=rule)
+        deltas = reporting.merge(deltas, reporting.events_deltas(rows))
+    reporting.apply(deltas, using)
+    return sum(counters['approved_payout'] for counters in deltas.values())
+
+
+def _payout(batch: list[int], approve: bool, payout: int | None, payouts: dict[int, int]):
+    """
+    Return the value of the payout column of the batch: the individual payouts in a CASE, the uniform payout or NULL
+    of the rejected events
+    """
+    if not approve:
+        return None
+    whens = [When(pk=pk, then=Value(payouts[pk])) for pk in batch if pk in payouts]
+    if not whens:
+        return payout
+    return Case(*whens, default=Value(payout), output_field=IntegerField())
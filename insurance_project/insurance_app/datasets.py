@@ -0,0 +1,389 @@
+"""
+Module generating synthetic portfolios for the load tests, the benchmarks and the demos: clients with Czech names,
+addresses and phone numbers, their contracts spread over the products and the years and the insured events with
+realistic ratios of the processed and approved claims and payouts. The same seed and reference date on an empty
+database always produce the same data.
+
+The rows are generated column by column for a whole batch and written by executemany() of plain INSERT statements,
+skipping the model instances, the password hashing (all clients get an unusable password and set it by the link
+from Person.get_set_password_url()) and the auto_now_add dates. The slugs, the normalized names and the full-text
+index rows are computed the same way as by Person.save(), the reporting summaries are rebuilt at the end.
+"""
+import datetime
+import math
+import random
+from functools import lru_cache
+from typing import Callable, NamedTuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from . import models, numbering, reporting, search
+
+BATCH_SIZE: int = 10_000  # clients generated and inserted in a transaction; part of the seed, changes the data
+HISTORY_YEARS: int = 10  # contracts are concluded over the last years
+STAFF_EMAIL: str = 'spravce@example.cz'
+COUNTRY: str = 'Česká republika'
+REFERENCE_DATE: datetime.date = datetime.date(2025, 1, 1)  # "today" of the generated data, fixed to keep it repeatable
+
+
+class ProductProfile(NamedTuple):
+    """
+    Generated product with the distributions of its contracts and claims
+    """
+    name: str
+    description: str
+    image: str
+    weight: int  # share of the contracts
+    payment: tuple[int, int]  # range of the annual premium in CZK
+    claim_rate: float  # expected claims per contract and year
+    payout: int  # median payout in CZK, the payouts are log-normally distributed
+    payout_sigma: float
+    claims: tuple  # descriptions of the claims
+
+
+PRODUCTS: tuple = (
+    ProductProfile(
+        'Pojištění domácnosti', 'Pojištění vybavení domácnosti proti požáru, vodě, krádeži a vandalismu.',
+        'images/gallery-1494242436-family-playing-in-bed.jpg', 22, (1_200, 6_000), 0.06, 15_000, 1.0,
+        ('Vytopení bytu sousedem', 'Krádež jízdního kola ze sklepa', 'Poškození elektroniky přepětím'),
+    ),
+    ProductProfile(
+        'Pojištění nemovitosti', 'Pojištění domu, bytu nebo chaty proti živelním pohromám.',
+        'images/shutterstock_162633491-1024x682.jpg', 14, (2_000, 12_000), 0.04, 60_000, 1.1,
+        ('Poškození střechy vichřicí', 'Prasklé potrubí ve zdi', 'Zatečení do podkroví při krupobití'),
+    ),
+    ProductProfile(
+        'Havarijní pojištění', 'Pojištění vlastního vozidla pro případ havárie, odcizení a živelní události.',
+        'images/gm-88b19095-c369-465f-8112-147fa619a0a4-cars-with-happiest-ownersnews-main.jpeg', 12,
+        (6_000, 25_000), 0.12, 35_000, 0.9,
+        ('Střet se zvěří', 'Poškození vozidla na parkovišti', 'Rozbité čelní sklo'),
+    ),
+    ProductProfile(
+        'Povinné ručení', 'Pojištění odpovědnosti za škodu způsobenou provozem vozidla.',
+        'images/gm-88b19095-c369-465f-8112-147fa619a0a4-cars-with-happiest-ownersnews-main.jpeg', 24,
+        (2_500, 9_000), 0.08, 40_000, 1.0,
+        ('Dopravní nehoda na křižovatce', 'Naražení do zaparkovaného vozidla', 'Poškození plotu při couvání'),
+    ),
+    ProductProfile(
+        'Životní pojištění', 'Rizikové životní pojištění pro případ smrti, invalidity a vážných onemocnění.',
+        'images/couple-ge77c94c8c_640.jpg', 10, (6_000, 36_000), 0.02, 150_000, 0.8,
+        ('Diagnóza závažného onemocnění', 'Invalidita po úrazu', 'Dlouhodobá pracovní neschopnost'),
+    ),
+    ProductProfile(
+        'Úrazové pojištění', 'Pojištění trvalých následků úrazu a doby nezbytného léčení.',
+        'images/962830.jpg', 8, (1_500, 6_000), 0.05, 20_000, 0.9,
+        ('Zlomenina ruky na lyžích', 'Podvrtnutý kotník při sportu', 'Pád ze žebříku'),
+    ),
+    ProductProfile(
+        'Cestovní pojištění', 'Léčebné výlohy, zavazadla a odpovědnost na cestách do zahraničí.',
+        'images/couple-ge77c94c8c_640.jpg', 6, (500, 3_000), 0.07, 8_000, 1.2,
+        ('Ošetření v zahraniční nemocnici', 'Ztráta zavazadla na letišti', 'Zrušení zájezdu z důvodu nemoci'),
+    ),
+    ProductProfile(
+        'Pojištění odpovědnosti', 'Pojištění odpovědnosti za škodu způsobenou v běžném občanském životě.',
+        'images/962830.jpg', 4, (800, 4_000), 0.03, 25_000, 1.1,
+        ('Rozbité okno souseda', 'Poškození zapůjčené věci', 'Pokousání cizí osoby psem'),
+    ),
+)
+# (name, weight) by the frequency of the names in the Czech population
+MALE_FIRST_NAMES: tuple = (
+    ('Jiří', 30), ('Jan', 29), ('Petr', 28), ('Josef', 20), ('Pavel', 20), ('Martin', 18), ('Tomáš', 17),
+    ('Jaroslav', 16), ('Miroslav', 15), ('Zdeněk', 13), ('Václav', 12), ('Michal', 12), ('František', 11),
+    ('Jakub', 10), ('Milan', 10), ('Karel', 10), ('Lukáš', 9), ('David', 9), ('Vladimír', 8), ('Ondřej', 8),
+    ('Ladislav', 7), ('Roman', 6), ('Stanislav', 6), ('Marek', 6), ('Radek', 5), ('Daniel', 5), ('Antonín', 5),
+    ('Vojtěch', 4), ('Matěj', 4), ('Štěpán', 3),
+)
+FEMALE_FIRST_NAMES: tuple = (
+    ('Marie', 27), ('Jana', 26), ('Eva', 18), ('Hana', 16), ('Anna', 15), ('Lenka', 13), ('Kateřina', 13),
+    ('Lucie', 12), ('Věra', 11), ('Alena', 11), ('Petra', 11), ('Veronika', 10), ('Jaroslava', 9), ('Tereza', 9),
+    ('Martina', 9), ('Michaela', 8), ('Jitka', 8), ('Helena', 7), ('Ludmila', 7), ('Zdeňka', 6), ('Ivana', 6),
+    ('Monika', 6), ('Eliška', 5), ('Zuzana', 5), ('Markéta', 5), ('Barbora', 5), ('Šárka', 4), ('Klára', 4),
+    ('Dagmar', 3), ('Růžena', 2),
+)
+# (male form, female form, weight)
+LAST_NAMES: tuple = (
+    ('Novák', 'Nováková', 70), ('Svoboda', 'Svobodová', 52), ('Novotný', 'Novotná', 50), ('Dvořák', 'Dvořáková', 46),
+    ('Černý', 'Černá', 37), ('Procházka', 'Procházková', 33), ('Kučera', 'Kučerová', 32), ('Veselý', 'Veselá', 27),
+    ('Horák', 'Horáková', 25), ('Němec', 'Němcová', 23), ('Marek', 'Marková', 21), ('Pospíšil', 'Pospíšilová', 21),
+    ('Pokorný', 'Pokorná', 20), ('Hájek', 'Hájková', 20), ('Král', 'Králová', 19), ('Jelínek', 'Jelínková', 19),
+    ('Růžička', 'Růžičková', 18), ('Beneš', 'Benešová', 18), ('Fiala', 'Fialová', 17), ('Sedláček', 'Sedláčková', 16),
+    ('Doležal', 'Doležalová', 16), ('Zeman', 'Zemanová', 16), ('Kolář', 'Kolářová', 15),
+    ('Navrátil', 'Navrátilová', 15), ('Čermák', 'Čermáková', 14), ('Vaněk', 'Vaňková', 14), ('Urban', 'Urbanová', 13),
+    ('Blažek', 'Blažková', 13), ('Kříž', 'Křížová', 12), ('Kovář', 'Kovářová', 12), ('Šimek', 'Šimková', 11),
+    ('Řezníček', 'Řezníčková', 8),
+)
+# (city, postal code, weight by the population in thousands)
+CITIES: tuple = (
+    ('Praha', '110 00', 1300), ('Brno', '602 00', 380), ('Ostrava', '702 00', 285), ('Plzeň', '301 00', 175),
+    ('Liberec', '460 01', 105), ('Olomouc', '779 00', 100), ('České Budějovice', '370 01', 95),
+    ('Hradec Králové', '500 02', 92), ('Ústí nad Labem', '400 01', 92), ('Pardubice', '530 02', 91),
+    ('Zlín', '760 01', 74), ('Havířov', '736 01', 70), ('Kladno', '272 01', 69), ('Most', '434 01', 65),
+    ('Opava', '746 01', 56), ('Frýdek-Místek', '738 01', 55), ('Karviná', '733 01', 51), ('Jihlava', '586 01', 51),
+    ('Teplice', '415 01', 49), ('Děčín', '405 02', 48), ('Karlovy Vary', '360 01', 48), ('Chomutov', '430 01', 48),
+    ('Jablonec nad Nisou', '466 01', 45), ('Mladá Boleslav', '293 01', 44), ('Prostějov', '796 01', 43),
+    ('Přerov', '750 02', 43), ('Česká Lípa', '470 01', 37), ('Třebíč', '674 01', 35), ('Tábor', '390 01', 34),
+    ('Znojmo', '669 02', 34), ('Kolín', '280 02', 32), ('Příbram', '261 01', 32), ('Cheb', '350 02', 32),
+)
+STREETS: tuple = (
+    'Masarykova', 'Husova', 'Nádražní', 'Školní', 'Palackého', 'Komenského', 'Havlíčkova', 'Sokolská', 'Tyršova',
+    'Jiráskova', 'Zahradní', 'Smetanova', 'Lidická', 'Žižkova', 'Riegrova', 'Nerudova', 'Polní', 'Krátká', 'Lipová',
+    'Luční', 'Na Výsluní', 'U Potoka', 'Družstevní', 'Revoluční', '28. října', '5. května', 'Čs. armády',
+    'Svatoplukova', 'Wolkerova', 'Třída Míru',
+)
+EMAIL_DOMAINS: tuple = (
+    ('seznam.cz', 40), ('email.cz', 20), ('gmail.com', 25), ('centrum.cz', 7), ('post.cz', 4), ('outlook.com', 4),
+)
+MOBILE_PREFIXES: tuple = (
+    *range(601, 609), *range(702, 706), *range(720, 740), *range(770, 780), *range(790, 800),
+)
+CONTRACTS_PER_CLIENT: tuple = ((0, 8), (1, 45), (2, 27), (3, 12), (4, 5), (5, 3))  # (contracts, weight)
+PHONE_RATIO: float = 0.85
+SETTLEMENT_DAYS: int = 30  # claims reported earlier are mostly processed
+APPROVED_RATIO: float = 0.78
+
+
+@lru_cache(maxsize=None)
+def _fold(text: str) -> str:
+    return search.fold(text)
+
+
+@lru_cache(maxsize=None)
+def _ascii(text: str) -> str:
+    return models.Person._remove_interpunction(text).lower()
+
+
+def _weighted(options: tuple) -> tuple[list, list]:
+    """
+    Return the values and the cumulative weights of the (value, ..., weight) options for random.choices()
+    :param tuple options:
+    :return tuple:
+    """
+    cumulative, total = [], 0
+    for option in options:
+        total += option[-1]
+        cumulative.append(total)
+    return [option[:-1] if len(option) > 2 else option[0] for option in options], cumulative
+
+
+class PortfolioGenerator:
+    """
+    Generator of the clients, contracts and insured events inserted into a database
+    """
+    def __init__(self, seed: int = 0, using: str = 'default', today: datetime.date = REFERENCE_DATE) -> None:
+        self.rng: random.Random = random.Random(seed)
+        self.using: str = using
+        self.connection = connections[using]
+        self.today: datetime.date = today
+        self.password: str = make_password(None)
+        self.counts: dict[str, int] = {'Person': 0, 'Contract': 0, 'InsuredEvent': 0}
+        self.products: list[tuple[int, ProductProfile]] = []
+        self._male = _weighted(MALE_FIRST_NAMES)
+        self._female = _weighted(FEMALE_FIRST_NAMES)
+        self._last_names = _weighted(LAST_NAMES)
+        self._cities = _weighted(CITIES)
+        self._domains = _weighted(EMAIL_DOMAINS)
+        self._contracts = _weighted(CONTRACTS_PER_CLIENT)
+
+    def generate(self, clients: int, progress: Callable[[dict], None] | None = None) -> dict:
+        """
+        Insert the clients with their contracts and events
+        :param int clients: number of the clients
+        :param Callable progress: called with the counts of the inserted rows after each batch
+        :return dict: numbers of the inserted rows by model name
+        """
+        self.products = self.create_products()
+        for first in range(0, clients, BATCH_SIZE):
+            with transaction.atomic(using=self.using):
+                persons = self.insert_persons(min(BATCH_SIZE, clients - first))
+                contracts = self.insert_contracts(persons)
+                self.insert_events(contracts)
+            if progress is not None:
+                progress(self.counts)
+        reporting.rebuild(using=self.using)
+        return self.counts
+
+    def create_products(self) -> list[tuple[int, ProductProfile]]:
+        """
+        Create the generated products missing in the database
+        :return list: (pk, profile) of the products
+        """
+        products = []
+        for profile in PRODUCTS:
+            product, _ = models.Product.objects.using(self.using).get_or_create(
+                name=profile.name, defaults={'description': profile.description, 'image': profile.image}
+            )
+            products.append((product.pk, profile))
+        return products
+
+    def insert_persons(self, count: int) -> list[tuple[int, datetime.date]]:
+        """
+        Insert the clients and their rows of the full-text index
+        :param int count:
+        :return list: (pk, date_of_birth) of the clients
+        """
+        rng = self.rng
+        ops = self.connection.ops
+        first_pk = _next_pk(models.Person, self.using)
+        females = [rng.random() < 0.51 for _ in range(count)]
+        male_names = rng.choices(self._male[0], cum_weights=self._male[1], k=count)
+        female_names = rng.choices(self._female[0], cum_weights=self._female[1], k=count)
+        last_names = rng.choices(self._last_names[0], cum_weights=self._last_names[1], k=count)
+        cities = rng.choices(self._cities[0], cum_weights=self._cities[1], k=count)
+        domains = rng.choices(self._domains[0], cum_weights=self._domains[1], k=count)
+        streets = rng.choices(STREETS, k=count)
+        births = [self.today - datetime.timedelta(days=rng.randint(18 * 365, 85 * 365)) for _ in range(count)]
+
+        persons, rows, documents = [], [], []
+        for index in range(count):
+            pk = first_pk + index
+            female = females[index]
+            first_name = female_names[index] if female else male_names[index]
+            last_name = last_names[index][1 if female else 0]
+            city, postal_code = cities[index]
+            email = f"{_ascii(first_name)}.{_ascii(last_name)}.{pk}@{domains[index]}"
+            phone = None
+            if rng.random() < PHONE_RATIO:
+                national = f"{rng.choice(MOBILE_PREFIXES)}{rng.randrange(1_000_000):06d}"
+                phone = f"+420{national}"
+            address1 = f"{streets[index]} {rng.randint(1, 2999)}"
+            if rng.random() < 0.3:
+                address1 += f"/{rng.randint(1, 60)}"  # descriptive and orientation number
+            address2 = f"byt č. {rng.randint(1, 40)}" if rng.random() < 0.05 else ""
+            persons.append((pk, births[index]))
+            rows.append((
+                pk, self.password, first_name, last_name, email, phone, address1, address2, postal_code, city,
+                COUNTRY, ops.adapt_datefield_value(births[index]), False, False,
+                f"{pk}-{_ascii(last_name)}-{_ascii(first_name)}", _fold(f"{last_name} {first_name}"),
+            ))
+            # the same document as search.document() of the saved person
+            documents.append((
+                pk, _fold(f"{last_name} {first_name}"), email.lower(),
+                f"420{phone[4:]} {phone[4:]}" if phone else "", _fold(city),
+            ))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {models.Person._meta.db_table} (id, password, first_name, last_name, email, phone, "
+                f"address1, address2, postal_code, city, country, date_of_birth, is_staff, is_superuser, slug, "
+                f"search_name) VALUES ({', '.join(['%s'] * 16)})",
+                rows
+            )
+            if search.is_enabled(self.using):
+                cursor.executemany(
+                    f"INSERT INTO {search.FTS_TABLE} (rowid, name, email, phone, city) VALUES (%s, %s, %s, %s, %s)",
+                    documents
+                )
+        self.counts['Person'] += count
+        return persons
+
+    def insert_contracts(self, persons: list[tuple[int, datetime.date]]) -> list[tuple]:
+        """
+        Insert the contracts of the clients, concluded over the last HISTORY_YEARS after the client came of age
+        :param list persons: (pk, date_of_birth) of the clients
+        :return list: (pk, product profile, conclusion_date) of the contracts
+        """
+        rng = self.rng
+        ops = self.connection.ops
+        next_pk = _next_pk(models.Contract, self.using)
+        counts = rng.choices(self._contracts[0], cum_weights=self._contracts[1], k=len(persons))
+        weights = [profile.weight for _, profile in self.products]
+        history = HISTORY_YEARS * 365
+        contracts, rows = [], []
+        for (person_pk, date_of_birth), count in zip(persons, counts):
+            adult = date_of_birth + datetime.timedelta(days=18 * 365)
+            days = min(history, (self.today - adult).days)
+            for product_pk, profile in rng.choices(self.products, weights=weights, k=count):
+                pk = next_pk + len(rows)
+                conclusion_date = self.today - datetime.timedelta(days=rng.randint(0, days))
+                low, high = profile.payment
+                contracts.append((pk, profile, conclusion_date))
+                rows.append((
+                    pk, product_pk, person_pk, ops.adapt_datefield_value(conclusion_date),
+                    rng.randrange(low, high, 100)
+                ))
+        numbers = numbering.contract_numbers.take(len(rows), self.using)
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {models.Contract._meta.db_table} "
+                f"(id, product_id, insured_id, conclusion_date, payment, contract_number) "
+                f"VALUES (%s, %s, %s, %s, %s, %s)",
+                [(*row, number) for row, number in zip(rows, numbers)]
+            )
+        self.counts['Contract'] += len(rows)
+        return contracts
+
+    def insert_events(self, contracts: list[tuple]) -> int:
+        """
+        Insert the insured events of the contracts. The number of the claims of a contract is Poisson distributed by
+        the claim rate of its product and its age, recently reported claims are mostly waiting for processing.
+        :param list contracts: (pk, product profile, conclusion_date) of the contracts
+        :return int: number of the inserted events
+        """
+        rng = self.rng
+        ops = self.connection.ops
+        rows = []
+        for contract_pk, profile, conclusion_date in contracts:
+            age = (self.today - conclusion_date).days
+            for _ in range(_poisson(rng, profile.claim_rate * age / 365)):
+                event_date = conclusion_date + datetime.timedelta(days=rng.randint(0, age))
+                reporting_date = min(self.today, event_date + datetime.timedelta(days=int(rng.expovariate(1 / 5))))
+                settled = (self.today - reporting_date).days > SETTLEMENT_DAYS
+                processed = rng.random() < (0.99 if settled else 0.4)
+                approved = processed and rng.random() < APPROVED_RATIO
+                payout = None
+                if approved:
+                    payout = rng.lognormvariate(math.log(profile.payout), profile.payout_sigma)
+                    payout = max(500, int(round(payout, -2)))
+                rows.append((
+                    contract_pk, ops.adapt_datefield_value(event_date), ops.adapt_datefield_value(reporting_date),
+                    rng.choice(profile.claims), processed, approved, payout,
+                ))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {models.InsuredEvent._meta.db_table} "
+                f"(contract_id, event_date, reporting_date, description, processed, approved, payout) "
+                f"VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                rows
+            )
+        self.counts['InsuredEvent'] += len(rows)
+        return len(rows)
+
+
+def build(scale: int, seed: int = 0, using: str = 'default', today: datetime.date = REFERENCE_DATE) -> dict:
+    """
+    Insert the dataset of the benchmarks into an empty database: a staff member and the generated portfolio
+    :param int scale: number of clients
+    :param int seed: seed of the random generator
+    :param str using: database alias
+    :param datetime.date today: reference date the contracts and the events are generated back from
+    :return dict: numbers of the inserted rows by model name
+    """
+    with transaction.atomic(using=using):
+        models.Person.objects.db_manager(using).bulk_insert([
+            models.Person(
+                email=STAFF_EMAIL, first_name='Správce', last_name='Systému', date_of_birth=datetime.date(1980, 1, 1),
+                is_staff=True, password=make_password(None)
+            )
+        ])
+    counts = PortfolioGenerator(seed, using, today).generate(scale)
+    counts['Person'] += 1
+    return counts
+
+
+def _poisson(rng: random.Random, expected: float) -> int:
+    """
+    Return a Poisson distributed number with the expected value (Knuth's algorithm, for small values)
+    :param random.Random rng:
+    :param float expected:
+    :return int:
+    """
+    limit = math.exp(-expected)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _next_pk(model, using: str) -> int:
+    return (model.objects.using(using).order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
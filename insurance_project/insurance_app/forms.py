@@ -1,9 +1,10 @@
 """
 Module containing form classes of the insurance_app
 """
-from typing import Any
+import math
 
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.core.exceptions import ValidationError
 from django.forms import DateField
 
 from . import models
@@ -20,10 +21,20 @@ class RegisterPersonForm(UserCreationForm):
         fields = ['email', 'password1', 'password2', 'first_name', 'last_name', 'date_of_birth', 'phone', 'address1',
                   'address2', 'city', 'postal_code', 'country']
 
-    def save(self, commit=True) -> Any:
-        # Save the provided password in hashed format
-        user = super().save(commit=False)
-        user.set_password(self.cleaned_data["password1"])
-        if commit:
-            user.save()
-        return user
+
+class LoginForm(AuthenticationForm):
+    """
+    Login form telling the user when the login attempts are throttled
+    """
+    def clean(self) -> dict:
+        try:
+            return super().clean()
+        except ValidationError:
+            retry_after = getattr(self.request, 'login_retry_after', None)
+            if retry_after:
+                raise ValidationError(
+                    'Příliš mnoho pokusů o přihlášení. Zkuste to prosím znovu za %(seconds)d s.',
+                    code='throttled',
+                    params={'seconds': math.ceil(retry_after)},
+                )
+            raise
@@ -0,0 +1,87 @@
+"""
+Module containing the parallel password hashing used for provisioning many user accounts at once.
+Hashing a password with the default PBKDF2 hasher costs around 100 ms of CPU, so the hashes are computed in a pool of
+processes, one per available core.
+"""
+import os
+import secrets
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterator
+
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+
+
+def default_processes() -> int:
+    """
+    Return the number of cores available to this process
+    :return int:
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def unusable_password() -> str:
+    """
+    Return a random unusable password. Equivalent to make_password(None), but a single random token is much cheaper than
+    the random string generated character by character.
+    :return str:
+    """
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30)
+
+
+def _init_worker() -> None:
+    """
+    Set up Django in a worker process started by the 'spawn' method, forked workers inherit it
+    :return None:
+    """
+    if not apps.ready:
+        django.setup()
+
+
+def _hash(password: str | None) -> str:
+    """
+    Return the hash of the password, or an unusable password if None is given
+    :param str password:
+    :return str:
+    """
+    if password is None:
+        return unusable_password()
+    return make_password(password)
+
+
+class PasswordHasherPool:
+    """
+    Pool of processes hashing passwords. With a single process the passwords are hashed in the calling process.
+    Use as a context manager.
+    """
+    def __init__(self, processes: int | None = None) -> None:
+        """
+        :param int processes: number of worker processes, all available cores by default
+        """
+        self.processes: int = processes or default_processes()
+        self.executor: Executor | None = None
+
+    def __enter__(self) -> 'PasswordHasherPool':
+        if self.processes > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def map(self, passwords: list[str | None]) -> Iterator[str]:
+        """
+        Return an iterator of the hashes in the order of the passwords. In the pool the work is submitted immediately,
+        so the caller can do something else (e.g. insert the previous batch) before consuming the iterator.
+        :param list passwords:
+        :return Iterator:
+        """
+        if self.executor is None:
+            return map(_hash, passwords)
+        chunk_size = max(1, len(passwords) // (self.processes * 4))
+        return self.executor.map(_hash, passwords, chunksize=chunk_size)
@@ -0,0 +1,151 @@
+"""
+Module containing the responsive derivatives of the product images. An uploaded image is resized to several widths in
+WebP and JPEG formats by a background worker, the derivatives are stored next to the original with a content hash in
+the file name (so they can be cached forever) and listed in Product.image_variants. Until the derivatives of the current
+image exist, the templates show the original.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+WIDTHS: tuple = (320, 480, 640, 960)
+FORMATS: dict[str, dict] = {  # extension: options of Image.save()
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+}
+MIME_TYPES: dict[str, str] = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+DIRECTORY: str = 'variants'
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock: threading.Lock = threading.Lock()
+
+
+def render(source, width: int, extension: str) -> bytes:
+    """
+    Return the image resized to the given width and encoded in the given format
+    :param Image.Image source: image with the orientation from EXIF already applied
+    :param int width:
+    :param str extension: key of FORMATS
+    :return bytes:
+    """
+    height = max(1, round(source.height * width / source.width))
+    image = source.resize((width, height), Image.Resampling.LANCZOS) if width != source.width else source
+    if image.mode not in ('RGB', 'RGBA') or (extension == 'jpg' and image.mode == 'RGBA'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, **FORMATS[extension])
+    return buffer.getvalue()
+
+
+def variant_name(original: str, width: int, extension: str, content: bytes) -> str:
+    """
+    Return the storage name of a derivative, e.g. 'images/variants/car-480w.1a2b3c4d5e6f.webp'
+    :param str original: storage name of the original image
+    :param int width:
+    :param str extension:
+    :param bytes content: content of the derivative
+    :return str:
+    """
+    directory, filename = posixpath.split(original)
+    stem = posixpath.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join(directory, DIRECTORY, f"{stem}-{width}w.{digest}.{extension}")
+
+
+def generate(product) -> dict:
+    """
+    Create the derivatives of the product image in the storage and return their description for Product.image_variants.
+    The original is never upscaled, an original narrower than the widest derivative is also converted in its own width.
+    :param product: Product instance
+    :return dict: {'source': name of the original, 'width': ..., 'height': ..., 'variants': [{'width', 'format', 'name',
+        'size'}, ...]}
+    """
+    storage = product.image.storage
+    with product.image.open('rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    widths = [width for width in WIDTHS if width < source.width]
+    if source.width <= WIDTHS[-1]:
+        widths.append(source.width)
+    variants = []
+    for extension in FORMATS:
+        for width in widths:
+            content = render(source, width, extension)
+            name = variant_name(product.image.name, width, extension, content)
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            variants.append({'width': width, 'format': extension, 'name': name, 'size': len(content)})
+    return {'source': product.image.name, 'width': source.width, 'height': source.height, 'variants': variants}
+
+
+def process(pk: int) -> None:
+    """
+    Create the derivatives of the image of the product with the given primary key, store their description and delete
+    the derivatives of the previous image
+    :param int pk:
+    :return None:
+    """
+    from . import models, prerender
+
+    product = models.Product.objects.filter(pk=pk).first()
+    if product is None or not product.image:
+        return
+    previous = {variant['name'] for variant in (product.image_variants or {}).get('variants', [])}
+    description = generate(product)
+    current = {variant['name'] for variant in description['variants']}
+    # the image may have been replaced in the meantime, the description of an old image must not be stored
+    updated = models.Product.objects.filter(pk=pk, image=product.image.name).update(image_variants=description)
+    for name in (previous - current) if updated else (current - previous):
+        product.image.storage.delete(name)
+    if updated:
+        prerender.regenerate()
+
+
+def _run(pk: int) -> None:
+    """
+    Process the product in the worker thread, which has its own database connection
+    :param int pk:
+    :return None:
+    """
+    try:
+        process(pk)
+    except Exception:
+        logger.exception("Derivatives of the image of the product %s can't be created", pk)
+    finally:
+        connection.close()
+
+
+def schedule(pk: int) -> Future:
+    """
+    Process the image of the product in the background worker of this process, outside the request
+    :param int pk:
+    :return Future:
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-variants')
+    return _executor.submit(_run, pk)
+
+
+def srcset(variants: dict, extension: str, storage) -> str:
+    """
+    Return the srcset attribute listing the derivatives in the given format
+    :param dict variants: Product.image_variants
+    :param str extension:
+    :param storage: storage of the image
+    :return str:
+    """
+    return ", ".join(
+        f"{storage.url(variant['name'])} {variant['width']}w"
+        for variant in variants.get('variants', []) if variant['format'] == extension
+    )
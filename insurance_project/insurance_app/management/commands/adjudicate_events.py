@@ -0,0 +1,43 @@
+"""
+Management command deciding the pending insured events by the adjudication rules of their products
+(see insurance_app.adjudication), e.g. run periodically by cron
+"""
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from insurance_app import adjudication
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluate the active adjudication rules on the pending insured events, approve or reject the matching events "
+        "and leave the others in the queue of the staff."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--chunk-size', type=int, default=adjudication.CHUNK_SIZE, help="Events decided in one transaction"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Only count the events the rules would decide")
+        parser.add_argument('--database', default='default', help="Database alias")
+
+    def handle(self, *args, **options) -> None:
+        start = time.perf_counter()
+
+        def progress(evaluated: int, decided: Counter) -> None:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{evaluated} events evaluated, {sum(decided.values())} decided ({evaluated / elapsed:.0f} events/s)"
+            )
+
+        result = adjudication.run(options['chunk_size'], options['dry_run'], options['database'], progress)
+        for rule, count in sorted(result.decided.items(), key=lambda item: (item[0].product_id, item[0].priority)):
+            action = 'approved' if rule.approve else 'rejected'
+            self.stdout.write(f"{rule}: {count} {action}")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would decide' if options['dry_run'] else 'Decided'} {sum(result.decided.values())} of "
+            f"{result.evaluated} pending events in {elapsed:.1f} s ({result.evaluated / elapsed:.0f} events/s)"
+        ))
@@ -0,0 +1,35 @@
+"""
+Management command explaining the queries of the list pages by EXPLAIN QUERY PLAN and reporting those which read
+a whole table or sort the rows in a temporary B-tree (see insurance_app.audit)
+"""
+import logging
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from insurance_app import audit
+
+
+class Command(BaseCommand):
+    help = "Report the full table scans and the temporary B-tree sorts in the query plans of the list pages."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--database', default='default', help="Database alias")
+        parser.add_argument('--sql', action='store_true', help="Print the SQL of the problematic queries")
+
+    def handle(self, *args, **options) -> None:
+        logging.disable(logging.WARNING)  # budgets of the profiling middleware exceeded by the large lists
+        try:
+            findings, explained = audit.audit(using=options['database'])
+        except (ValueError, NotImplementedError) as exc:
+            raise CommandError(exc)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        for finding in findings:
+            self.stdout.write(self.style.ERROR(f"{finding.page:<60} {finding.step}"))
+            if options['sql']:
+                self.stdout.write(f"    {finding.sql}")
+        summary = f"{len(audit.PAGES)} pages, {explained} queries explained, {len(findings)} problems"
+        if findings:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,233 @@
+"""
+Management command comparing the capacity of the WSGI and the ASGI entry point for concurrent logged-in clients of the
+portal. Both handlers are driven in this process, so only the request handling of Django is measured, not a server:
+the WSGI handler by a pool of worker threads like a threaded WSGI server, the ASGI handler by an event loop.
+"""
+import asyncio
+import io
+import itertools
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandParser
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+URLS: tuple = ('/muj-ucet/smlouvy/', '/muj-ucet/skodni-udalosti/')
+
+
+class Command(BaseCommand):
+    help = "Measure requests per second and latency of the portal pages under WSGI and ASGI for each concurrency."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--concurrency', type=int, action='append', help="Number of concurrent clients, can be repeated"
+        )
+        parser.add_argument('--requests', type=int, default=400, help="Number of requests per concurrency and handler")
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads of the WSGI server")
+        parser.add_argument(
+            '--db-latency', type=float, default=0, help="Milliseconds added to each query, simulates a remote database"
+        )
+        parser.add_argument('--client', help="E-mail of the client making the requests, the first client by default")
+        parser.add_argument('--url', action='append', help="Measured URL, can be repeated")
+
+    def handle(self, *args, **options) -> None:
+        users = get_user_model().objects
+        user = users.get(email=options['client']) if options['client'] else users.filter(is_staff=False).first()
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        urls = options['url'] or list(URLS)
+        if options['db_latency']:
+            delay = options['db_latency'] / 1000
+            connection_created.connect(self._add_latency(delay), weak=False)
+
+        wsgi = WSGIBenchmark(get_wsgi_application(), cookie, options['threads'])
+        asgi = ASGIBenchmark(get_asgi_application(), cookie)
+        self.stdout.write(f"{'handler':<6} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for concurrency in options['concurrency'] or [1, 10, 50]:
+            for name, benchmark in (('WSGI', wsgi), ('ASGI', asgi)):
+                benchmark.run(urls, concurrency, min(concurrency, 2))  # warm-up
+                latencies, errors, elapsed = benchmark.run(urls, concurrency, options['requests'])
+                self.stdout.write(
+                    f"{name:<6} {concurrency:>7} {len(latencies) / elapsed:8.1f} {_percentile(latencies, 50):8.1f} "
+                    f"{_percentile(latencies, 99):8.1f} {errors:>6}"
+                )
+
+    @staticmethod
+    def _add_latency(delay: float):
+        """
+        Return the receiver of connection_created adding the delay to each query of the new connections
+        :param float delay: seconds
+        :return Callable:
+        """
+        def sleep(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def receiver(sender, connection, **kwargs):
+            if sleep not in connection.execute_wrappers:
+                connection.execute_wrappers.append(sleep)
+        return receiver
+
+
+class WSGIBenchmark:
+    """
+    Concurrent clients sending requests to the WSGI handler served by a fixed pool of worker threads
+    """
+    def __init__(self, application, cookie: str, threads: int) -> None:
+        self.application = application
+        self.cookie: str = cookie
+        self.threads: int = threads
+
+    def run(self, urls: list[str], concurrency: int, requests: int) -> tuple[list[float], int, float]:
+        """
+        Send the requests and return the latencies in milliseconds, the number of errors and the elapsed seconds
+        :param list urls: URLs requested in turn by each client
+        :param int concurrency: number of clients
+        :param int requests: total number of requests
+        :return tuple:
+        """
+        latencies, errors = [], []
+        lock = threading.Lock()
+        with ThreadPoolExecutor(self.threads) as server:
+            def client(count: int) -> None:
+                for url in itertools.islice(itertools.cycle(urls), count):
+                    start = time.perf_counter()
+                    status = server.submit(self.request, url).result()
+                    with lock:
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        if status != 200:
+                            errors.append(status)
+
+            start = time.perf_counter()
+            clients = [threading.Thread(target=client, args=(count,)) for count in _split(requests, concurrency)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        return latencies, len(errors), elapsed
+
+    def request(self, url: str) -> int:
+        """
+        Handle a GET request and return its status code
+        :param str url:
+        :return int:
+        """
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': url,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': self.cookie,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        result = self.application(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()
+        return int(status[0].split()[0])
+
+
+class ASGIBenchmark:
+    """
+    Concurrent clients sending requests to the ASGI handler in an event loop
+    """
+    def __init__(self, application, cookie: str) -> None:
+        self.application = application
+        self.cookie: str = cookie
+
+    def run(self, urls: list[str], concurrency: int, requests: int) -> tuple[list[float], int, float]:
+        """
+        Send the requests and return the latencies in milliseconds, the number of errors and the elapsed seconds
+        :param list urls: URLs requested in turn by each client
+        :param int concurrency: number of clients
+        :param int requests: total number of requests
+        :return tuple:
+        """
+        latencies, errors = [], []
+
+        async def client(count: int) -> None:
+            for url in itertools.islice(itertools.cycle(urls), count):
+                start = time.perf_counter()
+                status = await self.request(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append(status)
+
+        async def main() -> float:
+            start = time.perf_counter()
+            await asyncio.gather(*(client(count) for count in _split(requests, concurrency)))
+            return time.perf_counter() - start
+
+        elapsed = asyncio.run(main())
+        return latencies, len(errors), elapsed
+
+    async def request(self, url: str) -> int:
+        """
+        Handle a GET request and return its status code
+        :param str url:
+        :return int:
+        """
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': url,
+            'raw_path': url.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': [(b'host', b'localhost'), (b'cookie', self.cookie.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        status = []
+
+        async def receive() -> dict:
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message: dict) -> None:
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await self.application(scope, receive, send)
+        return status[0]
+
+
+def _split(requests: int, concurrency: int) -> list[int]:
+    """
+    Split the requests among the clients
+    :param int requests:
+    :param int concurrency:
+    :return list:
+    """
+    return [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[percent - 1]
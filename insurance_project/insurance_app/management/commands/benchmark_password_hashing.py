@@ -0,0 +1,43 @@
+"""
+Management command measuring how the bulk user provisioning scales with the number of hashing processes
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from insurance_app import hashing
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throughput of Person.objects.bulk_create_users() with 1, 2, 4, ... hashing processes up to the "
+        "number of available cores. The created users are rolled back."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=200, help="Number of users created in each run")
+        parser.add_argument('--max-processes', type=int, default=hashing.default_processes())
+
+    def handle(self, *args, **options) -> None:
+        processes = 1
+        baseline = None
+        while processes <= options['max_processes']:
+            users = (
+                {
+                    'email': f'benchmark{i}@example.com', 'password': f'heslo{i}', 'first_name': 'Jan',
+                    'last_name': 'Novák', 'date_of_birth': '1980-01-01'
+                }
+                for i in range(options['users'])
+            )
+            with transaction.atomic():
+                start = time.perf_counter()
+                for _ in get_user_model().objects.bulk_create_users(users, processes=processes):
+                    pass
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            rate = options['users'] / elapsed
+            baseline = baseline or rate
+            self.stdout.write(f"{processes:>3} processes: {rate:8.1f} users/s, speedup {rate / baseline:.2f}x")
+            processes *= 2
@@ -0,0 +1,44 @@
+"""
+Management command comparing the throughput of logged-in pages with the default database session engine and with the
+session engine of this project
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+ENGINES: tuple = ('django.contrib.sessions.backends.db', 'insurance_app.session_store')
+
+
+class Command(BaseCommand):
+    help = "Measure requests per second and session queries of logged-in pages for each session engine."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--requests', type=int, default=500, help="Number of requests per page and engine")
+        parser.add_argument('--client', help="E-mail of the client making the requests, the first client by default")
+        parser.add_argument('--url', action='append', help="Measured URL, can be repeated")
+
+    def handle(self, *args, **options) -> None:
+        users = get_user_model().objects
+        user = users.get(email=options['client']) if options['client'] else users.filter(is_staff=False).first()
+        urls = options['url'] or ['/muj-ucet/smlouvy/', '/muj-ucet/skodni-udalosti/']
+        for engine in ENGINES:
+            with override_settings(SESSION_ENGINE=engine):
+                client = Client(HTTP_HOST='localhost')
+                client.force_login(user)
+                for url in urls:
+                    client.get(url)  # warm-up
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        for _ in range(options['requests']):
+                            client.get(url)
+                        elapsed = time.perf_counter() - start
+                    session_queries = sum('session' in query['sql'] for query in queries.captured_queries)
+                    self.stdout.write(
+                        f"{engine:<40} {url:<30} {options['requests'] / elapsed:8.1f} req/s, "
+                        f"{session_queries / options['requests']:.2f} session queries per request"
+                    )
+                client.logout()
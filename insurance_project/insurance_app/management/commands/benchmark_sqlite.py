@@ -0,0 +1,213 @@
+"""
+Management command measuring the concurrency of the SQLite database: writer processes register contracts with their
+insured events, reader processes load the work queue and the contracts of a client. Each configuration runs on its
+own copy of a generated dataset, the stock configuration of Django (rollback journal, BEGIN DEFERRED, no retries) is
+compared with the production configuration of insurance_app.sqlite.
+
+The processes are forked, so the command runs only on the platforms supporting fork.
+"""
+import contextlib
+import datetime
+import logging
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from insurance_app import datasets, models
+
+CONFIGURATIONS: dict[str, dict] = {  # name: OPTIONS of the database
+    'django': {
+        'transaction_mode': 'DEFERRED',
+        'busy_retries': 0,
+        'checkpoint_interval': 0,
+        'pragmas': {
+            'busy_timeout': 5000,  # the default timeout of the sqlite3 module
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'mmap_size': 0,
+            'cache_size': -2000,
+            'temp_store': 'DEFAULT',
+            'journal_size_limit': -1,
+        },
+    },
+    'production': {},
+}
+
+
+class Command(BaseCommand):
+    help = "Measure throughput, latency and lock errors of concurrent writer and reader processes on SQLite."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--writers', type=int, default=4, help="Number of writer processes")
+        parser.add_argument('--readers', type=int, default=4, help="Number of reader processes")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of each measurement")
+        parser.add_argument('--clients', type=int, default=10_000, help="Number of clients in the dataset")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the dataset and of the workers")
+        parser.add_argument(
+            '--configuration', action='append', choices=list(CONFIGURATIONS),
+            help="Measured configuration, can be repeated, all by default"
+        )
+
+    def handle(self, *args, **options) -> None:
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("The benchmark needs the fork start method of the processes")
+        logging.disable(logging.WARNING)  # budgets of the profiling middleware, retries of the locked database
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                source = Path(directory) / 'dataset.sqlite3'
+                with _database(source, {}):
+                    call_command('migrate', verbosity=0, interactive=False)
+                    datasets.build(options['clients'], options['seed'])
+                self.stdout.write(
+                    f"{'configuration':<14} {'role':<7} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+                )
+                for name in options['configuration'] or list(CONFIGURATIONS):
+                    path = Path(directory) / f'{name}.sqlite3'
+                    _copy(source, path)
+                    with _database(path, CONFIGURATIONS[name]):
+                        for role, result in self.measure(options).items():
+                            self.stdout.write(
+                                f"{name:<14} {role:<7} {result['operations'] / options['duration']:8.1f} "
+                                f"{_percentile(result['latencies'], 50):8.1f} "
+                                f"{_percentile(result['latencies'], 99):8.1f} {result['errors']:>7}"
+                            )
+        finally:
+            logging.disable(logging.NOTSET)
+
+    @staticmethod
+    def measure(options: dict) -> dict[str, dict]:
+        """
+        Run the writer and the reader processes and return their results by role
+        :param dict options:
+        :return dict: role: {'operations': int, 'errors': int, 'latencies': list of milliseconds}
+        """
+        connections[DEFAULT_DB_ALIAS].ensure_connection()  # applies the journal mode before the processes start
+        connections.close_all()  # the forked processes must not share the connection
+        context = multiprocessing.get_context('fork')
+        roles = ['write'] * options['writers'] + ['read'] * options['readers']
+        barrier = context.Barrier(len(roles))
+        results = context.Queue()
+        processes = [
+            context.Process(target=_work, args=(role, options['seed'] + index, options['duration'], barrier, results))
+            for index, role in enumerate(roles)
+        ]
+        for process in processes:
+            process.start()
+        merged = {role: {'operations': 0, 'errors': 0, 'latencies': []} for role in dict.fromkeys(roles)}
+        for _ in processes:
+            role, operations, errors, latencies = results.get()
+            merged[role]['operations'] += operations
+            merged[role]['errors'] += errors
+            merged[role]['latencies'] += latencies
+        for process in processes:
+            process.join()
+        return merged
+
+
+@contextlib.contextmanager
+def _database(path: Path, options: dict):
+    """
+    Context manager pointing the default database to the file with the OPTIONS
+    :param Path path:
+    :param dict options:
+    """
+    settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+    original = settings_dict['NAME'], settings_dict['OPTIONS']
+    connections.close_all()
+    settings_dict['NAME'], settings_dict['OPTIONS'] = path, options
+    _forget_connection()
+    try:
+        yield
+    finally:
+        connections.close_all()
+        settings_dict['NAME'], settings_dict['OPTIONS'] = original
+        _forget_connection()
+
+
+def _forget_connection() -> None:
+    """
+    Drop the default connection of this thread, the next use creates a connection of the current settings
+    :return None:
+    """
+    with contextlib.suppress(AttributeError):
+        del connections[DEFAULT_DB_ALIAS]
+
+
+def _copy(source: Path, target: Path) -> None:
+    """
+    Copy the database by the backup API of SQLite, including the pages still in the write-ahead log
+    :param Path source:
+    :param Path target:
+    :return None:
+    """
+    with contextlib.closing(sqlite3.connect(source)) as src, contextlib.closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+def _work(role: str, seed: int, duration: float, barrier, results) -> None:
+    """
+    Body of a worker process, repeats its operation for the duration and puts its results into the queue
+    :param str role: 'write' or 'read'
+    :param int seed: seed of the random choices of the process
+    :param float duration: seconds
+    :param barrier: all the processes start measuring together
+    :param results: queue of the results
+    :return None:
+    """
+    rng = random.Random(seed)
+    clients = list(models.Person.objects.filter(is_staff=False).values_list('pk', flat=True))
+    products = list(models.Product.objects.values_list('pk', flat=True))
+    operation = _write if role == 'write' else _read
+    operations, errors, latencies = 0, 0, []
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            operation(rng, clients, products)
+        except OperationalError:  # database is locked
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        operations += 1
+    connections.close_all()
+    results.put((role, operations, errors, latencies))
+
+
+def _write(rng: random.Random, clients: list[int], products: list[int]) -> None:
+    """
+    Register a contract with an insured event of a client, the client is read first like by the views
+    """
+    with transaction.atomic():
+        insured = models.Person.objects.only('pk').get(pk=rng.choice(clients))
+        contract = models.Contract.objects.create(
+            product_id=rng.choice(products), insured=insured, payment=rng.randrange(500, 5000, 100)
+        )
+        models.InsuredEvent.objects.create(
+            contract=contract, event_date=datetime.date.today(), description="Událost z měření souběhu"
+        )
+
+
+def _read(rng: random.Random, clients: list[int], products: list[int]) -> None:
+    """
+    Load the first page of the work queue and the contracts of a client
+    """
+    list(
+        models.InsuredEvent.objects.filter(processed=False).select_related('contract__product', 'contract__insured')
+        .order_by('reporting_date', 'pk')[:50]
+    )
+    list(models.Contract.objects.filter(insured_id=rng.choice(clients)).select_related('product'))
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[percent - 1]
@@ -0,0 +1,288 @@
+"""
+Management command benchmarking every page of the project on synthetic datasets of several scales. For each scale a
+separate database is created like by the test runner and filled by insurance_app.datasets, then each URL of the apps
+is requested through the test client as an anonymous visitor, a client and a staff member.
+
+The latency percentiles, the number of queries and the peak memory of each page are printed and written to a JSON file,
+a previous file can be compared with the current results by --compare.
+"""
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from insurance_app import datasets, models, profiling
+
+APPS: tuple = ('insurance_app.urls', 'client_account.urls', 'administration.urls')
+# their GET requests change the data or the session, e.g. product-delete deactivates the product and regenerates the
+# pre-rendered pages, which would make the kept datasets and the compared runs differ
+SKIPPED: tuple = ('logout', 'account-delete', 'client-delete', 'product-delete')
+ROLES: tuple = ('anonymous', 'client', 'staff')
+PK_OF: dict[str, str] = {  # URL name: object whose primary key is the pk parameter of the URL
+    'product-update': 'product',
+    'contracts-list': 'client',
+    'event-detail': 'event',
+}
+HOST: str = 'localhost'  # in settings.ALLOWED_HOSTS, the host of the test client answers 400
+REGRESSION: float = 1.2  # ratio of the median latency reported by --compare as a regression
+REGRESSION_MIN_MS: float = 1.0  # smaller changes of the median latency are noise
+
+
+class Command(BaseCommand):
+    help = "Measure the latency, queries and memory of every page on synthetic datasets of the given scales."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--scale', type=int, action='append', help="Number of clients in the dataset, can be repeated"
+        )
+        parser.add_argument('--requests', type=int, default=20, help="Number of measured requests per page and role")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the generated datasets")
+        parser.add_argument('--url', action='append', help="Name of a measured URL, can be repeated, all by default")
+        parser.add_argument('--exclude', action='append', default=[], help="Name of a skipped URL, can be repeated")
+        parser.add_argument('--output', default='benchmark-results.json', help="File of the results")
+        parser.add_argument('--compare', help="Results of a previous run to compare with")
+        parser.add_argument(
+            '--keep', action='store_true', help="Keep the datasets in the temporary directory and reuse them next time"
+        )
+
+    def handle(self, *args, **options) -> None:
+        patterns = [
+            (name, route) for name, route in url_patterns()
+            if name not in SKIPPED and name not in options['exclude'] and (not options['url'] or name in options['url'])
+        ]
+        results = []
+        logging.disable(logging.WARNING)  # budgets exceeded on purpose, 403 and 404 of the anonymous requests
+        try:
+            for scale in options['scale'] or [1_000, 10_000]:
+                results += self.benchmark(scale, patterns, options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        report = {
+            'commit': _git_commit(),
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'today': datasets.REFERENCE_DATE.isoformat(),
+            'requests': options['requests'],
+            'results': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Results written to {options['output']}")
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text(encoding='utf-8')), results)
+
+    def benchmark(self, scale: int, patterns: list[tuple], options: dict) -> list[dict]:
+        """
+        Create the dataset of the scale and measure the pages
+        :param int scale: number of clients
+        :param list patterns: (name, route) of the measured URLs
+        :param dict options:
+        :return list: results of the pages
+        """
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        original_name, original_test_name = connection.settings_dict['NAME'], test_settings.get('NAME')
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f"insurance-benchmark-{scale}-{options['seed']}.db")
+        keep = options['keep']
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keep)
+            if not models.Person.objects.exists():
+                start = time.perf_counter()
+                counts = datasets.build(scale, options['seed'])
+                self.stdout.write(
+                    f"Dataset {scale}: " + ', '.join(f"{count} {name}" for name, count in counts.items())
+                    + f" built in {time.perf_counter() - start:.1f} s"
+                )
+            with tempfile.TemporaryDirectory() as prerender_root, override_settings(PRERENDER_ROOT=prerender_root):
+                objects = self.objects()
+                clients = self.clients(objects['client'])
+                self.stdout.write(
+                    f"\n{'scale':>8} {'url':<24} {'role':<10} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} "
+                    f"{'p99 ms':>8} {'queries':>7} {'peak KiB':>9}"
+                )
+                results = []
+                for name, route in patterns:
+                    path = reverse(name, kwargs=url_kwargs(name, route, objects))
+                    for role in ROLES:
+                        result = {'scale': scale, 'url': name, 'path': path, 'role': role}
+                        result.update(measure(clients[role], path, options['requests']))
+                        if result['status'] == 400 or result['status'] >= 500:
+                            # the redirects to the login and the 403 and 404 of the anonymous requests are expected
+                            raise CommandError(
+                                f"{path} answered {result['status']} to the {role}, the results would measure an error"
+                            )
+                        results.append(result)
+                        self.stdout.write(
+                            f"{scale:>8} {name:<24} {role:<10} {result['status']:>6} {result['p50_ms']:8.1f} "
+                            f"{result['p95_ms']:8.1f} {result['p99_ms']:8.1f} {result['queries']:>7} "
+                            f"{result['peak_memory_kib']:>9}"
+                        )
+                return results
+        finally:
+            connection.creation.destroy_test_db(original_name, verbosity=0, keepdb=keep)
+            test_settings['NAME'] = original_test_name
+
+    @staticmethod
+    def clients(person: models.Person) -> dict[str, Client]:
+        """
+        Return the test clients of the roles, logged in as the client and as the staff member
+        :param Person person: the client
+        :return dict:
+        """
+        clients = {role: Client(HTTP_HOST=HOST) for role in ROLES}
+        clients['client'].force_login(person)
+        clients['staff'].force_login(models.Person.objects.get(email=datasets.STAFF_EMAIL))
+        return clients
+
+    @staticmethod
+    def objects() -> dict:
+        """
+        Return the objects identified by the parameters of the URLs
+        :return dict:
+        """
+        event = models.InsuredEvent.objects.select_related('contract__insured').filter(processed=False).first()
+        return {
+            'client': event.contract.insured,
+            'contract': event.contract,
+            'event': event,
+            'product': models.Product.objects.first(),
+        }
+
+    def compare(self, baseline: dict, results: list[dict]) -> None:
+        """
+        Print the pages whose median latency or number of queries changed since the baseline
+        :param dict baseline: previous report
+        :param list results: current results
+        :return None:
+        """
+        previous = {(result['scale'], result['url'], result['role']): result for result in baseline['results']}
+        self.stdout.write(f"\nCompared with {baseline.get('commit') or 'the baseline'}:")
+        changed = 0
+        for result in results:
+            old = previous.get((result['scale'], result['url'], result['role']))
+            if old is None:
+                continue
+            significant = abs(result['p50_ms'] - old['p50_ms']) >= REGRESSION_MIN_MS
+            slower = significant and result['p50_ms'] > old['p50_ms'] * REGRESSION
+            faster = significant and old['p50_ms'] > result['p50_ms'] * REGRESSION
+            if slower or faster or result['queries'] != old['queries']:
+                changed += 1
+                style = self.style.ERROR if slower or result['queries'] > old['queries'] else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{result['scale']:>8} {result['url']:<24} {result['role']:<10} "
+                    f"p50 {old['p50_ms']:.1f} -> {result['p50_ms']:.1f} ms, "
+                    f"queries {old['queries']} -> {result['queries']}"
+                ))
+        if not changed:
+            self.stdout.write("No significant changes")
+
+
+def url_patterns() -> list[tuple[str, str]]:
+    """
+    Return the names and routes of the URL patterns of the apps
+    :return list: (name, route)
+    """
+    def walk(patterns: list, prefix: str, included: bool):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                module = getattr(pattern.urlconf_module, '__name__', None)
+                yield from walk(pattern.url_patterns, prefix + str(pattern.pattern), included or module in APPS)
+            elif isinstance(pattern, URLPattern) and included and pattern.name:
+                yield pattern.name, prefix + str(pattern.pattern)
+
+    return list(walk(get_resolver().url_patterns, '', False))
+
+
+def url_kwargs(name: str, route: str, objects: dict) -> dict:
+    """
+    Return the parameters of the URL
+    :param str name: name of the URL
+    :param str route: route of the URL pattern
+    :param dict objects: objects returned by Command.objects()
+    :return dict:
+    """
+    kwargs = {}
+    if '<contract_number:contract_number>' in route:
+        kwargs['contract_number'] = objects['contract'].contract_number
+    if '<int:pk>' in route:
+        kwargs['pk'] = objects[PK_OF[name]].pk
+    if '<uidb64>' in route:
+        path = objects['client'].get_set_password_url()
+        kwargs['uidb64'], kwargs['token'] = path.strip('/').split('/')[-2:]
+    if '<slug:name>' in route:
+        kwargs['name'] = 'clients'
+    return kwargs
+
+
+def measure(client: Client, path: str, requests: int) -> dict:
+    """
+    Request the page and return its latencies, queries and peak memory. The queries and the memory are measured by an
+    extra request, so the profiling doesn't distort the latencies.
+    :param Client client:
+    :param str path:
+    :param int requests: number of the measured requests
+    :return dict:
+    """
+    _get(client, path)  # warm-up
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = _get(client, path)
+        latencies.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        with profiling.profile() as current:
+            _get(client, path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'status': status,
+        'requests': requests,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'queries': len(current.queries),
+        'db_ms': round(current.db_time, 2),
+        'peak_memory_kib': peak // 1024,
+    }
+
+
+def _get(client: Client, path: str) -> int:
+    response = client.get(path)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response.status_code
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return round(values[0], 2) if values else 0.0
+    return round(statistics.quantiles(values, n=100)[percent - 1], 2)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,82 @@
+"""
+Management command building the static assets (collectstatic with the asset pipeline of insurance_app.assets) and
+reporting the bytes of the assets downloaded by the first load of a page before and after the build
+"""
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandParser
+from django.test import Client
+
+from insurance_app import assets, prerender
+
+
+class Command(BaseCommand):
+    help = "Collect the referenced static assets with content hashes and gzip siblings and report the saved bytes."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--url', default='/', help="Page used for the report, the home page by default")
+        parser.add_argument('--report-only', action='store_true', help="Don't build, only report")
+        parser.add_argument(
+            '--no-prune', action='store_true',
+            help="Keep the hashed files of all the earlier builds, not only of the last one"
+        )
+
+    def handle(self, *args, **options) -> None:
+        if not options['report_only']:
+            previous = set(staticfiles_storage.load_manifest().values())
+            # without clear, the workers still running the previous build keep finding its assets
+            call_command('collectstatic', interactive=False, verbosity=0)
+            staticfiles_storage.hashed_files = staticfiles_storage.load_manifest()
+            if not options['no_prune']:
+                deleted = assets.prune(staticfiles_storage, previous | set(staticfiles_storage.hashed_files.values()))
+                self.stdout.write(f"Pruned {len(deleted)} hashed files of the earlier builds")
+            prerender.regenerate()  # the snapshots refer to the assets by their hashed names
+            local = sum(1 for path in Path(settings.BASE_DIR).glob('*/static/**/*') if path.is_file())
+            self.stdout.write(
+                f"Collected {len(assets.referenced_assets())} of {local} static files of the local apps "
+                f"into {settings.STATIC_ROOT}"
+            )
+        self.report(options['url'])
+
+    def report(self, url: str) -> None:
+        """
+        Print the bytes of the local assets needed by the first load of the page: the original files served
+        uncompressed before, the hashed files served gzip compressed after the build
+        :param str url:
+        :return None:
+        """
+        html = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0]).get(url).content.decode()
+        static_url = re.escape('/' + settings.STATIC_URL.lstrip('/'))
+        reverse_manifest = {hashed: name for name, hashed in staticfiles_storage.hashed_files.items()}
+        pending = [
+            reverse_manifest.get(name, name) for name in re.findall(rf'(?:href|src)="{static_url}([^"?#]+)', html)
+        ]
+        names = set()
+        while pending:
+            name = pending.pop()
+            path = finders.find(name)
+            if name in names or name.endswith('.map') or path is None:
+                continue  # source maps are downloaded only by the developer tools
+            names.add(name)
+            pending.extend(assets.dependencies(name, Path(path).read_text(encoding='utf-8', errors='replace')))
+        before = after = 0
+        for name in sorted(names):
+            size = Path(finders.find(name)).stat().st_size
+            before += size
+            built = size
+            hashed = staticfiles_storage.hashed_files.get(name)
+            if hashed:
+                built = staticfiles_storage.size(hashed)
+                if staticfiles_storage.exists(f"{hashed}.gz"):
+                    built = staticfiles_storage.size(f"{hashed}.gz")
+            after += built
+            self.stdout.write(f"  {name}: {size} B -> {built} B")
+        self.stdout.write(
+            f"First load of {url}: {before} B before, {after} B after ({before - after} B saved); "
+            f"repeated loads: 0 B, the hashed assets are cached as immutable"
+        )
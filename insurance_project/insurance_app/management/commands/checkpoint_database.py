@@ -0,0 +1,30 @@
+"""
+Management command checkpointing the write-ahead log of the SQLite database, e.g. by cron in a quiet period. Unlike
+the passive checkpoints made after the commits, the TRUNCATE mode waits for the readers and shrinks the log to zero.
+"""
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+
+from insurance_app.sqlite.base import DatabaseWrapper
+
+
+class Command(BaseCommand):
+    help = "Copy the pages of the SQLite write-ahead log into the database."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--database', default='default', help="Database alias")
+        parser.add_argument(
+            '--mode', default='TRUNCATE', choices=('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'), help="Checkpoint mode"
+        )
+
+    def handle(self, *args, **options) -> None:
+        connection = connections[options['database']]
+        if not isinstance(connection, DatabaseWrapper):
+            raise CommandError(f"Database {options['database']} doesn't use the insurance_app.sqlite backend")
+        busy, log, checkpointed = connection.checkpoint(options['mode'])
+        if log < 0:
+            raise CommandError("The database isn't in the WAL journal mode")
+        message = f"{checkpointed} of {log} frames of the log checkpointed"
+        if busy:
+            raise CommandError(f"{message}, the checkpoint was blocked by another connection")
+        self.stdout.write(message)
@@ -0,0 +1,43 @@
+"""
+Management command generating a synthetic portfolio of clients, contracts and insured events
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from insurance_app import datasets
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate clients with Czech names, addresses and phone numbers, their contracts and insured events. The same "
+        "seed and reference date on an empty database always generate the same data. The clients have no password, "
+        "they set it by the link from Person.get_set_password_url()."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--clients', type=int, required=True, help="Number of generated clients")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator")
+        parser.add_argument(
+            '--today', type=datetime.date.fromisoformat, default=datasets.REFERENCE_DATE,
+            help="Reference date (YYYY-MM-DD) the data is generated back from, fixed by default"
+        )
+        parser.add_argument('--database', default='default', help="Database alias")
+
+    def handle(self, *args, **options) -> None:
+        start = time.perf_counter()
+
+        def progress(counts: dict) -> None:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{counts['Person']} clients, {counts['Contract']} contracts, {counts['InsuredEvent']} events "
+                f"({counts['Person'] / elapsed:.0f} clients/s)"
+            )
+
+        generator = datasets.PortfolioGenerator(options['seed'], options['database'], options['today'])
+        counts = generator.generate(options['clients'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['Person']} clients, {counts['Contract']} contracts and {counts['InsuredEvent']} events "
+            f"in {time.perf_counter() - start:.1f} s"
+        ))
@@ -0,0 +1,57 @@
+"""
+Management command creating the responsive derivatives of the product images and reporting the bytes they save on the
+home page
+"""
+from django.core.management.base import BaseCommand, CommandParser
+
+from insurance_app import images, models
+
+
+class Command(BaseCommand):
+    help = "Create the WebP/JPEG derivatives of the product images and report the bytes saved per home page view."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('products', nargs='*', type=int, help="Primary keys of the products, all by default")
+        parser.add_argument('--missing', action='store_true', help="Only products without derivatives of their image")
+        parser.add_argument(
+            '--image-width', type=int, default=640,
+            help="Rendered width of the image in device pixels used for the report, 640 is a half of a 1280 px screen"
+        )
+
+    def handle(self, *args, **options) -> None:
+        products = models.Product.objects.exclude(image='').order_by('pk')
+        if options['products']:
+            products = products.filter(pk__in=options['products'])
+        for product in products:
+            if options['missing'] and (product.image_variants or {}).get('source') == product.image.name:
+                continue
+            images.process(product.pk)
+            self.stdout.write(f"{product.name}: derivatives created")
+        self.report(options['image_width'])
+
+    def report(self, image_width: int) -> None:
+        """
+        Print the bytes of the images downloaded by one view of the home page with and without the derivatives
+        :param int image_width: rendered width of the images in device pixels
+        :return None:
+        """
+        original = optimized = 0
+        for product in models.Product.objects.filter(active=True).exclude(image=''):
+            size = product.image.size
+            original += size
+            variants = [
+                variant for variant in (product.image_variants or {}).get('variants', []) if variant['format'] == 'webp'
+            ]
+            # the browser picks the smallest candidate at least as wide as the rendered image, or the widest one
+            fitting = [variant for variant in variants if variant['width'] >= image_width]
+            if fitting:
+                chosen = min(fitting, key=lambda variant: variant['width'])
+            else:
+                chosen = max(variants, key=lambda variant: variant['width'], default=None)
+            optimized += chosen['size'] if chosen else size
+        saved = original - optimized
+        percent = saved / original * 100 if original else 0
+        self.stdout.write(
+            f"Home page images at {image_width} px: {original} B originals, {optimized} B derivatives, "
+            f"{saved} B ({percent:.0f} %) saved per view"
+        )
@@ -0,0 +1,49 @@
+"""
+Management command importing a portfolio of clients and contracts from a CSV or JSONL file
+"""
+import itertools
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from insurance_app import portfolio, utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Import clients and contracts from a CSV or JSONL file. Records have the fields email, first_name, last_name, "
+        "date_of_birth, phone, address1, address2, postal_code, city, country and optionally product (name), payment "
+        "and conclusion_date. An interrupted import continues from the last imported chunk when run again."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', help="Path to the imported file")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="Format of the file, guessed from the extension")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Number of records imported in a transaction")
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of a previous run")
+
+    def handle(self, *args, **options) -> None:
+        importer = portfolio.PortfolioImporter(os.path.abspath(options['path']))
+        if options['restart']:
+            importer.reset()
+        skip = importer.position
+        if skip:
+            self.stdout.write(f"Resuming after record {skip}")
+        records = itertools.islice(portfolio.read_records(options['path'], options['format']), skip, None)
+        start = time.perf_counter()
+        processed = 0
+        for chunk in utils.chunks(records, options['chunk_size']):
+            importer.import_chunk(chunk)
+            processed += len(chunk)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{skip + processed} records: {importer.persons} clients, {importer.contracts} contracts, "
+                f"{processed / elapsed:.0f} records/s"
+            )
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.persons} clients and {importer.contracts} contracts from {processed} records "
+            f"in {time.perf_counter() - start:.1f} s, {len(importer.errors)} records rejected"
+        ))
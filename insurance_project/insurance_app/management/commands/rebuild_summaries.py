@@ -0,0 +1,21 @@
+"""
+Management command recomputing the reporting summaries from the contracts and insured events, e.g. after a backfill
+made by raw SQL
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from insurance_app import reporting
+
+
+class Command(BaseCommand):
+    help = "Recompute the payout, claim and premium summaries per product and month."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--database', default='default', help="Database alias")
+
+    def handle(self, *args, **options) -> None:
+        start = time.perf_counter()
+        rows = reporting.rebuild(using=options['database'])
+        self.stdout.write(f"{rows} summary rows rebuilt in {time.perf_counter() - start:.2f} s")
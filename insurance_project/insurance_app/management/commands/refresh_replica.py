@@ -0,0 +1,36 @@
+"""
+Management command copying the primary SQLite database into the local stand-in of the read replica, once or
+repeatedly (see insurance_app.routers)
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from insurance_app import routers
+
+
+class Command(BaseCommand):
+    help = "Copy the primary database into the local read replica by the SQLite backup API."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--database', default='default', help="Alias of the primary database")
+        parser.add_argument('--replica', help="Alias of the replica, settings.REPLICA['ALIAS'] by default")
+        parser.add_argument(
+            '--repeat', action='store_true', help="Refresh the copy every settings.REPLICA['REFRESH_INTERVAL'] seconds"
+        )
+
+    def handle(self, *args, **options) -> None:
+        while True:
+            try:
+                duration = routers.refresh(options['database'], options['replica'])
+            except NotImplementedError as exc:
+                raise CommandError(exc)
+            self.stdout.write(f"Replica refreshed in {duration:.2f} s")
+            if duration > routers.config()['COPY_SECONDS']:
+                self.stderr.write(
+                    "The copy took longer than REPLICA['COPY_SECONDS'], raise it and STICKY_SECONDS, the clients may "
+                    "not read their own writes"
+                )
+            if not options['repeat']:
+                return
+            time.sleep(max(routers.config()['REFRESH_INTERVAL'] - duration, 0))
@@ -0,0 +1,46 @@
+"""
+Management command generating the invoices of the annual premium of all contracts for a year
+(see insurance_app.billing)
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from insurance_app import billing
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the invoices of the annual premium of all contracts concluded by the end of the period. Contracts "
+        "already invoiced for the period are skipped, an interrupted run continues behind the last billed chunk."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--period', type=int, required=True, help="Billed year")
+        parser.add_argument(
+            '--issue-date', type=datetime.date.fromisoformat, help="Issue date of the invoices (YYYY-MM-DD), today "
+            "by default"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=billing.CHUNK_SIZE, help="Contracts billed in one transaction"
+        )
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of a previous run")
+        parser.add_argument('--database', default='default', help="Database alias")
+
+    def handle(self, *args, **options) -> None:
+        if options['restart']:
+            billing.reset(options['period'], options['database'])
+        start = time.perf_counter()
+
+        def progress(last: int, maximum: int, created: int) -> None:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"Contracts up to {last} of {maximum}: {created} invoices ({created / elapsed:.0f}/s)")
+
+        created = billing.run(
+            options['period'], options['issue_date'], options['chunk_size'], options['database'], progress
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {created} invoices for {options['period']} in {elapsed:.1f} s ({created / elapsed:.0f}/s)"
+        ))
@@ -0,0 +1,147 @@
+"""
+Management command profiling the boot of a worker process. A fresh Python process loads the WSGI application
+(insurance_project.wsgi) and serves one request, once with the warm-up of insurance_app.warmup and once without it.
+The import time of each module is recorded by `python -X importtime`, the time to the first response is measured from
+starting the process to the end of the first response, so it covers the interpreter, the imports, django.setup(), the
+warm-up and the first request.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+# script of the profiled process, it prints the measured times as JSON
+CHILD: str = """
+import json, os, time
+from wsgiref.util import setup_testing_defaults
+from django.conf import settings
+settings.WARMUP = {**getattr(settings, 'WARMUP', {}), 'ENABLED': os.environ['STARTUP_PROFILE_WARMUP'] == '1'}
+start = time.perf_counter()
+from insurance_project.wsgi import application
+booted = time.perf_counter()
+from insurance_app import warmup
+
+def request():
+    environ = {'PATH_INFO': os.environ['STARTUP_PROFILE_PATH'], 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    statuses = []
+    started = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        getattr(response, 'close', lambda: None)()
+    return statuses[0], (time.perf_counter() - started) * 1000
+
+status, first = request()
+finished = time.time()
+second = request()[1]
+print(json.dumps({
+    'boot_ms': (booted - start) * 1000, 'warmup_ms': sum(step.duration for step in warmup.completed),
+    'first_ms': first, 'second_ms': second, 'finished': finished, 'status': status,
+}))
+"""
+
+
+class Run(NamedTuple):
+    """
+    Measured boot of one process
+    """
+    boot_ms: float  # loading the WSGI application including the warm-up
+    warmup_ms: float
+    first_ms: float  # the first request
+    second_ms: float  # the same request again, in a warm process
+    time_to_first_response_ms: float  # from starting the process to the end of the first response
+    imports: dict[str, tuple[float, float]]  # {module: (self ms, cumulative ms)}
+
+
+class Command(BaseCommand):
+    help = "Report the import time of the modules and the time to the first response of a fresh worker process."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--path', default='/', help="Path of the first request")
+        parser.add_argument('--repeat', type=int, default=3, help="Processes started per mode, the median is reported")
+        parser.add_argument('--top', type=int, default=20, help="Number of the slowest modules listed")
+
+    def handle(self, *args, **options) -> None:
+        modes = {'no warm-up': False, 'warm-up': True}
+        runs = {mode: [] for mode in modes}
+        for mode, warmup in modes.items():
+            runs[mode] = [self.run(warmup, options['path']) for _ in range(options['repeat'])]
+        self.stdout.write(f"Boot of a worker serving {options['path']}, median of {options['repeat']} processes:")
+        self.stdout.write(
+            f"{'mode':<12} {'boot ms':>8} {'warm-up ms':>10} {'1st request ms':>14} {'2nd request ms':>14} "
+            f"{'to 1st response ms':>18}"
+        )
+        for mode, mode_runs in runs.items():
+            median = {field: statistics.median(getattr(run, field) for run in mode_runs) for field in Run._fields[:5]}
+            self.stdout.write(
+                f"{mode:<12} {median['boot_ms']:8.1f} {median['warmup_ms']:10.1f} {median['first_ms']:14.1f} "
+                f"{median['second_ms']:14.1f} {median['time_to_first_response_ms']:18.1f}"
+            )
+
+        imports = runs['warm-up'][0].imports
+        packages = defaultdict(lambda: [0.0, 0])
+        for module, (self_ms, _) in imports.items():
+            package = packages[module.split('.')[0]]
+            package[0] += self_ms
+            package[1] += 1
+        total = sum(self_ms for self_ms, _ in imports.values())
+        self.stdout.write(f"\nImport time by package, {len(imports)} modules in {total:.1f} ms:")
+        self.stdout.write(f"{'package':<32} {'self ms':>8} {'modules':>8}")
+        for package, (self_ms, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write(f"{package:<32} {self_ms:8.1f} {count:>8}")
+        self.stdout.write("\nSlowest modules:")
+        self.stdout.write(f"{'module':<56} {'self ms':>8} {'cumulative ms':>13}")
+        for module, (self_ms, cumulative_ms) in sorted(imports.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write(f"{module:<56} {self_ms:8.1f} {cumulative_ms:13.1f}")
+
+    @staticmethod
+    def run(warmup: bool, path: str) -> Run:
+        """
+        Start a process loading the application and serving the first request
+        :param bool warmup: run the warm-up at the boot
+        :param str path: path of the first request
+        :return Run:
+        """
+        environ = {
+            **os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE),
+            'STARTUP_PROFILE_WARMUP': '1' if warmup else '0', 'STARTUP_PROFILE_PATH': path,
+        }
+        started = time.time()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD], cwd=settings.BASE_DIR, env=environ, capture_output=True,
+            text=True
+        )
+        if process.returncode:
+            raise CommandError(f"The profiled process failed:\n{process.stderr[-2000:]}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        if not result['status'].startswith(('2', '3')):
+            raise CommandError(f"The first request of {path} failed: {result['status']}")
+        return Run(
+            result['boot_ms'], result['warmup_ms'], result['first_ms'], result['second_ms'],
+            (result['finished'] - started) * 1000, parse_importtime(process.stderr)
+        )
+
+
+def parse_importtime(output: str) -> dict[str, tuple[float, float]]:
+    """
+    Return the import times of the modules printed by `python -X importtime`
+    :param str output: standard error of the process
+    :return dict: {module: (self ms, cumulative ms)}
+    """
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            imports[module.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return imports
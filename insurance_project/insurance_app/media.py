@@ -0,0 +1,213 @@
+"""
+Module containing the serving of the uploaded media files. Unlike django.views.static.serve() it answers conditional
+requests (ETag, Last-Modified) and byte range requests, and in the offload mode it only checks the access and leaves the
+copying of the bytes to the front proxy by the X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd) header.
+
+settings.MEDIA_OFFLOAD: None (default, the file is sent by Django), 'x-accel' or 'x-sendfile'
+settings.MEDIA_ACCEL_PREFIX: internal location of the proxy mapped to MEDIA_ROOT, '/protected-media/' by default
+
+Access to files under a path prefix can be restricted by a rule registered by access_rule(), other files are public.
+"""
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from typing import Callable, Iterator
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE: int = 64 * 1024
+RANGE_PATTERN: re.Pattern = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_rules: dict[str, Callable[[HttpRequest, str], bool]] = {}  # path prefix: check
+
+
+def access_rule(prefix: str) -> Callable:
+    """
+    Decorator registering a function deciding whether the request may access a file under the path prefix, e.g.
+        @media.access_rule('claims/')
+        def claim_attachment(request, path): return request.user.is_staff
+    :param str prefix: path relative to MEDIA_ROOT
+    :return Callable:
+    """
+    def decorator(check: Callable[[HttpRequest, str], bool]) -> Callable:
+        _rules[prefix] = check
+        return check
+    return decorator
+
+
+def is_allowed(request: HttpRequest, path: str) -> bool:
+    """
+    Return True if the request may access the file, the rule with the longest matching prefix decides
+    :param HttpRequest request:
+    :param str path: path relative to MEDIA_ROOT
+    :return bool:
+    """
+    matching = [prefix for prefix in _rules if path.startswith(prefix)]
+    if not matching:
+        return True
+    return bool(_rules[max(matching, key=len)](request, path))
+
+
+def etag(stat) -> str:
+    """
+    Return the ETag of a file derived from its modification time and size, so the file doesn't have to be read
+    :param stat: os.stat_result
+    :return str:
+    """
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Return the first and the last byte of a single byte range. Multiple ranges are not supported, for them (and for an
+    invalid header) None is returned and the whole file is sent.
+    :param str header: value of the Range header
+    :param int size: size of the file
+    :return tuple | None:
+    :raises ValueError: if the range is not satisfiable, e.g. any range of an empty file
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        raise ValueError(header)  # an empty file has no byte to send
+    if not first:
+        # suffix range, the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+def read(path: Path, first: int, last: int) -> Iterator[bytes]:
+    """
+    Yield the bytes of the file from the first to the last byte (inclusive) in chunks
+    :param Path path:
+    :param int first:
+    :param int last:
+    :return Iterator:
+    """
+    with path.open('rb') as file:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve(request: HttpRequest, path: str) -> HttpResponse:
+    """
+    View serving a file from MEDIA_ROOT
+    :param HttpRequest request:
+    :param str path: path relative to MEDIA_ROOT
+    :return HttpResponse:
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    root = Path(settings.MEDIA_ROOT).resolve()
+    full_path = (root / path).resolve()
+    if path.startswith('..') or not full_path.is_relative_to(root):
+        raise Http404("File not found")
+    # checked before the existence, so the existence of private files is not revealed
+    if not is_allowed(request, path):
+        raise PermissionDenied
+    if not full_path.is_file():
+        raise Http404("File not found")
+    stat = full_path.stat()
+    tag = etag(stat)
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path.name)
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=tag, last_modified=last_modified)
+    if response is None:
+        response = _offload(path, content_type) or _file_response(request, full_path, stat, tag, content_type)
+    response.headers['ETag'] = tag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _offload(path: str, content_type: str) -> HttpResponse | None:
+    """
+    Return the empty response asking the front proxy to send the file, or None if the offload is not configured
+    :param str path: path relative to MEDIA_ROOT
+    :param str content_type:
+    :return HttpResponse | None:
+    """
+    mode = getattr(settings, 'MEDIA_OFFLOAD', None)
+    if not mode:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel':
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response.headers['X-Accel-Redirect'] = quote(f"{prefix.rstrip('/')}/{path}")
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = str(Path(settings.MEDIA_ROOT).resolve() / path)
+    else:
+        raise ValueError(f"Unknown MEDIA_OFFLOAD mode '{mode}'")
+    # the proxy answers the range and conditional requests of the file itself
+    return response
+
+
+def _file_response(request: HttpRequest, full_path: Path, stat, tag: str, content_type: str) -> HttpResponse:
+    """
+    Return the response sending the whole file or the requested byte range of it
+    :param HttpRequest request:
+    :param Path full_path:
+    :param stat: os.stat_result of the file
+    :param str tag: ETag of the file
+    :param str content_type:
+    :return HttpResponse:
+    """
+    size = stat.st_size
+    header = request.META.get('HTTP_RANGE')
+    if header and _if_range_matches(request, tag, stat):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f"bytes */{size}"
+            return response
+        if byte_range is not None:
+            first, last = byte_range
+            response = StreamingHttpResponse(read(full_path, first, last), status=206, content_type=content_type)
+            response.headers['Content-Range'] = f"bytes {first}-{last}/{size}"
+            response.headers['Content-Length'] = str(last - first + 1)
+            return response
+    return FileResponse(full_path.open('rb'), content_type=content_type)
+
+
+def _if_range_matches(request: HttpRequest, tag: str, stat) -> bool:
+    """
+    Return True if the range may be sent: there is no If-Range header or it matches the current version of the file
+    :param HttpRequest request:
+    :param str tag:
+    :param stat: os.stat_result of the file
+    :return bool:
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == tag
+    date = parse_http_date_safe(if_range)
+    return date is not None and date >= int(stat.st_mtime)
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+from insurance_app import search
+
+CHUNK_SIZE = 2000
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Create the FTS5 table and fill the normalized names and the index with the existing persons
+    """
+    Person = apps.get_model('insurance_app', 'Person')
+    using = schema_editor.connection.alias
+    if search.is_enabled(using):
+        schema_editor.execute(search.CREATE_SQL)
+    last_pk = 0
+    while True:
+        chunk = list(Person.objects.using(using).filter(pk__gt=last_pk).order_by('pk')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for person in chunk:
+            person.search_name = search.fold(f"{person.last_name} {person.first_name}")
+        Person.objects.using(using).bulk_update(chunk, ['search_name'])
+        search.index(chunk, using=using)
+        last_pk = chunk[-1].pk
+
+
+def drop_search_index(apps, schema_editor):
+    if search.is_enabled(schema_editor.connection.alias):
+        schema_editor.execute(search.DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0013_alter_contract_conclusion_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=301),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.1.7 on 2026-10-18 15:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from insurance_app import reporting
+
+
+def fill_summaries(apps, schema_editor):
+    """
+    Compute the summaries of the existing contracts and insured events
+    """
+    reporting.rebuild(using=schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0017_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMonthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Měsíc')),
+                ('approved_count', models.IntegerField(default=0, verbose_name='Schválené události')),
+                ('approved_payout', models.BigIntegerField(default=0, verbose_name='Pojistné plnění')),
+                ('rejected_count', models.IntegerField(default=0, verbose_name='Zamítnuté události')),
+                ('contracts_count', models.IntegerField(default=0, verbose_name='Nové smlouvy')),
+                ('premium', models.BigIntegerField(default=0, verbose_name='Objem plateb')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='insurance_app.product', verbose_name='Produkt')),
+            ],
+            options={
+                'ordering': ['-month', 'product'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productmonthsummary',
+            constraint=models.UniqueConstraint(fields=('product', 'month'), name='unique_product_month_summary'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0018_product_month_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='insuredevent',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['reporting_date', 'id'], name='event_pending_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='insuredevent',
+            index=models.Index(condition=models.Q(('processed', True)), fields=['reporting_date', 'id'], name='event_processed_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='person',
+            index=models.Index(condition=models.Q(('is_staff', False)), fields=['last_name', 'first_name'], name='person_client_name_idx'),
+        ),
+    ]
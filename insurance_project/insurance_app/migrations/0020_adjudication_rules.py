@@ -0,0 +1,41 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0019_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdjudicationRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Název')),
+                ('priority', models.PositiveIntegerField(default=0, verbose_name='Priorita')),
+                ('active', models.BooleanField(default=True, verbose_name='Aktivní')),
+                ('approve', models.BooleanField(verbose_name='Schválit')),
+                ('payout', models.PositiveIntegerField(blank=True, null=True, verbose_name='Pojistné plnění')),
+                ('min_contract_age', models.PositiveIntegerField(blank=True, null=True, verbose_name='Minimální stáří smlouvy (dny)')),
+                ('max_contract_age', models.PositiveIntegerField(blank=True, null=True, verbose_name='Maximální stáří smlouvy (dny)')),
+                ('min_report_delay', models.PositiveIntegerField(blank=True, null=True, verbose_name='Minimální zpoždění nahlášení (dny)')),
+                ('max_report_delay', models.PositiveIntegerField(blank=True, null=True, verbose_name='Maximální zpoždění nahlášení (dny)')),
+                ('max_prior_claims', models.PositiveIntegerField(blank=True, null=True, verbose_name='Maximální počet předchozích událostí')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='adjudication_rules', to='insurance_app.product', verbose_name='Produkt')),
+            ],
+            options={
+                'verbose_name': 'Pravidlo likvidace',
+                'verbose_name_plural': 'Pravidla likvidace',
+                'ordering': ['product', 'priority', 'pk'],
+            },
+        ),
+        migrations.AddField(
+            model_name='insuredevent',
+            name='rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='insurance_app.adjudicationrule', verbose_name='Pravidlo likvidace'),
+        ),
+    ]
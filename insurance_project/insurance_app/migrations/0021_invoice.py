@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0020_adjudication_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.PositiveSmallIntegerField(verbose_name='Období')),
+                ('amount', models.PositiveIntegerField(verbose_name='Částka')),
+                ('issue_date', models.DateField(verbose_name='Datum vystavení')),
+                ('due_date', models.DateField(verbose_name='Datum splatnosti')),
+                ('contract', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='insurance_app.contract', verbose_name='Smlouva')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('contract', 'period'), name='unique_contract_period_invoice'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:32
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_contract_numbers(apps, schema_editor):
+    """
+    Persist the numbers of the existing contracts, derived from the primary key until now
+    """
+    contracts = apps.get_model('insurance_app', 'Contract').objects.using(schema_editor.connection.alias)
+    contracts.update(contract_number=F('id') * 127 ** 2 + 10_000_001)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0021_invoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='contract',
+            name='contract_number',
+            field=models.PositiveBigIntegerField(editable=False, null=True, verbose_name='Číslo smlouvy'),
+        ),
+        migrations.RunPython(fill_contract_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='contract',
+            name='contract_number',
+            field=models.PositiveBigIntegerField(editable=False, unique=True, verbose_name='Číslo smlouvy'),
+        ),
+    ]
@@ -2,15 +2,24 @@
 Module containing models for this app
 """
 import unicodedata
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import PermissionsMixin
-from django.db import models
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sessions.base_session import AbstractBaseSession
+from django.core.exceptions import ValidationError
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 
 from phonenumber_field import modelfields
 
+from . import hashing, numbering, prerender, reporting, search, utils
+
 
 class PersonManager(BaseUserManager):
     """
@@ -32,6 +41,77 @@ class PersonManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def bulk_insert(self, persons: list, batch_size: int | None = None) -> list:
+        """
+        Insert new persons in batches. The primary keys are assigned by the database and returned by the INSERT
+        (SQLite 3.35+), the slugs containing them are written by one UPDATE per batch. Should be called inside a
+        transaction, so a person is never visible with the temporary slug.
+        :param list persons: unsaved Person instances with hashed (or unusable) passwords
+        :param int batch_size: maximal number of rows in one INSERT statement
+        :return list: inserted persons
+        """
+        using = self._db or router.db_for_write(self.model)
+        if not connections[using].features.can_return_rows_from_bulk_insert:
+            for person in persons:
+                person.save(using=using)
+            return persons
+        for person in persons:
+            person._set_search_name()
+            person.slug = person.email  # unique and never in the form of a slug, replaced below
+        persons = self.using(using).bulk_create(persons, batch_size=batch_size)
+        for person in persons:
+            person.slug = person._generate_slug()
+        self.using(using).bulk_update(persons, ['slug'], batch_size=batch_size)
+        search.index(persons, using=using)
+        return persons
+
+    def bulk_create_users(
+        self, users: Iterable[dict], batch_size: int = 500, processes: int | None = None, usable_passwords: bool = True
+    ) -> Iterator[AbstractBaseUser]:
+        """
+        Create and save many users. Passwords are hashed in a pool of processes while the previous batch is inserted,
+        each batch is inserted in its own transaction. The created users are yielded in the order of the input.
+        :param Iterable users: dictionaries with the 'email', 'password' and other fields of the users
+        :param int batch_size: number of users inserted in a transaction
+        :param int processes: number of hashing processes, all available cores by default
+        :param bool usable_passwords: if False, the passwords are ignored and the users set their password on the first
+            login (see Person.get_set_password_url())
+        :return Iterator:
+        """
+        using = self._db or router.db_for_write(self.model)
+        with hashing.PasswordHasherPool(1 if not usable_passwords else processes) as pool:
+            pending = None
+            for batch in utils.chunks(users, batch_size):
+                persons = []
+                for fields in batch:
+                    fields = dict(fields)
+                    password = fields.pop('password', None)
+                    if not fields.get('email'):
+                        raise ValueError("E-mail musí být zadán.")
+                    fields['email'] = self.normalize_email(fields['email'])
+                    fields.setdefault('is_staff', False)
+                    fields.setdefault('is_superuser', False)
+                    persons.append((self.model(**fields), password if usable_passwords else None))
+                hashes = pool.map([password for _, password in persons])
+                if pending is not None:
+                    yield from self._insert_hashed(*pending, using=using)
+                pending = [person for person, _ in persons], hashes
+            if pending is not None:
+                yield from self._insert_hashed(*pending, using=using)
+
+    def _insert_hashed(self, persons: list, hashes: Iterator[str], using: str) -> list:
+        """
+        Set the password hashes to the persons and insert them in a transaction
+        :param list persons:
+        :param Iterator hashes: password hashes in the order of the persons
+        :param str using: database alias
+        :return list:
+        """
+        for person, password in zip(persons, hashes):
+            person.password = password
+        with transaction.atomic(using=using):
+            return self.db_manager(using).bulk_insert(persons)
+
     def create_user(self, email: str = None, password: str = None, **extra_fields) -> AbstractBaseUser:
         """
         Create and save a user with the given email, and password.
@@ -62,6 +142,12 @@ class PersonManager(BaseUserManager):
         return self._create_user(email, password, **extra_fields)
 
 
+def _invalidate_cached_user(pk: int, using: str | None) -> None:
+    # the module of the middleware imports the authentication backends, which need the models loaded
+    from . import authentication
+    authentication.invalidate(pk, using)
+
+
 class Person(AbstractBaseUser, PermissionsMixin):
     """
     This model represents the users, both regular and admins.
@@ -86,6 +172,7 @@ class Person(AbstractBaseUser, PermissionsMixin):
     is_staff: models.Field = models.BooleanField(default=False, verbose_name='Zaměstnanec')
     is_superuser: models.Field = models.BooleanField(default=False, verbose_name='Administrátor')
     slug: models.Field = models.SlugField(unique=True, null=False)
+    search_name: models.Field = models.CharField(max_length=301, default="", editable=False, db_index=True)
 
     @property
     def full_address(self) -> str:
@@ -108,6 +195,17 @@ class Person(AbstractBaseUser, PermissionsMixin):
         )
         return ", ".join(chunks)
 
+    def get_set_password_url(self) -> str:
+        """
+        Return the URL where a user provisioned without a password sets their password on the first login. The link
+        expires after settings.PASSWORD_RESET_TIMEOUT or when the password is set.
+        :return str:
+        """
+        return reverse('set-password', kwargs={
+            'uidb64': urlsafe_base64_encode(force_bytes(self.pk)),
+            'token': default_token_generator.make_token(self)
+        })
+
     def has_perm(self, perm, obj=None) -> bool:
         """
         I am not using permissions in this app. All user permissions are determined by is_staff field
@@ -129,17 +227,50 @@ class Person(AbstractBaseUser, PermissionsMixin):
         self, force_insert: bool = False, force_update: bool = False, using: Any = None, update_fields: Any = None
     ) -> None:
         """
-        Save the instance into the database. Before saving create slug if not given
+        Save the instance into the database. Before saving create slug if not given, after saving update the search
+        index in the same transaction and drop the cached header of the user. A save of only the fields which are not
+        indexed (e.g. last_login on each login) doesn't touch the search index.
         :param force_insert:
         :param force_update:
         :param using:
         :param update_fields:
         :return:
         """
-        super().save(force_insert, force_update, using, update_fields)
-        if not self.slug:
-            self.slug = self._generate_slug()
-        super().save(force_insert, force_update, using, update_fields)
+        self._set_search_name()
+        reindex = update_fields is None or not search.INDEXED_FIELDS.isdisjoint(update_fields)
+        if update_fields is not None and not {'first_name', 'last_name'}.isdisjoint(update_fields):
+            update_fields = {*update_fields, 'search_name'}
+        with transaction.atomic(using=using or router.db_for_write(type(self), instance=self)):
+            super().save(force_insert, force_update, using, update_fields)
+            if not self.slug:
+                # the slug contains the primary key, so it is known only after the first save
+                self.slug = self._generate_slug()
+                super().save(using=using, update_fields=['slug'])
+                reindex = True
+            if reindex:
+                search.index([self], using=self._state.db)
+        _invalidate_cached_user(self.pk, self._state.db)
+
+    def delete(self, using: Any = None, keep_parents: bool = False) -> tuple:
+        """
+        Delete the instance from the database, from the search index and from the cache of the users
+        :param using:
+        :param keep_parents:
+        :return:
+        """
+        pk = self.pk
+        with transaction.atomic(using=using or router.db_for_write(type(self), instance=self)):
+            result = super().delete(using, keep_parents)
+            search.unindex([pk], using=using or self._state.db)
+        _invalidate_cached_user(pk, using or self._state.db)
+        return result
+
+    def _set_search_name(self) -> None:
+        """
+        Set the normalized name used for searching
+        :return:
+        """
+        self.search_name = search.fold(f"{self.last_name} {self.first_name}")
 
     def _generate_slug(self) -> str:
         """
@@ -150,7 +281,8 @@ class Person(AbstractBaseUser, PermissionsMixin):
         first_name = self._remove_interpunction(str(self.first_name)).lower()
         return f"{self.pk}-{last_name}-{first_name}"
 
-    def _remove_interpunction(self, text: str) -> str:
+    @staticmethod
+    def _remove_interpunction(text: str) -> str:
         """
         Transforms a text to ascii.
         :param text:
@@ -158,6 +290,15 @@ class Person(AbstractBaseUser, PermissionsMixin):
         """
         return unicodedata.normalize("NFKD", text).encode("ASCII", "ignore").decode('utf-8')
 
+    class Meta:
+        indexes = [
+            # Django filters is_staff=False as NOT is_staff, which SQLite can't look up in an ordinary index, only in
+            # a partial index with the same condition. The index gives the client list in the order of the names.
+            models.Index(
+                fields=['last_name', 'first_name'], condition=Q(is_staff=False), name='person_client_name_idx'
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.last_name} {self.first_name}"
 
@@ -170,6 +311,29 @@ class Product(models.Model):
     description: models.Field = models.TextField(default="", verbose_name='Popis')
     active: models.Field = models.BooleanField(default=True, blank=True, verbose_name='Aktivní')
     image: models.Field = models.ImageField(upload_to='images/', verbose_name='Obrázek')
+    # responsive derivatives of the image created in the background by insurance_app.images
+    image_variants: models.Field = models.JSONField(default=dict, blank=True, editable=False)
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Save the product and render the public pages listing the products again once the transaction is committed
+        :param args:
+        :param kwargs:
+        :return None:
+        """
+        super().save(*args, **kwargs)
+        transaction.on_commit(prerender.regenerate, using=kwargs.get('using') or router.db_for_write(Product))
+
+    def delete(self, *args, **kwargs) -> tuple:
+        """
+        Delete the product and render the public pages listing the products again once the transaction is committed
+        :param args:
+        :param kwargs:
+        :return tuple:
+        """
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(prerender.regenerate, using=kwargs.get('using') or router.db_for_write(Product))
+        return result
 
     def __str__(self) -> str:
         inactive = " (nedostupné)" if not self.active else ""
@@ -179,50 +343,190 @@ class Product(models.Model):
         verbose_name = 'Produkt'
 
 
-class Contract(models.Model):
+class ReportedModelMixin:
+    """
+    Mixin of the models contributing to the reporting summaries (insurance_app.reporting). save() and delete() read the
+    stored state of the row in their transaction after the write lock is taken, so concurrent changes of the same row
+    (two adjusters, a bulk update) never replace the same contribution twice.
+    """
+    reported_fields: tuple = ()
+
+    def get_reported_state(self) -> tuple:
+        """
+        Return the values of the fields determining the contribution to the summaries
+        :return tuple:
+        """
+        return tuple(getattr(self, name) for name in self.reported_fields)
+
+    def get_stored_state(self, using: str) -> tuple | None:
+        """
+        Return the values of the reported fields stored in the database, locking the row where the database supports it
+        (SQLite locks the whole database by BEGIN IMMEDIATE of the transaction)
+        :param str using: database alias
+        :return tuple | None: None if the row doesn't exist
+        """
+        return (
+            type(self)._base_manager.using(using).select_for_update().filter(pk=self.pk)
+            .values_list(*self.reported_fields).first()
+        )
+
+    def get_summary_deltas(self, state: tuple | None, sign: int = 1) -> dict:
+        """
+        Return the contribution of the given state to the summaries
+        :param tuple state: values of reported_fields or None
+        :param int sign: 1 to add, -1 to subtract the contribution
+        :return dict: {(product_id, month): {counter: delta}}
+        """
+        raise NotImplementedError
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Save the object and update the summaries in the same transaction
+        :param args:
+        :param kwargs:
+        :return None:
+        """
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            previous = None if self._state.adding else self.get_stored_state(using)
+            super().save(*args, **kwargs)
+            current = self.get_reported_state()
+            if previous != current:
+                reporting.apply(
+                    reporting.merge(self.get_summary_deltas(previous, -1), self.get_summary_deltas(current)), using
+                )
+
+    def delete(self, *args, **kwargs) -> tuple:
+        """
+        Delete the object and subtract its contribution from the summaries in the same transaction
+        :param args:
+        :param kwargs:
+        :return tuple:
+        """
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            deltas = self.get_deletion_deltas(using)
+            result = super().delete(*args, **kwargs)
+            reporting.apply(deltas, using)
+        return result
+
+    def get_deletion_deltas(self, using: str) -> dict:
+        """
+        Return the changes of the summaries caused by deleting the object
+        :param str using: database alias
+        :return dict:
+        """
+        return self.get_summary_deltas(self.get_stored_state(using), -1)
+
+
+class Contract(ReportedModelMixin, models.Model):
     """
     Model represents a particular contract
     """
+    reported_fields: tuple = ('product_id', 'conclusion_date', 'payment')
     objects: models.Manager
     product: models.Field = models.ForeignKey(to=Product, on_delete=models.RESTRICT, verbose_name='Produkt')
     insured: models.Field = models.ForeignKey(to=Person, on_delete=models.RESTRICT, verbose_name='Pojištěnec')
     conclusion_date: models.Field = models.DateField(auto_now_add=True, verbose_name='Datum uzavření')
     payment: models.Field = models.PositiveIntegerField(verbose_name='Pravidelná platba')
 
-    @property
-    def contract_number(self) -> int:
-        """
-        Simple non-random simulation of a unique contract number with 8 - 10 digits. It is based on primary key.
-        :return int:
-        """
-        return 10_000_001 + self.pk * 127 ** 2
+    # allocated by insurance_app.numbering before the insert, the contracts created before kept their numbers derived
+    # from the primary key
+    contract_number: models.Field = models.PositiveBigIntegerField(
+        unique=True, editable=False, verbose_name='Číslo smlouvy'
+    )
 
     @classmethod
-    def get_object_by_contract_number(cls, contract_number: int) -> int:
+    def get_object_by_contract_number(cls, contract_number: int) -> 'Contract':
         """
-        Returns an object identified by a contract number
-        :param contract_number:
-        :return:
+        Returns an object identified by a contract number, an invalid number is rejected without a query
+        :param int contract_number:
+        :return Contract:
         """
-        return cls.objects.get(pk=cls.get_pk_by_contract_number(contract_number))
+        if not numbering.is_valid(contract_number):
+            raise cls.DoesNotExist(f"Invalid contract number {contract_number}")
+        return cls.objects.get(contract_number=contract_number)
 
-    @staticmethod
-    def get_pk_by_contract_number(contract_number: int) -> int:
+    def save(self, *args, **kwargs) -> None:
+        if self.contract_number is None:
+            using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            self.contract_number = numbering.contract_numbers.allocate(using)
+        super().save(*args, **kwargs)
+
+    def get_summary_deltas(self, state: tuple | None, sign: int = 1) -> dict:
+        return reporting.contract_deltas(state, sign)
+
+    def get_deletion_deltas(self, using: str) -> dict:
+        # the insured events of the contract are deleted with it
+        return reporting.merge(super().get_deletion_deltas(using), reporting.contract_events_deltas(self.pk, using))
+
+    def __str__(self):
+        return f"{self.product} číslo {self.contract_number}"
+
+
+class AdjudicationRule(models.Model):
+    """
+    Rule of the automatic adjudication of the pending insured events of a product (insurance_app.adjudication). The
+    rules of a product are evaluated by their priority, the first rule whose all filled in conditions the event meets
+    approves it with the payout of the rule or rejects it. The events matching no rule wait for the staff.
+    """
+    product: models.Field = models.ForeignKey(
+        to=Product, on_delete=models.CASCADE, related_name='adjudication_rules', verbose_name='Produkt'
+    )
+    name: models.Field = models.CharField(max_length=100, verbose_name='Název')
+    priority: models.Field = models.PositiveIntegerField(default=0, verbose_name='Priorita')  # lower first
+    active: models.Field = models.BooleanField(default=True, verbose_name='Aktivní')
+    approve: models.Field = models.BooleanField(verbose_name='Schválit')  # or reject
+    payout: models.Field = models.PositiveIntegerField(null=True, blank=True, verbose_name='Pojistné plnění')
+    # days between the conclusion of the contract and the event
+    min_contract_age: models.Field = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Minimální stáří smlouvy (dny)'
+    )
+    max_contract_age: models.Field = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Maximální stáří smlouvy (dny)'
+    )
+    # days between the event and its report
+    min_report_delay: models.Field = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Minimální zpoždění nahlášení (dny)'
+    )
+    max_report_delay: models.Field = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Maximální zpoždění nahlášení (dny)'
+    )
+    # events reported on the same contract before
+    max_prior_claims: models.Field = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Maximální počet předchozích událostí'
+    )
+
+    def conditions(self) -> list[tuple[str, int | None, int | None]]:
         """
-        Returns a primary key of a contract identified by a contract number.
-        :param int contract_number:
-        :return int:
+        Return the filled in conditions of the rule
+        :return list: (name of the column of insurance_app.adjudication.Columns, minimum, maximum)
         """
-        return int((contract_number - 10_000_001) / (127 ** 2))
+        conditions = [
+            ('contract_age', self.min_contract_age, self.max_contract_age),
+            ('report_delay', self.min_report_delay, self.max_report_delay),
+            ('prior_claims', None, self.max_prior_claims),
+        ]
+        return [condition for condition in conditions if condition[1] is not None or condition[2] is not None]
+
+    def clean(self) -> None:
+        if self.approve and self.payout is None:
+            raise ValidationError({'payout': 'Pravidlo schvalující události musí určit pojistné plnění'})
+
+    class Meta:
+        ordering = ['product', 'priority', 'pk']
+        verbose_name = 'Pravidlo likvidace'
+        verbose_name_plural = 'Pravidla likvidace'
 
     def __str__(self):
-        return f"{self.product} číslo {self.contract_number}"
+        return f'{self.product}: {self.name}'
 
 
-class InsuredEvent(models.Model):
+class InsuredEvent(ReportedModelMixin, models.Model):
     """
     Model for insured event
     """
+    reported_fields: tuple = ('contract_id', 'event_date', 'processed', 'approved', 'payout')
     contract: Contract = models.ForeignKey(to=Contract, on_delete=models.CASCADE, verbose_name='Smlouva')
     event_date: models.DateField = models.DateField(verbose_name='Datum události')
     reporting_date: models.DateField = models.DateField(auto_now_add=True)
@@ -230,10 +534,152 @@ class InsuredEvent(models.Model):
     processed: models.BooleanField = models.BooleanField(default=False, verbose_name='Zpracováno')
     approved: models.BooleanField = models.BooleanField(default=False, verbose_name='Schváleno')
     payout: models.IntegerField = models.IntegerField(null=True, blank=True, verbose_name='Pojistné plnění')
+    # the rule which decided the event automatically
+    rule: models.ForeignKey = models.ForeignKey(
+        to=AdjudicationRule, on_delete=models.SET_NULL, null=True, blank=True, related_name='events',
+        verbose_name='Pravidlo likvidace'
+    )
 
     @property
     def client(self):
         return self.contract.insured
 
+    def get_reported_state(self) -> tuple:
+        """
+        Return the values of reported_fields followed by the product of the contract, which is needed only by the
+        processed events
+        :return tuple:
+        """
+        state = super().get_reported_state()
+        return (*state, self._get_product_id() if state[2] else None)
+
+    def get_stored_state(self, using: str) -> tuple | None:
+        """
+        Return the stored values of reported_fields followed by the product of the stored contract, read by the same
+        query, so an event moved to a contract of another product is subtracted from its previous product
+        :param str using: database alias
+        :return tuple | None: None if the row doesn't exist
+        """
+        row = (
+            type(self)._base_manager.using(using).select_for_update().filter(pk=self.pk)
+            .values_list(*self.reported_fields, 'contract__product_id').first()
+        )
+        if row is None:
+            return None
+        *state, product_id = row
+        self._stored_product = (state[0], product_id)
+        return (*state, product_id if state[2] else None)
+
+    def _get_product_id(self) -> int:
+        """
+        Return the product of the contract, without a query if the contract wasn't changed since it was read with the
+        stored state or if it is loaded
+        :return int:
+        """
+        contract_id, product_id = getattr(self, '_stored_product', (None, None))
+        if contract_id is not None and contract_id == self.contract_id:
+            return product_id
+        return self.contract.product_id
+
+    def get_summary_deltas(self, state: tuple | None, sign: int = 1) -> dict:
+        if state is None:
+            return {}
+        *fields, product_id = state
+        return reporting.event_deltas((product_id, *fields[1:]), sign)
+
+    class Meta:
+        indexes = [
+            # the work queues of the pending and the processed events in the order of the keyset pagination
+            models.Index(
+                fields=['reporting_date', 'id'], condition=Q(processed=False), name='event_pending_queue_idx'
+            ),
+            models.Index(
+                fields=['reporting_date', 'id'], condition=Q(processed=True), name='event_processed_queue_idx'
+            ),
+        ]
+
     def __str__(self):
         return f'Pojistná událost č. {self.pk} ke smlouvě {self.contract}'
+
+
+class ProductMonthSummary(models.Model):
+    """
+    Summary of the claims and contracts of a product in a month maintained by insurance_app.reporting. Claims are
+    counted in the month of the event, contracts in the month of their conclusion.
+    """
+    product: models.ForeignKey = models.ForeignKey(to=Product, on_delete=models.CASCADE, verbose_name='Produkt')
+    month: models.DateField = models.DateField(verbose_name='Měsíc')  # the first day of the month
+    approved_count: models.IntegerField = models.IntegerField(default=0, verbose_name='Schválené události')
+    approved_payout: models.BigIntegerField = models.BigIntegerField(default=0, verbose_name='Pojistné plnění')
+    rejected_count: models.IntegerField = models.IntegerField(default=0, verbose_name='Zamítnuté události')
+    contracts_count: models.IntegerField = models.IntegerField(default=0, verbose_name='Nové smlouvy')
+    premium: models.BigIntegerField = models.BigIntegerField(default=0, verbose_name='Objem plateb')
+
+    @property
+    def average_payout(self) -> float | None:
+        return self.approved_payout / self.approved_count if self.approved_count else None
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['product', 'month'], name='unique_product_month_summary')]
+        ordering = ['-month', 'product']
+
+    def __str__(self):
+        return f'{self.product} {self.month:%m/%Y}'
+
+
+class Invoice(models.Model):
+    """
+    Invoice of the annual premium of a contract generated by the billing run of the year (insurance_app.billing)
+    """
+    # the index of the unique constraint of the contract and the period serves the lookups by the contract
+    contract: models.ForeignKey = models.ForeignKey(
+        to=Contract, on_delete=models.CASCADE, related_name='invoices', db_index=False, verbose_name='Smlouva'
+    )
+    period: models.PositiveSmallIntegerField = models.PositiveSmallIntegerField(verbose_name='Období')  # the year
+    amount: models.PositiveIntegerField = models.PositiveIntegerField(verbose_name='Částka')
+    issue_date: models.DateField = models.DateField(verbose_name='Datum vystavení')
+    due_date: models.DateField = models.DateField(verbose_name='Datum splatnosti')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['contract', 'period'], name='unique_contract_period_invoice')]
+
+    def __str__(self):
+        return f'Faktura za rok {self.period} ke smlouvě {self.contract}'
+
+
+class NumberSequence(models.Model):
+    """
+    Sequence of the numbers leased in blocks by insurance_app.numbering.BlockAllocator
+    """
+    name: models.CharField = models.CharField(max_length=100, unique=True)
+    value: models.PositiveBigIntegerField = models.PositiveBigIntegerField(default=0)  # first value not leased yet
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Position reached by a resumable batch job: a portfolio import in its source file or a billing run in the primary
+    keys of the contracts. It is saved in the same transaction as the processed chunk, so an interrupted job can be
+    resumed without processing anything twice.
+    """
+    source: models.CharField = models.CharField(max_length=255, unique=True)
+    position: models.PositiveBigIntegerField = models.PositiveBigIntegerField(default=0)  # records or primary keys done
+    updated: models.DateTimeField = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.source}: {self.position}'
+
+
+class Session(AbstractBaseSession):
+    """
+    Session used by the session engine insurance_app.session_store
+    """
+    @classmethod
+    def get_session_store_class(cls):
+        from .session_store import SessionStore
+        return SessionStore
+
+    class Meta(AbstractBaseSession.Meta):
+        db_table = 'insurance_app_session'
@@ -0,0 +1,188 @@
+"""
+Module containing the contract numbers. A new contract gets a 10 digit number: 9 digits of a value of the persisted
+sequence NumberSequence scattered over the whole range by a bijective multiplication, so the numbers of consecutive
+contracts are far apart, and a Luhn check digit. The numbers of the contracts created before derived from the primary
+key (10_000_001 + pk * 127 ** 2) are kept, such legacy numbers are never given out again. A number is validated by
+is_valid() before it is looked up in the database, the URLs do it by ContractNumberConverter.
+
+The values of the sequence are leased in blocks by BlockAllocator, so a process doesn't go to the database for each
+contract and doesn't depend on the primary keys of one database. Numbers of a block not used before the process ends
+are skipped, the numbers are unique but not dense.
+"""
+import os
+import threading
+
+from django.db import connections, transaction
+from django.db.models import F
+
+from . import models
+
+LEGACY_BASE: int = 10_000_001
+LEGACY_STEP: int = 127 ** 2
+FIRST_CORE: int = 100_000_000  # numbers without the check digit have 9 digits
+CORE_RANGE: int = 900_000_000
+MULTIPLIER: int = 612_345_671  # coprime with CORE_RANGE, the multiplication is a permutation of the range
+BLOCK_SIZE: int = 100  # values of the sequence leased at once
+
+
+def luhn_digit(payload: int) -> int:
+    """
+    Return the Luhn check digit of the number
+    :param int payload:
+    :return int:
+    """
+    total = 0
+    for index, digit in enumerate(map(int, reversed(str(payload)))):
+        if index % 2 == 0:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return -total % 10
+
+
+def is_legacy(number: int) -> bool:
+    """
+    Return True if the number has the form of the numbers derived from the primary keys of the contracts
+    :param int number:
+    :return bool:
+    """
+    return number > LEGACY_BASE and (number - LEGACY_BASE) % LEGACY_STEP == 0
+
+
+def is_valid(number: int) -> bool:
+    """
+    Return True if the number can be a contract number, without looking into the database
+    :param int number:
+    :return bool:
+    """
+    if is_legacy(number):
+        return True
+    return FIRST_CORE * 10 <= number < (FIRST_CORE + CORE_RANGE) * 10 and luhn_digit(number // 10) == number % 10
+
+
+def contract_number(value: int) -> int | None:
+    """
+    Return the contract number of a value of the sequence
+    :param int value:
+    :return int: the number or None if it has the form of a legacy number and is skipped
+    """
+    if not 0 <= value < CORE_RANGE:
+        raise OverflowError("The contract numbers are exhausted")
+    core = FIRST_CORE + value * MULTIPLIER % CORE_RANGE
+    number = core * 10 + luhn_digit(core)
+    return None if is_legacy(number) else number
+
+
+class Block:
+    """
+    Values of the sequence leased by a thread
+    """
+    def __init__(self, start: int, end: int, using: str) -> None:
+        self.next: int = start
+        self.end: int = end
+        self.using: str = using
+        self.confirmed: bool = False  # the transaction of the lease was committed
+
+    def confirm(self) -> None:
+        self.confirmed = True
+
+    def is_valid(self) -> bool:
+        """
+        Return True if the block can be used: its lease was committed or its transaction is still running. When the
+        transaction or the savepoint of the lease rolls back, Django drops its callbacks and the sequence gives the
+        block out again.
+        :return bool:
+        """
+        if self.confirmed:
+            return True
+        return any(callback[1] == self.confirm for callback in connections[self.using].run_on_commit)
+
+
+class BlockAllocator:
+    """
+    Allocator of unique numbers leasing blocks of values of a NumberSequence. Each thread and each forked process has
+    its own blocks, the numbers are taken without any lock.
+    """
+    def __init__(self, name: str, encode, block_size: int = BLOCK_SIZE) -> None:
+        """
+        :param str name: name of the sequence
+        :param encode: function returning the number of a value of the sequence or None to skip the value
+        :param int block_size: values leased at once
+        """
+        self.name: str = name
+        self.encode = encode
+        self.block_size: int = block_size
+        self._local: threading.local = threading.local()
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self) -> None:
+        """
+        Forget the leased blocks, a forked process must not use the blocks of its parent
+        :return None:
+        """
+        self._local = threading.local()
+
+    def allocate(self, using: str = 'default') -> int:
+        """
+        Return a new number
+        :param str using: database alias
+        :return int:
+        """
+        return self.take(1, using)[0]
+
+    def take(self, count: int, using: str = 'default') -> list[int]:
+        """
+        Return new numbers, a large count is leased by one round trip
+        :param int count:
+        :param str using: database alias
+        :return list:
+        """
+        numbers = []
+        while len(numbers) < count:
+            block = self._block(using, count - len(numbers))
+            while block.next < block.end and len(numbers) < count:
+                number = self.encode(block.next)
+                block.next += 1
+                if number is not None:
+                    numbers.append(number)
+        return numbers
+
+    def _block(self, using: str, needed: int) -> Block:
+        blocks = self._local.__dict__.setdefault('blocks', {})
+        block = blocks.get(using)
+        if block is None or block.next >= block.end or not block.is_valid():
+            block = blocks[using] = self._lease(using, max(self.block_size, needed))
+        return block
+
+    def _lease(self, using: str, size: int) -> Block:
+        """
+        Move the sequence behind a new block
+        :param str using: database alias
+        :param int size: number of the values
+        :return Block:
+        """
+        sequences = models.NumberSequence.objects.using(using)
+        with transaction.atomic(using=using):
+            sequence, _ = sequences.select_for_update().get_or_create(name=self.name)
+            sequences.filter(pk=sequence.pk).update(value=F('value') + size)
+        block = Block(sequence.value, sequence.value + size, using)
+        transaction.on_commit(block.confirm, using=using)
+        return block
+
+
+contract_numbers: BlockAllocator = BlockAllocator('contract_number', contract_number)
+
+
+class ContractNumberConverter:
+    """
+    Path converter of the contract numbers rejecting the invalid ones before the view looks them up
+    """
+    regex: str = '[0-9]{8,12}'
+
+    def to_python(self, value: str) -> int:
+        number = int(value)
+        if not is_valid(number):
+            raise ValueError(f"Invalid contract number {value}")
+        return number
+
+    def to_url(self, value: int) -> str:
+        return str(value)
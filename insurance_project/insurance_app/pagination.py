@@ -0,0 +1,124 @@
+"""
+Module containing the keyset (seek) pagination used by the long lists of the application
+"""
+import datetime
+from typing import Any
+
+from django.db.models import Q, QuerySet
+
+
+class KeysetPage:
+    """
+    One page of a keyset paginated queryset
+    """
+    def __init__(self, object_list: list, next_cursor: str | None, previous_cursor: str | None) -> None:
+        self.object_list: list = object_list
+        self.next_cursor: str | None = next_cursor
+        self.previous_cursor: str | None = previous_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginator seeking by the (date field, pk) key instead of using OFFSET. The cost of a page doesn't depend on how deep
+    in the list the page is and rows inserted meanwhile don't shift the pages.
+    """
+    SEPARATOR: str = '~'
+
+    def __init__(self, queryset: QuerySet, field: str, per_page: int, descending: bool = False) -> None:
+        """
+        :param QuerySet queryset: unordered queryset to be paginated
+        :param str field: name of the date field the list is sorted by, pk is used as a tie-breaker
+        :param int per_page: maximal number of objects on a page
+        :param bool descending: sort the list from the newest objects
+        """
+        self.queryset: QuerySet = queryset
+        self.field: str = field
+        self.per_page: int = per_page
+        self.descending: bool = descending
+
+    def page(self, after: str | None = None, before: str | None = None) -> KeysetPage:
+        """
+        Return the page following the 'after' cursor, preceding the 'before' cursor or the first page if no valid
+        cursor is given. Only one query is executed regardless of the page position.
+        :param str after: cursor of the last object of the previous page
+        :param str before: cursor of the first object of the next page
+        :return KeysetPage:
+        """
+        after_key = self.decode_cursor(after)
+        before_key = self.decode_cursor(before) if after_key is None else None
+        forward = before_key is None
+        queryset = self.queryset.order_by(*self._ordering(forward))
+        key = after_key or before_key
+        if key is not None:
+            queryset = self._seek(queryset, key, forward)
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if not forward:
+            objects.reverse()
+        has_next = has_more if forward else True
+        has_previous = key is not None if forward else has_more
+        return KeysetPage(
+            objects,
+            self.encode_cursor(objects[-1]) if objects and has_next else None,
+            self.encode_cursor(objects[0]) if objects and has_previous else None
+        )
+
+    def encode_cursor(self, obj: Any) -> str:
+        """
+        Return the cursor pointing at the given object
+        :param obj:
+        :return str:
+        """
+        return f"{getattr(obj, self.field).isoformat()}{self.SEPARATOR}{obj.pk}"
+
+    def decode_cursor(self, cursor: str | None) -> tuple[datetime.date, int] | None:
+        """
+        Return the (date, pk) key encoded in the cursor, or None if the cursor is missing or malformed
+        :param str cursor:
+        :return tuple | None:
+        """
+        if not cursor:
+            return None
+        value, _, pk = cursor.rpartition(self.SEPARATOR)
+        try:
+            return datetime.date.fromisoformat(value), int(pk)
+        except ValueError:
+            return None
+
+    def _ordering(self, forward: bool) -> tuple[str, str]:
+        """
+        Return the ordering of the queryset when seeking in the given direction
+        :param bool forward:
+        :return tuple:
+        """
+        prefix = '-' if self.descending == forward else ''
+        return f"{prefix}{self.field}", f"{prefix}pk"
+
+    def _seek(self, queryset: QuerySet, key: tuple[datetime.date, int], forward: bool) -> QuerySet:
+        """
+        Filter the queryset to the objects lying behind the key in the given direction
+        :param QuerySet queryset:
+        :param tuple key:
+        :param bool forward:
+        :return QuerySet:
+        """
+        value, pk = key
+        lookup = 'lt' if self.descending == forward else 'gt'
+        return queryset.filter(
+            Q(**{f"{self.field}__{lookup}": value}) | Q(**{self.field: value, f"pk__{lookup}": pk})
+        )
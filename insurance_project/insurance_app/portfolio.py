@@ -0,0 +1,211 @@
+"""
+Module containing the streaming import of client portfolios (clients and their contracts) from CSV or JSONL files
+"""
+import csv
+import datetime
+import json
+from typing import Iterator
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from . import hashing, models, numbering, reporting
+
+PERSON_FIELDS: tuple = (
+    'email', 'first_name', 'last_name', 'date_of_birth', 'phone', 'address1', 'address2', 'postal_code', 'city',
+    'country'
+)
+DATE_FORMATS: tuple = ('%Y-%m-%d', '%d.%m.%Y')
+
+
+def read_records(path: str, file_format: str | None = None) -> Iterator[tuple[int, dict]]:
+    """
+    Stream records of a CSV (with a header row) or JSONL file, one record at a time
+    :param str path:
+    :param str file_format: 'csv' or 'jsonl', determined by the file extension if not given
+    :return Iterator: pairs of the record number (starting by 1) and the record
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    with open(path, encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            yield from enumerate(csv.DictReader(file), start=1)
+        else:
+            number = 0
+            for line in file:
+                if line.strip():
+                    number += 1
+                    yield number, json.loads(line)
+
+
+class PortfolioImporter:
+    """
+    Importer of portfolio records. Each record describes a client and optionally one contract of the client; a client
+    with several contracts is described by several records with the same e-mail. Clients existing in the database are
+    not changed, only their new contracts are imported.
+    """
+    def __init__(self, source: str) -> None:
+        """
+        :param str source: identification of the imported file used for the checkpoint
+        """
+        self.source: str = source
+        self.products: dict[str, int] = dict(models.Product.objects.values_list('name', 'pk'))
+        self.persons: int = 0
+        self.contracts: int = 0
+        self.errors: list[str] = []
+
+    @property
+    def position(self) -> int:
+        """
+        Return the number of records already processed by previous runs
+        :return int:
+        """
+        checkpoint = models.ImportCheckpoint.objects.filter(source=self.source).first()
+        return checkpoint.position if checkpoint else 0
+
+    def reset(self) -> None:
+        """
+        Forget the checkpoint, the next run starts from the beginning of the file
+        :return None:
+        """
+        models.ImportCheckpoint.objects.filter(source=self.source).delete()
+
+    def import_chunk(self, chunk: list[tuple[int, dict]]) -> None:
+        """
+        Validate and import a chunk of records in one transaction together with moving the checkpoint behind it.
+        Invalid records are skipped and reported in self.errors.
+        :param list chunk: pairs of the record number and the record
+        :return None:
+        """
+        rows = []
+        for number, record in chunk:
+            try:
+                rows.append(self._clean(record))
+            except ValidationError as error:
+                self.errors.append(f"Record {number}: {'; '.join(error.messages)}")
+        new_persons, contracts = self._save(rows, chunk[-1][0])
+        self.persons += len(new_persons)
+        self.contracts += len(contracts)
+
+    @transaction.atomic
+    def _save(self, rows: list[tuple], position: int) -> tuple[dict, list]:
+        """
+        Save the validated rows and move the checkpoint to the given position in one transaction
+        :param list rows: pairs of unsaved persons and contracts
+        :param int position: number of the last record of the chunk
+        :return tuple: created persons by e-mail, created contracts
+        """
+        emails = {person.email for person, _ in rows}
+        existing = dict(models.Person.objects.filter(email__in=emails).values_list('email', 'pk'))
+        new_persons = {}
+        for person, _ in rows:
+            if person.email not in existing and person.email not in new_persons:
+                new_persons[person.email] = person
+        models.Person.objects.bulk_insert(list(new_persons.values()))
+        existing.update((email, person.pk) for email, person in new_persons.items())
+        contracts = []
+        for person, contract in rows:
+            if contract is not None:
+                contract.insured_id = existing[person.email]
+                contracts.append(contract)
+        self._create_contracts(contracts)
+        models.ImportCheckpoint.objects.update_or_create(source=self.source, defaults={'position': position})
+        return new_persons, contracts
+
+    def _create_contracts(self, contracts: list) -> None:
+        """
+        Insert contracts in batches by a single executemany() statement. Unlike bulk_create() it keeps the conclusion
+        dates given in the source instead of overwriting them by the auto_now_add date. The contracts bypass
+        Contract.save(), so they are added to the reporting summaries here.
+        :param list contracts:
+        :return None:
+        """
+        today = datetime.date.today()
+        for contract in contracts:
+            contract.conclusion_date = contract.conclusion_date or today
+        table = models.Contract._meta.db_table
+        numbers = numbering.contract_numbers.take(len(contracts), connection.alias)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (product_id, insured_id, conclusion_date, payment, contract_number) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                [
+                    (
+                        contract.product_id,
+                        contract.insured_id,
+                        connection.ops.adapt_datefield_value(contract.conclusion_date),
+                        contract.payment,
+                        number
+                    )
+                    for contract, number in zip(contracts, numbers)
+                ]
+            )
+        reporting.contracts_created(
+            (contract.product_id, contract.conclusion_date, contract.payment) for contract in contracts
+        )
+
+    def _clean(self, record: dict) -> tuple:
+        """
+        Validate a record and return the unsaved person and contract (or None) it describes
+        :param dict record:
+        :return tuple: (Person, Contract | None)
+        """
+        values = {}
+        errors = []
+        for name in PERSON_FIELDS:
+            field = models.Person._meta.get_field(name)
+            raw = str(record.get(name) or '').strip()
+            try:
+                if not raw and field.null:
+                    values[name] = None
+                elif not raw and field.has_default():
+                    values[name] = field.get_default()
+                elif raw and name == 'date_of_birth':
+                    values[name] = self._parse_date(raw)
+                else:
+                    values[name] = field.clean(raw, None)
+            except ValidationError as error:
+                errors.append(f"{name}: {' '.join(error.messages)}")
+        contract = None
+        product = str(record.get('product') or '').strip()
+        if product:
+            try:
+                contract = models.Contract(
+                    product_id=self._product(product),
+                    payment=models.Contract._meta.get_field('payment').clean(record.get('payment'), None),
+                    conclusion_date=self._parse_date(str(record.get('conclusion_date') or '').strip()) or None
+                )
+            except ValidationError as error:
+                errors.append(f"contract: {' '.join(error.messages)}")
+        if errors:
+            raise ValidationError(errors)
+        values['email'] = models.Person.objects.normalize_email(values['email'])
+        # imported clients set their password on the first login
+        person = models.Person(password=hashing.unusable_password(), **values)
+        return person, contract
+
+    def _product(self, name: str) -> int:
+        """
+        Return the primary key of the product with the given name
+        :param str name:
+        :return int:
+        """
+        try:
+            return self.products[name]
+        except KeyError:
+            raise ValidationError(f"Unknown product '{name}'.")
+
+    @staticmethod
+    def _parse_date(raw: str) -> datetime.date | None:
+        """
+        Parse a date in ISO or Czech format
+        :param str raw:
+        :return datetime.date | None:
+        """
+        if not raw:
+            return None
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(raw, date_format).date()
+            except ValueError:
+                pass
+        raise ValidationError(f"Invalid date '{raw}'.")
@@ -0,0 +1,234 @@
+"""
+Module containing the pre-rendering of the public pages. Pages identical for every anonymous visitor are rendered into
+files (plus gzip variants) in settings.PRERENDER_ROOT whenever a product changes and served from the memory of the
+process with ETag and Last-Modified headers. Logged-in users and visitors with pending messages get the live page.
+
+A snapshot older than the templates or than settings.PRERENDER_MAX_AGE is stale; the page is then rendered live and the
+live response becomes the new snapshot.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest, HttpResponse
+from django.urls import get_resolver, reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE: int = 60 * 60
+
+_pages: dict[str, tuple[Callable, str]] = {}  # name: (view function, url name)
+_snapshots: dict[str, tuple] = {}  # name: (mtime, content, gzipped content, etag)
+_lock: threading.Lock = threading.Lock()
+_templates_mtime: float | None = None
+
+
+def register(name: str, url_name: str) -> Callable:
+    """
+    Class decorator registering a view for pre-rendering. The view must use PrerenderedMixin.
+    :param str name: name of the snapshot files
+    :param str url_name: name of the URL of the page
+    :return Callable:
+    """
+    def decorator(view_class):
+        view_class.snapshot_name = name
+        _pages[name] = (view_class.as_view(), url_name)
+        return view_class
+    return decorator
+
+
+def root() -> Path:
+    """
+    Return the directory of the snapshots
+    :return Path:
+    """
+    return Path(getattr(settings, 'PRERENDER_ROOT', Path(settings.BASE_DIR) / 'prerendered'))
+
+
+def regenerate() -> None:
+    """
+    Render all registered pages for an anonymous visitor and store them, replacing the previous snapshots atomically
+    :return None:
+    """
+    get_resolver().url_patterns  # importing the URLconf imports and registers the views
+    for name, (view, url_name) in list(_pages.items()):
+        request = HttpRequest()
+        request.method = 'GET'
+        request.path = request.path_info = reverse(url_name)
+        request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+        request.user = AnonymousUser()
+        request.prerendering = True
+        try:
+            response = view(request)
+            if hasattr(response, 'render'):
+                response.render()
+            store(name, response.content)
+        except Exception:
+            # a broken snapshot must not be served, the page falls back to live rendering
+            logger.exception("Pre-rendering of the page '%s' failed", name)
+            discard(name)
+
+
+def store(name: str, content: bytes) -> None:
+    """
+    Write the snapshot of a page and its gzip variant
+    :param str name:
+    :param bytes content:
+    :return None:
+    """
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    for suffix, data in (('.html.gz', gzip.compress(content, mtime=0)), ('.html', content)):
+        path = directory / f"{name}{suffix}"
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+
+
+def discard(name: str) -> None:
+    """
+    Delete the snapshot of a page
+    :param str name:
+    :return None:
+    """
+    for suffix in ('.html', '.html.gz'):
+        (root() / f"{name}{suffix}").unlink(missing_ok=True)
+    with _lock:
+        _snapshots.pop(name, None)
+
+
+def serve(request: HttpRequest, name: str) -> HttpResponse | None:
+    """
+    Return the response with the snapshot of the page, or None if the page has to be rendered live
+    :param HttpRequest request:
+    :param str name:
+    :return HttpResponse | None:
+    """
+    if not _is_anonymous(request):
+        return None
+    snapshot = _load(name)
+    if snapshot is None:
+        return None
+    mtime, content, gzipped, etag = snapshot
+    response = HttpResponse()
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response.content = gzipped
+        response.headers['Content-Encoding'] = 'gzip'
+        etag = f'"{etag}-gz"'
+    else:
+        response.content = content
+        etag = f'"{etag}"'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(mtime)
+    response.headers['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Cookie', 'Accept-Encoding'))
+    return get_conditional_response(request, etag=etag, last_modified=int(mtime), response=response)
+
+
+def is_cacheable(request: HttpRequest, response: HttpResponse) -> bool:
+    """
+    Return True if the live response to the request can be stored as a snapshot
+    :param HttpRequest request:
+    :param HttpResponse response:
+    :return bool:
+    """
+    return response.status_code == 200 and _is_anonymous(request)
+
+
+def _is_anonymous(request: HttpRequest) -> bool:
+    """
+    Return True if the request gets the same page as every anonymous visitor
+    :param HttpRequest request:
+    :return bool:
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.GET
+        and not request.user.is_authenticated
+        and not len(messages.get_messages(request))
+    )
+
+
+def _load(name: str) -> tuple | None:
+    """
+    Return the snapshot of the page from the memory, reloaded if the file changed, or None if it is missing or stale
+    :param str name:
+    :return tuple | None: (mtime, content, gzipped content, etag)
+    """
+    path = root() / f"{name}.html"
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    max_age = getattr(settings, 'PRERENDER_MAX_AGE', DEFAULT_MAX_AGE)
+    if mtime < _get_templates_mtime() or time.time() - mtime > max_age:
+        return None
+    with _lock:
+        snapshot = _snapshots.get(name)
+    if snapshot is None or snapshot[0] != mtime:
+        try:
+            content = path.read_bytes()
+            gzipped = (root() / f"{name}.html.gz").read_bytes()
+        except FileNotFoundError:
+            return None
+        snapshot = (mtime, content, gzipped, hashlib.sha256(content).hexdigest()[:32])
+        with _lock:
+            _snapshots[name] = snapshot
+    return snapshot
+
+
+def _get_templates_mtime() -> float:
+    """
+    Return the time of the last change of the templates. Templates change only with a deployment, so it is computed once
+    per process.
+    :return float:
+    """
+    global _templates_mtime
+    if _templates_mtime is None:
+        directories = [Path(directory) for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+        directories.append(Path(__file__).resolve().parent / 'templates')
+        _templates_mtime = max(
+            (path.stat().st_mtime for directory in directories for path in directory.rglob('*.html')), default=0
+        )
+    return _templates_mtime
+
+
+class PrerenderedMixin:
+    """
+    Mixin of a view serving the pre-rendered snapshot of the page when possible. Register the view by
+    prerender.register().
+    """
+    snapshot_name: str = ''
+
+    def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        """
+        Serve the snapshot, or render the page live and store it as the new snapshot if it is the anonymous page
+        :param HttpRequest request:
+        :param args:
+        :param kwargs:
+        :return HttpResponse:
+        """
+        if getattr(request, 'prerendering', False):
+            return super().dispatch(request, *args, **kwargs)
+        response = serve(request, self.snapshot_name)
+        if response is not None:
+            return response
+        response = super().dispatch(request, *args, **kwargs)
+        if is_cacheable(request, response):
+            if hasattr(response, 'render'):
+                response.render()
+            try:
+                store(self.snapshot_name, response.content)
+            except OSError:
+                logger.exception("Snapshot of the page '%s' can't be stored", self.snapshot_name)
+        return response
@@ -0,0 +1,385 @@
+"""
+Module containing the per-request instrumentation: ProfilingMiddleware records the queries, the database time and the
+template rendering time of each request, sends them to the staff in the Server-Timing header and logs the requests
+exceeding the budgets in settings.PROFILING. Queries of the same shape (the same SQL with different parameters)
+executed repeatedly are logged as a probable N+1 together with the template line or the code which executed them.
+
+Queries are recorded by an execute wrapper installed on the database connections and collected into the profiles
+active in the current context, so the queries of the async ORM running in worker threads are counted too. Templates
+are timed by the ProfiledTemplates backend (settings.TEMPLATES).
+
+QueryBudgetMixin of the test cases fails a test whose code exceeds its query budget or executes an N+1 query.
+"""
+import contextlib
+import contextvars
+import logging
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: dict = {
+    'QUERY_BUDGET': 30,  # queries per request
+    'DB_TIME_BUDGET': 200,  # milliseconds of the database time per request
+    'DURATION_BUDGET': 500,  # milliseconds of the whole request
+    'N_PLUS_ONE_THRESHOLD': 5,  # executions of one query shape reported as a probable N+1
+    # send the Server-Timing header: 'staff' to the staff (and to everyone with DEBUG), True to everyone, False never;
+    # the timings tell the clients how the database performs
+    'SERVER_TIMING': 'staff',
+}
+LITERAL_PATTERN: re.Pattern = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LIST_PATTERN: re.Pattern = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+COLUMNS_PATTERN: re.Pattern = re.compile(r"^SELECT .*? FROM ")
+
+_active: contextvars.ContextVar = contextvars.ContextVar('profiles', default=())
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def shape(sql: str) -> str:
+    """
+    Return the SQL with the parameters and the literals replaced by ?, lists of values collapsed to (...)
+    :param str sql:
+    :return str:
+    """
+    sql = LITERAL_PATTERN.sub('?', sql.replace('%s', '?'))
+    return LIST_PATTERN.sub('(...)', sql)
+
+
+def origin() -> str:
+    """
+    Return the template line, or the line of the project code, executing the current query
+    :return str:
+    """
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    code = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type() doesn't evaluate a lazy object like the user of the request, isinstance() would
+        if issubclass(type(node), Node) and node.token is not None and node.origin is not None:
+            return f"{node.origin.template_name or node.origin.name}:{node.token.lineno}"
+        filename = frame.f_code.co_filename
+        if code is None and filename.startswith(base_dir) and filename != __file__:
+            code = f"{Path(filename).relative_to(base_dir)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return code or 'unknown'
+
+
+class Query(NamedTuple):
+    """
+    Query executed during a profile
+    """
+    sql: str
+    params: str  # repr of the parameters, for finding the duplicates
+    shape: str
+    duration: float  # milliseconds
+    origin: str | None  # None for the first query of its shape, the origin is looked up only for the repeated ones
+
+
+class QueryGroup(NamedTuple):
+    """
+    Repeated queries of the same shape
+    """
+    shape: str
+    count: int
+    duplicates: int  # executions with the same parameters as an earlier one
+    duration: float  # milliseconds
+    origins: list[str]
+
+
+class Profile:
+    """
+    Queries and rendering time recorded during a request or a block of code
+    """
+    def __init__(self) -> None:
+        self.queries: list[Query] = []
+        self.shapes: Counter = Counter()
+        self.template_time: float = 0  # milliseconds, including the queries executed by the templates
+        self.rendering: int = 0  # depth of the templates being rendered, nested templates are not counted twice
+        self.started: float = time.perf_counter()
+        self.finished: float | None = None
+
+    def record(self, sql: str, params, duration: float) -> None:
+        """
+        Record an executed query
+        :param str sql:
+        :param params:
+        :param float duration: milliseconds
+        :return None:
+        """
+        query_shape = shape(sql)
+        self.shapes[query_shape] += 1
+        query_origin = origin() if self.shapes[query_shape] > 1 else None
+        self.queries.append(Query(sql, repr(params), query_shape, duration, query_origin))
+
+    @property
+    def duration(self) -> float:
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    @property
+    def db_time(self) -> float:
+        return sum(query.duration for query in self.queries)
+
+    @property
+    def duplicates(self) -> int:
+        """
+        Number of the queries executed with the same SQL and parameters as an earlier query
+        :return int:
+        """
+        return len(self.queries) - len({(query.sql, query.params) for query in self.queries})
+
+    def groups(self, threshold: int = 2) -> list[QueryGroup]:
+        """
+        Return the groups of the queries of the same shape executed at least threshold times, the largest first
+        :param int threshold:
+        :return list:
+        """
+        queries = defaultdict(list)
+        for query in self.queries:
+            if self.shapes[query.shape] >= threshold:
+                queries[query.shape].append(query)
+        groups = [
+            QueryGroup(
+                shape=query_shape,
+                count=len(group),
+                duplicates=len(group) - len({(query.sql, query.params) for query in group}),
+                duration=sum(query.duration for query in group),
+                origins=list(dict.fromkeys(query.origin for query in group if query.origin)),
+            )
+            for query_shape, group in queries.items()
+        ]
+        return sorted(groups, key=lambda group: group.count, reverse=True)
+
+    def n_plus_one(self) -> list[QueryGroup]:
+        """
+        Return the groups of the queries which are probably executed for each item of a list
+        :return list:
+        """
+        return self.groups(config()['N_PLUS_ONE_THRESHOLD'])
+
+    def report(self) -> str:
+        """
+        Return the description of the recorded queries for the log and the failed tests
+        :return str:
+        """
+        lines = [
+            f"{len(self.queries)} queries ({self.duplicates} duplicate) in {self.db_time:.1f} ms, "
+            f"templates {self.template_time:.1f} ms, total {self.duration:.1f} ms"
+        ]
+        for group in self.n_plus_one():
+            lines.append(
+                f"  probable N+1: {group.count}x ({group.duplicates} duplicate) "
+                f"{COLUMNS_PATTERN.sub('SELECT ... FROM ', group.shape)[:300]} "
+                f"at {', '.join(group.origins) or 'unknown'}"
+            )
+        return '\n'.join(lines)
+
+    def server_timing(self) -> str:
+        """
+        Return the value of the Server-Timing header
+        :return str:
+        """
+        metrics = [
+            f'total;dur={self.duration:.1f}',
+            f'db;dur={self.db_time:.1f};desc="{len(self.queries)} queries, {self.duplicates} duplicate"',
+            f'tpl;dur={self.template_time:.1f}',
+        ]
+        n_plus_one = self.n_plus_one()
+        if n_plus_one:
+            metrics.append(f'n1;desc="{len(n_plus_one)} probable N+1"')
+        return ', '.join(metrics)
+
+
+def _execute(execute, sql, params, many, context):
+    """
+    Execute wrapper of the database connections recording the query into the active profiles
+    """
+    profiles = _active.get()
+    if not profiles:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        for active_profile in profiles:
+            active_profile.record(sql, params, duration)
+
+
+def _install_wrapper(connection) -> None:
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _connection_created(sender, connection, **kwargs) -> None:
+    _install_wrapper(connection)
+
+
+def install() -> None:
+    """
+    Install the query recording on the connections of this thread and on the connections opened later
+    :return None:
+    """
+    connection_created.connect(_connection_created, dispatch_uid='insurance_app.profiling')
+    for connection in connections.all():
+        _install_wrapper(connection)
+
+
+@contextlib.contextmanager
+def profile() -> Iterator[Profile]:
+    """
+    Context manager recording the queries and the template rendering of the block
+    :return Iterator[Profile]:
+    """
+    install()
+    current = Profile()
+    token = _active.set((*_active.get(), current))
+    try:
+        yield current
+    finally:
+        current.finished = time.perf_counter()
+        _active.reset(token)
+
+
+class ProfiledTemplate(Template):
+    """
+    Template measuring its rendering time into the active profiles
+    """
+    def render(self, context=None, request=None) -> str:
+        profiles = _active.get()
+        if not profiles:
+            return super().render(context, request)
+        for active_profile in profiles:
+            active_profile.rendering += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            for active_profile in profiles:
+                active_profile.rendering -= 1
+                if not active_profile.rendering:
+                    active_profile.template_time += duration
+
+
+class ProfiledTemplates(DjangoTemplates):
+    """
+    Django template backend returning the templates measuring their rendering time
+    """
+    def from_string(self, template_code: str) -> ProfiledTemplate:
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name: str) -> ProfiledTemplate:
+        try:
+            return ProfiledTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class ProfilingMiddleware:
+    """
+    Middleware profiling each request, it should be the first one so the whole request is measured. Streamed
+    responses are profiled only until the streaming starts.
+    """
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profile() as current:
+            response = self.get_response(request)
+        self.process(request, response, current)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        with profile() as current:
+            response = await self.get_response(request)
+        self.process(request, response, current)
+        return response
+
+    @staticmethod
+    def sends_server_timing(request: HttpRequest, mode: bool | str) -> bool:
+        """
+        Return True if the Server-Timing header is sent in the response to the request
+        :param HttpRequest request:
+        :param bool | str mode: value of the SERVER_TIMING option
+        :return bool:
+        """
+        if mode != 'staff':
+            return bool(mode)
+        # only the user loaded by the view is checked, loading it here would read the session and the user of every
+        # request and can't be done in the event loop of an async request
+        user = getattr(request, '_cached_user', None)
+        return settings.DEBUG or bool(user is not None and user.is_staff)
+
+    @staticmethod
+    def process(request: HttpRequest, response: HttpResponse, current: Profile) -> None:
+        """
+        Add the Server-Timing header to the response and log the request if it exceeded a budget or executed N+1 queries
+        :param HttpRequest request:
+        :param HttpResponse response:
+        :param Profile current:
+        :return None:
+        """
+        budgets = config()
+        if ProfilingMiddleware.sends_server_timing(request, budgets['SERVER_TIMING']):
+            response.headers['Server-Timing'] = current.server_timing()
+        exceeded = [
+            name for name, value, budget in (
+                ('queries', len(current.queries), budgets['QUERY_BUDGET']),
+                ('database time', current.db_time, budgets['DB_TIME_BUDGET']),
+                ('duration', current.duration, budgets['DURATION_BUDGET']),
+            )
+            if value > budget
+        ]
+        if exceeded or current.n_plus_one():
+            logger.warning(
+                "%s %s %s: %s", request.method, request.get_full_path(),
+                f"exceeded the budget of {', '.join(exceeded)}" if exceeded else "executed N+1 queries",
+                current.report()
+            )
+
+
+class QueryBudgetMixin:
+    """
+    Mixin of the test cases, e.g.
+        with self.assertQueryBudget(3):
+            self.client.get(url)
+    """
+    @contextlib.contextmanager
+    def assertQueryBudget(self, budget: int, allow_n_plus_one: bool = False) -> Iterator[Profile]:
+        """
+        Fail if the block executes more queries than the budget or executes a query for each item of a list
+        :param int budget: maximal number of the queries
+        :param bool allow_n_plus_one: don't fail on the N+1 queries
+        :return Iterator[Profile]:
+        """
+        with profile() as current:
+            yield current
+        if len(current.queries) > budget:
+            self.fail(f"{len(current.queries)} queries executed, the budget is {budget}\n{current.report()}")
+        if not allow_n_plus_one and current.n_plus_one():
+            self.fail(f"N+1 queries executed\n{current.report()}")
@@ -0,0 +1,196 @@
+"""
+Module containing the reporting summaries: payouts, claims and premium volume per product and month kept in
+ProductMonthSummary. The summaries are updated incrementally by the changes of contracts and insured events made through
+their save() and delete() methods, so the reports never aggregate the contracts and events themselves. Changes made
+around these methods (queryset.update(), raw SQL) must add their contribution by apply(), e.g. of events_deltas(), or be
+followed by rebuild().
+"""
+import datetime
+from collections import defaultdict
+from typing import Iterable
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, models as db_models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from . import models
+
+
+def month_of(date: datetime.date) -> datetime.date:
+    """
+    Return the first day of the month of the date
+    :param datetime.date date:
+    :return datetime.date:
+    """
+    return date.replace(day=1)
+
+
+def apply(deltas: dict[tuple, dict], using: str = 'default') -> None:
+    """
+    Add the deltas to the summaries, creating the missing rows
+    :param dict deltas: {(product_id, month): {counter: delta}}
+    :param str using: database alias
+    :return None:
+    """
+    summaries = models.ProductMonthSummary.objects.using(using)
+    for (product_id, month), counters in deltas.items():
+        counters = {name: value for name, value in counters.items() if value}
+        if not counters:
+            continue
+        changes = {name: F(name) + value for name, value in counters.items()}
+        with transaction.atomic(using=using):
+            if summaries.filter(product_id=product_id, month=month).update(**changes):
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    summaries.create(product_id=product_id, month=month, **counters)
+            except IntegrityError:
+                # created by a concurrent transaction in the meantime
+                summaries.filter(product_id=product_id, month=month).update(**changes)
+
+
+def event_deltas(state: tuple | None, sign: int = 1) -> dict[tuple, dict]:
+    """
+    Return the contribution of an insured event to the summaries
+    :param tuple state: (product_id, event_date, processed, approved, payout) or None for no contribution
+    :param int sign: 1 to add, -1 to subtract the contribution
+    :return dict: {(product_id, month): {counter: delta}}
+    """
+    if state is None:
+        return {}
+    product_id, event_date, processed, approved, payout = state
+    if not processed:
+        return {}
+    if approved:
+        counters = {'approved_count': sign, 'approved_payout': sign * (payout or 0)}
+    else:
+        counters = {'rejected_count': sign}
+    return {(product_id, month_of(event_date)): counters}
+
+
+def contract_deltas(state: tuple | None, sign: int = 1) -> dict[tuple, dict]:
+    """
+    Return the contribution of a contract to the summaries
+    :param tuple state: (product_id, conclusion_date, payment) or None for no contribution
+    :param int sign: 1 to add, -1 to subtract the contribution
+    :return dict: {(product_id, month): {counter: delta}}
+    """
+    if state is None:
+        return {}
+    product_id, conclusion_date, payment = state
+    return {(product_id, month_of(conclusion_date)): {'contracts_count': sign, 'premium': sign * payment}}
+
+
+def merge(*deltas: dict[tuple, dict]) -> dict[tuple, dict]:
+    """
+    Sum the deltas of several changes
+    :param deltas:
+    :return dict:
+    """
+    merged = defaultdict(lambda: defaultdict(int))
+    for delta in deltas:
+        for key, counters in delta.items():
+            for name, value in counters.items():
+                merged[key][name] += value
+    return merged
+
+
+def contracts_created(states: Iterable[tuple], using: str = 'default') -> None:
+    """
+    Add contracts inserted in bulk (the portfolio import) to the summaries
+    :param Iterable states: (product_id, conclusion_date, payment) of the contracts
+    :param str using: database alias
+    :return None:
+    """
+    apply(merge(*(contract_deltas(state) for state in states)), using)
+
+
+def contract_events_deltas(contract_id: int, using: str = 'default') -> dict[tuple, dict]:
+    """
+    Return the contribution of all processed events of a contract, to be subtracted when the contract and its events
+    are deleted
+    :param int contract_id:
+    :param str using: database alias
+    :return dict:
+    """
+    return events_deltas(models.InsuredEvent.objects.using(using).filter(contract_id=contract_id), -1)
+
+
+def events_deltas(events: db_models.QuerySet, sign: int = 1) -> dict[tuple, dict]:
+    """
+    Return the contribution of the processed events of the queryset aggregated by the database, used for the events
+    processed in bulk (insurance_app.claims)
+    :param QuerySet events: insured events
+    :param int sign: 1 to add, -1 to subtract the contribution
+    :return dict: {(product_id, month): {counter: delta}}
+    """
+    rows = (
+        events.filter(processed=True)
+        .annotate(month=TruncMonth('event_date'))
+        .values('contract__product_id', 'month')
+        .annotate(**_event_aggregates())
+        .order_by()
+    )
+    return {
+        (row['contract__product_id'], row['month']): {
+            'approved_count': sign * row['approved_count'],
+            'approved_payout': sign * (row['approved_payout'] or 0),
+            'rejected_count': sign * row['rejected_count'],
+        }
+        for row in rows
+    }
+
+
+def rebuild(using: str = 'default', apps=global_apps) -> int:
+    """
+    Recompute all summaries from the contracts and insured events
+    :param str using: database alias
+    :param apps: app registry, the historical one in migrations
+    :return int: number of the summary rows
+    """
+    insured_event, contract, summary = (
+        apps.get_model('insurance_app', name) for name in ('InsuredEvent', 'Contract', 'ProductMonthSummary')
+    )
+    events = (
+        insured_event.objects.using(using)
+        .filter(processed=True)
+        .annotate(month=TruncMonth('event_date'))
+        .values('contract__product_id', 'month')
+        .annotate(**_event_aggregates())
+        .order_by()
+    )
+    contracts = (
+        contract.objects.using(using)
+        .annotate(month=TruncMonth('conclusion_date'))
+        .values('product_id', 'month')
+        .annotate(contracts_count=Count('pk'), premium=Sum('payment'))
+        .order_by()
+    )
+    rows = defaultdict(dict)
+    for row in events:
+        rows[(row['contract__product_id'], row['month'])].update(
+            approved_count=row['approved_count'],
+            approved_payout=row['approved_payout'] or 0,
+            rejected_count=row['rejected_count'],
+        )
+    for row in contracts:
+        rows[(row['product_id'], row['month'])].update(contracts_count=row['contracts_count'], premium=row['premium'])
+    with transaction.atomic(using=using):
+        summary.objects.using(using).all().delete()
+        summary.objects.using(using).bulk_create(
+            [
+                summary(product_id=product_id, month=month, **counters)
+                for (product_id, month), counters in rows.items()
+            ],
+            batch_size=500,
+        )
+    return len(rows)
+
+
+def _event_aggregates() -> dict:
+    return {
+        'approved_count': Count('pk', filter=Q(approved=True)),
+        'approved_payout': Sum('payout', filter=Q(approved=True), output_field=db_models.BigIntegerField()),
+        'rejected_count': Count('pk', filter=Q(approved=False)),
+    }
@@ -0,0 +1,255 @@
+"""
+Module containing the routing of the heavy read views to a read replica of the database. Writes always go to the
+primary database. Reads go to the replica only inside the views decorated by replica_reads and only if the client
+didn't write recently: a request which writes sets a cookie for settings.REPLICA['STICKY_SECONDS'], so the following
+requests of the client read their own writes from the primary database until the replica catches up, which for the
+local copy below takes up to REFRESH_INTERVAL plus the duration of the copy. The writes are
+recognized by an execute wrapper of the connections, the router can't see them: Django asks it for the database of
+writing also when it only assigns a related object.
+
+Without a real replica, the alias configured in settings.REPLICA['ALIAS'] can point to a local SQLite copy of the
+primary database refreshed by the backup API (refresh(), the refresh_replica command). Until the copy exists, and when
+the replica is the primary database itself like a test mirror, everything is read from the primary database.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+import re
+import sqlite3
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.core.cache.backends.db import DatabaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponse
+from django.utils.module_loading import import_string
+
+DEFAULTS: dict = {
+    'ALIAS': 'replica',  # alias of the replica in settings.DATABASES
+    'STICKY_SECONDS': 60,  # reads of a client go to the primary database this long after its write, the replica lag
+    'COOKIE': 'read_primary',
+    'REFRESH_INTERVAL': 30,  # seconds between the starts of the refreshes of the local copy by refresh_replica
+    'COPY_SECONDS': 10,  # longest expected duration of a refresh, STICKY_SECONDS must cover it and REFRESH_INTERVAL
+}
+# models read from and written to the primary database, their writes don't make the client sticky
+PRIMARY_MODELS: tuple = ('insurance_app.session', 'sessions.session', 'django_cache.cacheentry')
+WRITE_PATTERN: re.Pattern = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)', re.IGNORECASE
+)
+
+_state: contextvars.ContextVar = contextvars.ContextVar('database_routing', default=None)
+_available: set = set()  # aliases of the replicas known to exist
+
+
+def config() -> dict:
+    options = {**DEFAULTS, **getattr(settings, 'REPLICA', {})}
+    if options['STICKY_SECONDS'] <= options['REFRESH_INTERVAL'] + options['COPY_SECONDS']:
+        raise ImproperlyConfigured(
+            "REPLICA['STICKY_SECONDS'] must exceed REFRESH_INTERVAL plus COPY_SECONDS, a client could miss its own "
+            "write in the replica"
+        )
+    return options
+
+
+class RoutingState:
+    """
+    Routing of the database queries of one request
+    """
+    def __init__(self, sticky: bool) -> None:
+        self.sticky: bool = sticky  # the client wrote recently
+        self.replica: bool = False  # the view reads from the replica
+        self.wrote: bool = False  # the request wrote to the database
+
+
+def replica_alias() -> str | None:
+    """
+    Return the alias of the replica, or None if there is no usable replica
+    :return str | None:
+    """
+    alias = config()['ALIAS']
+    if alias in _available:
+        return alias
+    if alias not in connections.settings:
+        return None
+    replica, primary = connections[alias].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+    if replica['NAME'] == primary['NAME']:
+        return None  # a test mirror
+    if connections[alias].vendor == 'sqlite' and not os.path.exists(replica['NAME']):
+        return None  # the local copy wasn't created yet
+    _available.add(alias)
+    return alias
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the views decorated by replica_reads to the replica
+    """
+    def db_for_read(self, model, **hints) -> str | None:
+        state = _state.get()
+        if state is None or not state.replica or state.sticky or state.wrote:
+            return None
+        if model._meta.label_lower in PRIMARY_MODELS:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool | None:
+        aliases = {DEFAULT_DB_ALIAS, config()['ALIAS']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True  # the replica holds the same objects
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str = None, **hints) -> bool | None:
+        if db == config()['ALIAS']:
+            return False  # the replica is a copy of the migrated primary database
+        return None
+
+
+@functools.cache
+def primary_tables() -> frozenset:
+    """
+    Return the tables of PRIMARY_MODELS and of the database caches, writing into them doesn't make the client sticky
+    :return frozenset:
+    """
+    tables = {
+        model._meta.db_table for model in apps.get_models(include_auto_created=True)
+        if model._meta.label_lower in PRIMARY_MODELS
+    }
+    tables.update(
+        cache['LOCATION'] for cache in settings.CACHES.values()
+        if issubclass(import_string(cache['BACKEND']), DatabaseCache)
+    )
+    return frozenset(tables)
+
+
+def _execute(execute, sql, params, many, context):
+    """
+    Execute wrapper of the database connections marking the request which writes into the database
+    """
+    state = _state.get()
+    if state is not None and not state.wrote:
+        match = WRITE_PATTERN.match(sql)
+        if match and match.group(1) not in primary_tables():
+            state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def _install_wrapper(connection) -> None:
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _connection_created(sender, connection, **kwargs) -> None:
+    _install_wrapper(connection)
+
+
+def install() -> None:
+    """
+    Install the recognition of the writes on the connections of this thread and on the connections opened later
+    :return None:
+    """
+    connection_created.connect(_connection_created, dispatch_uid='insurance_app.routers')
+    for connection in connections.all():
+        _install_wrapper(connection)
+
+
+def replica_reads(view):
+    """
+    Decorator of a view reading from the replica. It should be applied inside the authentication decorators, the user
+    and the session are loaded from the primary database before.
+    :param view: view function
+    :return: decorated view function
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            _use_replica()
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        _use_replica()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _use_replica() -> None:
+    state = _state.get()
+    if state is not None:
+        state.replica = True
+
+
+class ReplicaMiddleware:
+    """
+    Middleware keeping the routing state of each request and making the client sticky to the primary database after
+    it wrote
+    """
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(config()['COOKIE'] in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process(state, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        state = RoutingState(config()['COOKIE'] in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process(state, response)
+
+    @staticmethod
+    def process(state: RoutingState, response: HttpResponse) -> HttpResponse:
+        """
+        Set the cookie of the sticky client if the request wrote to the database
+        :param RoutingState state:
+        :param HttpResponse response:
+        :return HttpResponse:
+        """
+        if state.wrote:
+            options = config()
+            response.set_cookie(
+                options['COOKIE'], '1', max_age=options['STICKY_SECONDS'], httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def refresh(source: str = DEFAULT_DB_ALIAS, replica: str | None = None) -> float:
+    """
+    Copy the primary SQLite database into the local replica by the backup API. The readers of the replica keep
+    reading their snapshot during the copy.
+    :param str source: alias of the primary database
+    :param str replica: alias of the replica, settings.REPLICA['ALIAS'] by default
+    :return float: seconds of the copy
+    """
+    replica = replica or config()['ALIAS']
+    if connections[source].vendor != 'sqlite' or connections[replica].vendor != 'sqlite':
+        raise NotImplementedError("Only a SQLite database can be copied into a local replica")
+    start = time.perf_counter()
+    connections[source].ensure_connection()
+    with contextlib.closing(sqlite3.connect(connections[replica].settings_dict['NAME'])) as target:
+        connections[source].connection.backup(target)
+    return time.perf_counter() - start
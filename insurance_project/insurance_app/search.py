@@ -0,0 +1,125 @@
+"""
+Module containing the full-text search of the clients.
+On SQLite the clients are indexed in an FTS5 virtual table kept in sync by Person.save() and Person.delete(), other
+database backends fall back to the prefix matching on the normalized name column.
+"""
+import re
+from typing import Iterable
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Q, QuerySet
+from phonenumber_field.phonenumber import PhoneNumber
+
+FTS_TABLE: str = 'insurance_app_person_fts'
+CREATE_SQL: str = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5(name, email, phone, city, prefix='2 3')"  # prefix indexes make short prefix queries cheap
+)
+DROP_SQL: str = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+INDEXED_FIELDS: frozenset = frozenset({'first_name', 'last_name', 'email', 'phone', 'city'})  # see document()
+
+
+def fold(text: str) -> str:
+    """
+    Return the text transformed to lowercase ascii, so 'Nováček' is found by 'novacek'
+    :param str text:
+    :return str:
+    """
+    return get_user_model()._remove_interpunction(str(text)).lower()
+
+
+def is_enabled(using: str = 'default') -> bool:
+    """
+    Return True if the FTS5 index is used on the given database
+    :param str using: database alias
+    :return bool:
+    """
+    return connections[using].vendor == 'sqlite'
+
+
+def document(person) -> tuple:
+    """
+    Return the row of the FTS5 table representing the given person
+    :param person: Person instance
+    :return tuple: (rowid, name, email, phone, city)
+    """
+    phone = ""
+    if isinstance(person.phone, PhoneNumber):
+        # both the international and the national form, so the number can be searched without the country code
+        phone = f"{person.phone.country_code}{person.phone.national_number} {person.phone.national_number}"
+    elif person.phone:
+        phone = re.sub(r'[^0-9]', '', str(person.phone))
+    return (
+        person.pk,
+        fold(f"{person.last_name} {person.first_name}"),
+        fold(person.email),
+        phone,
+        fold(person.city),
+    )
+
+
+def index(persons: Iterable, using: str = 'default') -> None:
+    """
+    Insert or replace the given persons in the FTS5 index
+    :param Iterable persons: Person instances
+    :param str using: database alias
+    :return None:
+    """
+    if not is_enabled(using):
+        return
+    rows = [document(person) for person in persons]
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, email, phone, city) VALUES (%s, %s, %s, %s, %s)", rows
+        )
+
+
+def unindex(pks: Iterable[int], using: str = 'default') -> None:
+    """
+    Remove the persons with the given primary keys from the FTS5 index
+    :param Iterable pks:
+    :param str using: database alias
+    :return None:
+    """
+    if not is_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in pks])
+
+
+def tokens(query: str) -> list[str]:
+    """
+    Split a search query into normalized words
+    :param str query:
+    :return list:
+    """
+    return re.findall(r'\w+', fold(query))
+
+
+def search(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Filter the queryset of persons to those matching every word of the query as a prefix of a word in their name,
+    e-mail, phone or city. On SQLite the result is ordered by relevance.
+    :param QuerySet queryset: queryset of Person objects
+    :param str query:
+    :return QuerySet:
+    """
+    words = tokens(query)
+    if not words:
+        return queryset.none()
+    if not is_enabled(queryset.db):
+        condition = Q()
+        for word in words:
+            condition &= Q(search_name__startswith=word) | Q(search_name__contains=f" {word}")
+        return queryset.filter(condition)
+    match = " ".join(f'"{word}"*' for word in words)
+    table = queryset.model._meta.db_table
+    # joined to the index, so MATCH runs once and drives the query; the rank is read from the matched rows
+    return queryset.extra(
+        select={'search_rank': f"{FTS_TABLE}.rank"},
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+    ).order_by('search_rank', *queryset.query.order_by)
@@ -0,0 +1,135 @@
+"""
+Session engine of the project (settings.SESSION_ENGINE). Sessions are stored in the insurance_app_session table and read
+through an in-process LRU cache, so most requests of a logged-in user don't query the session table at all. Sessions
+whose data didn't change are never written back.
+
+The cached copy of a session is trusted for settings.SESSION_LOCAL_CACHE_TTL seconds. A session changed or deleted by
+another worker process (e.g. logout handled by another worker) is therefore seen by this process at most that late.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import db
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.utils import timezone
+
+from .utils import LRUDict
+
+DEFAULT_LOCAL_CACHE_TTL: int = 5
+DEFAULT_LOCAL_CACHE_SIZE: int = 10_000
+DEFAULT_CLEAR_BATCH: int = 500
+
+
+class SessionStore(db.SessionStore):
+    """
+    Database session store with an in-process read-through cache and write coalescing
+    """
+    _local: LRUDict = LRUDict(getattr(settings, 'SESSION_LOCAL_CACHE_SIZE', DEFAULT_LOCAL_CACHE_SIZE))
+    _lock: threading.Lock = threading.Lock()
+
+    def __init__(self, session_key: str | None = None) -> None:
+        super().__init__(session_key)
+        self._loaded_data: dict | None = None  # copy of the data as loaded, for detecting real changes
+
+    @classmethod
+    def get_model_class(cls):
+        from .models import Session
+        return Session
+
+    def load(self) -> dict:
+        """
+        Return the session data, from the local cache if it holds a fresh copy, otherwise from the database
+        :return dict:
+        """
+        with self._lock:
+            entry = self._local.get(self.session_key)
+        if entry is not None:
+            session_data, expire_date, cached_at = entry
+            if time.monotonic() - cached_at < self._ttl() and expire_date > timezone.now():
+                data = self.decode(session_data)
+                self._loaded_data = copy.deepcopy(data)
+                return data
+        session_key = self.session_key
+        s = self._get_session_from_db()
+        if s is None:
+            self._forget(session_key)
+            return {}
+        self._remember(s.session_key, s.session_data, s.expire_date)
+        data = self.decode(s.session_data)
+        self._loaded_data = copy.deepcopy(data)
+        return data
+
+    def save(self, must_create: bool = False) -> None:
+        """
+        Save the session data to the database, unless the data is the same as it was loaded
+        :param bool must_create:
+        :return None:
+        """
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if not must_create and self._loaded_data is not None and data == self._loaded_data:
+            return
+        obj = self.create_model_instance(data)
+        using = router.db_for_write(self.model, instance=obj)
+        try:
+            with transaction.atomic(using=using):
+                obj.save(force_insert=must_create, force_update=not must_create, using=using)
+        except IntegrityError:
+            if must_create:
+                raise CreateError
+            raise
+        except DatabaseError:
+            if not must_create:
+                raise UpdateError
+            raise
+        self._remember(obj.session_key, obj.session_data, obj.expire_date)
+        self._loaded_data = copy.deepcopy(data)
+
+    def delete(self, session_key: str | None = None) -> None:
+        """
+        Delete the session from the database and from the local cache
+        :param str session_key:
+        :return None:
+        """
+        self._forget(session_key or self.session_key)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls) -> None:
+        """
+        Delete expired sessions in small batches, each in a short transaction, so the web workers are not blocked by a
+        long lock on the session table. Used by 'python manage.py clearsessions'.
+        :return None:
+        """
+        model = cls.get_model_class()
+        batch_size = getattr(settings, 'SESSION_CLEAR_BATCH', DEFAULT_CLEAR_BATCH)
+        now = timezone.now()
+        while True:
+            with transaction.atomic(using=router.db_for_write(model)):
+                keys = list(
+                    model.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+                )
+                model.objects.filter(session_key__in=keys).delete()
+            if len(keys) < batch_size:
+                break
+        with cls._lock:
+            for key in [key for key, (_, expire_date, _) in cls._local.items() if expire_date < now]:
+                del cls._local[key]
+
+    @staticmethod
+    def _ttl() -> float:
+        return getattr(settings, 'SESSION_LOCAL_CACHE_TTL', DEFAULT_LOCAL_CACHE_TTL)
+
+    @classmethod
+    def _remember(cls, session_key: str, session_data: str, expire_date) -> None:
+        with cls._lock:
+            cls._local[session_key] = (session_data, expire_date, time.monotonic())
+
+    @classmethod
+    def _forget(cls, session_key: str | None) -> None:
+        with cls._lock:
+            cls._local.pop(session_key, None)
@@ -0,0 +1,3 @@
+"""
+SQLite database backend configured for production, see insurance_app.sqlite.base
+"""
@@ -0,0 +1,180 @@
+"""
+SQLite database backend tuned for several worker processes sharing one database file:
+
+* each new connection applies the PRAGMAs of OPTIONS['pragmas'] merged into DEFAULT_PRAGMAS; the write-ahead log lets
+  the readers proceed while a transaction is being written,
+* atomic blocks start by BEGIN IMMEDIATE (OPTIONS['transaction_mode']), so a transaction which reads before it writes
+  takes the write lock at the start instead of failing with "database is locked" when it tries to upgrade its read
+  lock while another process writes,
+* statements executed outside a transaction, including the BEGIN itself, are retried with a random backoff when the
+  database stays locked longer than the busy timeout (OPTIONS['busy_retries']); a statement inside a transaction is
+  never retried, the whole transaction would have to be, so executemany() outside a transaction writes all its rows
+  in one transaction retried as a whole,
+* the write-ahead log is checkpointed after a commit at most once per OPTIONS['checkpoint_interval'] seconds in each
+  process, in addition to the automatic checkpoints which can't complete while readers use the old pages.
+
+    DATABASES = {'default': {'ENGINE': 'insurance_app.sqlite', 'NAME': ..., 'OPTIONS': {'pragmas': {...}}}}
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRAGMAS: dict = {
+    'busy_timeout': 5000,  # milliseconds a statement waits for a lock, set first so the journal mode can wait too
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # durable at the checkpoints, a commit doesn't wait for fsync in the WAL mode
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32 * 1024,  # KiB of the page cache of each connection
+    'temp_store': 'MEMORY',
+    'journal_size_limit': 64 * 1024 * 1024,  # size the log is truncated to after a checkpoint
+}
+DEFAULTS: dict = {
+    'transaction_mode': 'IMMEDIATE',  # DEFERRED, IMMEDIATE or EXCLUSIVE
+    'busy_retries': 5,  # retries of a statement outside a transaction after the busy timeout
+    'retry_delay': 0.05,  # seconds, the maximal backoff doubles with each retry
+    'retry_max_delay': 1.0,
+    'checkpoint_interval': 300,  # seconds, 0 disables the checkpoints after the commits
+}
+BUSY_CODES: tuple = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+_checkpoints: dict[str, float] = {}  # database name: time of the last checkpoint made by this process
+_checkpoints_lock: threading.Lock = threading.Lock()
+
+
+def is_busy(exc: Exception) -> bool:
+    """
+    Return True if the error means that another connection holds a lock of the database
+    :param Exception exc:
+    :return bool:
+    """
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in BUSY_CODES  # the extended codes keep the primary code in the lowest byte
+    return 'locked' in str(exc) or 'busy' in str(exc)
+
+
+def backoff(attempt: int, delay: float, max_delay: float) -> float:
+    """
+    Return a random delay before the retry, the full jitter spreads the retries of the competing processes
+    :param int attempt: number of the retry starting from 0
+    :param float delay: seconds of the maximal delay of the first retry
+    :param float max_delay: seconds
+    :return float: seconds
+    """
+    return random.uniform(0, min(max_delay, delay * 2 ** attempt))
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    """
+    Cursor retrying the statements executed outside a transaction while the database is locked
+    """
+    retry: dict = DEFAULTS  # replaced by the options of the connection
+
+    def execute(self, query, params=None):
+        return self._retrying(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        if self.connection.in_transaction:
+            return super().executemany(query, param_list)
+        # in autocommit each row would be committed by itself and a retry would repeat the rows committed before
+        # the busy error
+        return self._retrying(self._executemany_in_transaction, query, list(param_list))
+
+    def _executemany_in_transaction(self, query, param_list):
+        sqlite3.Cursor.execute(self, f"BEGIN {self.retry['transaction_mode'].upper()}")
+        try:
+            result = super().executemany(query, param_list)
+            self.connection.commit()
+        except BaseException:
+            if self.connection.in_transaction:
+                self.connection.rollback()
+            raise
+        return result
+
+    def _retrying(self, method, query, params):
+        attempt = 0
+        while True:
+            in_transaction = self.connection.in_transaction
+            try:
+                return method(query, params)
+            except sqlite3.OperationalError as exc:
+                if in_transaction or attempt >= self.retry['busy_retries'] or not is_busy(exc):
+                    raise
+            delay = backoff(attempt, self.retry['retry_delay'], self.retry['retry_max_delay'])
+            logger.info("Database is locked, retry %d in %.3f s", attempt + 1, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend applying the production PRAGMAs, the configured transaction mode, the retries and the checkpoints
+    """
+    def __init__(self, settings_dict: dict, alias: str = 'default') -> None:
+        super().__init__(settings_dict, alias)
+        options = self.settings_dict.get('OPTIONS') or {}
+        self.options: dict = {**DEFAULTS, **{key: options[key] for key in DEFAULTS if key in options}}
+        self.pragmas: dict = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        if self.options['transaction_mode'].upper() not in ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'):
+            raise ImproperlyConfigured(f"Unknown SQLite transaction mode {self.options['transaction_mode']}")
+
+    def get_connection_params(self) -> dict:
+        params = super().get_connection_params()
+        for key in ('pragmas', *DEFAULTS):
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params: dict) -> sqlite3.Connection:
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def create_cursor(self, name=None) -> SQLiteCursorWrapper:
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.retry = self.options
+        return cursor
+
+    def _start_transaction_under_autocommit(self) -> None:
+        self.cursor().execute(f"BEGIN {self.options['transaction_mode'].upper()}")
+
+    def _commit(self) -> None:
+        super()._commit()
+        if self.options['checkpoint_interval'] and not self.is_in_memory_db():
+            self._checkpoint_if_due()
+
+    def _checkpoint_if_due(self) -> None:
+        """
+        Copy the committed pages from the log into the database unless another thread of this process did recently.
+        The passive checkpoint never waits for the other connections, it copies what it can.
+        :return None:
+        """
+        name = str(self.settings_dict['NAME'])
+        now = time.monotonic()
+        with _checkpoints_lock:
+            last = _checkpoints.get(name)
+            if last is not None and now - last < self.options['checkpoint_interval']:
+                return
+            _checkpoints[name] = now
+        self.checkpoint('PASSIVE')
+
+    def checkpoint(self, mode: str = 'PASSIVE') -> tuple[int, int, int]:
+        """
+        Checkpoint the write-ahead log
+        :param str mode: PASSIVE, FULL, RESTART or TRUNCATE
+        :return tuple: (1 if a lock prevented the checkpoint from completing, frames in the log, checkpointed frames)
+        """
+        if mode.upper() not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Unknown checkpoint mode {mode}")
+        self.ensure_connection()
+        with self.wrap_database_errors:
+            return tuple(self.connection.execute(f"PRAGMA wal_checkpoint({mode.upper()})").fetchone())
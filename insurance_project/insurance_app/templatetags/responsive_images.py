@@ -0,0 +1,35 @@
+"""
+Module containing the template tags of the responsive product images
+"""
+from django import template
+from django.utils.html import format_html
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(product, sizes: str = '100vw', **attributes) -> str:
+    """
+    Render the product image as a lazily loaded <picture> offering its WebP and JPEG derivatives of several widths.
+    Until the derivatives of the current image exist, only the original is offered.
+    Usage: {% responsive_image product sizes="(min-width: 576px) 50vw, 100vw" class="img-fluid" %}
+    :param product: Product instance
+    :param str sizes: value of the sizes attribute
+    :param attributes: additional attributes of the <img> element
+    :return str:
+    """
+    variants = product.image_variants or {}
+    extra = format_html(''.join(f' {name}="{{}}"' for name in attributes), *attributes.values())
+    if variants.get('source') != product.image.name:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', product.image.url, product.name, extra)
+    storage = product.image.storage
+    return format_html(
+        '<picture><source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async"{}>'
+        '</picture>',
+        images.MIME_TYPES['webp'], images.srcset(variants, 'webp', storage), sizes,
+        product.image.url, images.srcset(variants, 'jpg', storage), sizes,
+        variants['width'], variants['height'], product.name, extra,
+    )
@@ -1,3 +1,1379 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, is_password_usable
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, router, transaction
+from django.db.models import F
+from django.http import Http404, HttpRequest, HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from insurance_app import (
+    adjudication, assets, audit, authentication, backends, billing, datasets, hashing, images, media, models, numbering,
+    portfolio, prerender, profiling, reporting, routers, search, throttling, warmup
+)
+from insurance_app.management.commands.startup_profile import parse_importtime
+from insurance_app.sqlite.base import DatabaseWrapper
+
+
+class ProfilingTest(profiling.QueryBudgetMixin, TestCase):
+    """
+    Tests of the per-request query profiler
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.client_person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        product = models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+        cls.contracts = [
+            models.Contract.objects.create(product=product, insured=cls.client_person, payment=1000) for _ in range(6)
+        ]
+
+    def test_shape_ignores_parameters_and_literals(self) -> None:
+        self.assertEqual(
+            profiling.shape("SELECT * FROM t WHERE a = %s AND b IN (%s, %s, %s) AND c = 'x' AND d = 12"),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ? AND d = ?",
+        )
+
+    def test_n_plus_one_reports_template_line(self) -> None:
+        template = engines['django'].from_string(
+            "{% for contract in contracts %}\n{{ contract.product.name }}\n{% endfor %}"
+        )
+        contracts = list(models.Contract.objects.all())
+        with profiling.profile() as current:
+            template.render({'contracts': contracts})
+        groups = current.n_plus_one()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].count, 6)
+        self.assertEqual(groups[0].duplicates, 5)
+        self.assertTrue(groups[0].origins[0].endswith(':2'))
+        self.assertGreater(current.template_time, 0)
+
+    def test_query_budget_fails(self) -> None:
+        with self.assertRaisesMessage(AssertionError, 'the budget is 1'):
+            with self.assertQueryBudget(1):
+                list(models.Contract.objects.all())
+                list(models.Product.objects.all())
+        with self.assertRaisesMessage(AssertionError, 'probable N+1'):
+            with self.assertQueryBudget(10):
+                for contract in models.Contract.objects.all():
+                    models.Product.objects.get(pk=contract.product_id)
+
+    @override_settings(PROFILING={'QUERY_BUDGET': 1, 'SERVER_TIMING': True})
+    def test_server_timing_and_budget_log(self) -> None:
+        self.client.force_login(self.client_person)
+        with self.assertLogs('insurance_app.profiling', 'WARNING') as logs:
+            response = self.client.get(reverse('my-contracts'))
+        self.assertIn('db;dur=', response.headers['Server-Timing'])
+        self.assertIn('exceeded the budget of queries', logs.output[0])
+
+    def test_server_timing_is_sent_to_staff_only(self) -> None:
+        self.assertNotIn('Server-Timing', self.client.get(reverse('about')).headers)
+        self.client.force_login(self.client_person)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('my-contracts')).headers)
+        staff = models.Person.objects.create_user(
+            email='staff@test.cz', first_name='Jan', last_name='Novák', date_of_birth=datetime.date(1980, 1, 1),
+            is_staff=True
+        )
+        self.client.force_login(staff)
+        self.assertIn('Server-Timing', self.client.get(reverse('about')).headers)
+        with override_settings(DEBUG=True):
+            self.client.logout()
+            self.assertIn('Server-Timing', self.client.get(reverse('about')).headers)
+
+    @override_settings(DEBUG=False)
+    async def test_server_timing_does_not_load_user_under_asgi(self) -> None:
+        staff = await models.Person.objects.acreate(
+            email='staff@test.cz', first_name='Jan', last_name='Novák', date_of_birth=datetime.date(1980, 1, 1),
+            is_staff=True
+        )
+        await sync_to_async(self.async_client.force_login)(staff)
+        response = await self.async_client.get(reverse('media', kwargs={'path': 'images/962830.jpg'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response.headers)  # the view didn't load the user
+
+
+class QueryPlanAuditTest(TestCase):
+    """
+    Tests of the query plans of the list pages
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        datasets.build(300, seed=1)
+
+    def test_list_pages_use_indexes(self) -> None:
+        findings, explained = audit.audit()
+        self.assertGreater(explained, len(audit.PAGES))
+        if findings:
+            self.fail('\n'.join(f"{finding.page}: {finding.step}\n    {finding.sql}" for finding in findings))
+
+    def test_full_scan_is_reported(self) -> None:
+        steps = audit.plan("SELECT * FROM insurance_app_insuredevent WHERE description = %s ORDER BY payout", ['x'])
+        self.assertEqual(audit.problems(steps), ['SCAN insurance_app_insuredevent', 'USE TEMP B-TREE FOR ORDER BY'])
+        self.assertEqual(audit.problems(audit.plan("SELECT * FROM insurance_app_product", [])), [])
+
+
+class DatasetsTest(TestCase):
+    """
+    Tests of the synthetic portfolios
+    """
+    def _dates(self) -> list:
+        return list(models.InsuredEvent.objects.order_by('pk').values_list('event_date', 'reporting_date'))
+
+    def test_data_does_not_depend_on_the_current_date(self) -> None:
+        datasets.PortfolioGenerator(seed=2).generate(30)
+        self.assertTrue(self._dates())
+        self.assertLessEqual(models.Contract.objects.latest('conclusion_date').conclusion_date, datasets.REFERENCE_DATE)
+        self.assertLessEqual(max(reported for _, reported in self._dates()), datasets.REFERENCE_DATE)
+
+    def test_reference_date(self) -> None:
+        today = datetime.date(2015, 6, 30)
+        datasets.PortfolioGenerator(seed=2, today=today).generate(30)
+        self.assertLessEqual(models.Contract.objects.latest('conclusion_date').conclusion_date, today)
+        self.assertLessEqual(max(reported for _, reported in self._dates()), today)
+
+
+class SQLiteBackendTest(TestCase):
+    """
+    Tests of the production SQLite backend
+    """
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        self.first = self._connect()
+        with self.first.cursor() as cursor:
+            cursor.execute("CREATE TABLE item (value INTEGER)")
+
+    def _connect(self, **options) -> DatabaseWrapper:
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': self.path, 'OPTIONS': options}, alias='file')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_are_applied(self) -> None:
+        with self.first.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_transaction_takes_write_lock_at_begin(self) -> None:
+        second = self._connect(pragmas={'busy_timeout': 0}, busy_retries=0)
+        self.first._start_transaction_under_autocommit()
+        with self.assertRaises(OperationalError):
+            second._start_transaction_under_autocommit()
+        self.first.connection.commit()
+        second._start_transaction_under_autocommit()
+        second.connection.commit()
+
+    def test_locked_statement_is_retried(self) -> None:
+        second = self._connect(pragmas={'busy_timeout': 0}, busy_retries=3)
+        self.first._start_transaction_under_autocommit()
+
+        def release(delay: float) -> None:
+            self.first.connection.commit()
+
+        with mock.patch('insurance_app.sqlite.base.time.sleep', side_effect=release) as sleep:
+            with second.cursor() as cursor:
+                cursor.execute("INSERT INTO item (value) VALUES (%s)", [1])
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_retries_are_bounded(self) -> None:
+        second = self._connect(pragmas={'busy_timeout': 0}, busy_retries=2)
+        self.first._start_transaction_under_autocommit()
+        with mock.patch('insurance_app.sqlite.base.time.sleep') as sleep, self.assertRaises(OperationalError):
+            with second.cursor() as cursor:
+                cursor.execute("INSERT INTO item (value) VALUES (%s)", [1])
+        self.assertEqual(sleep.call_count, 2)
+        self.first.connection.commit()
+
+    def test_executemany_outside_transaction_is_atomic(self) -> None:
+        with self.first.cursor() as cursor:
+            cursor.execute("CREATE TABLE unique_item (value INTEGER UNIQUE)")
+            with self.assertRaises(IntegrityError):
+                cursor.executemany("INSERT INTO unique_item (value) VALUES (%s)", [(1,), (2,), (2,)])
+            cursor.execute("SELECT COUNT(*) FROM unique_item")
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertFalse(self.first.connection.in_transaction)
+
+    def test_locked_executemany_is_retried_once(self) -> None:
+        second = self._connect(pragmas={'busy_timeout': 0}, busy_retries=3)
+        self.first._start_transaction_under_autocommit()
+
+        def release(delay: float) -> None:
+            self.first.connection.commit()
+
+        with mock.patch('insurance_app.sqlite.base.time.sleep', side_effect=release) as sleep:
+            with second.cursor() as cursor:
+                cursor.executemany("INSERT INTO item (value) VALUES (%s)", ((value,) for value in range(3)))
+                cursor.execute("SELECT value FROM item ORDER BY value")
+                self.assertEqual(cursor.fetchall(), [(0,), (1,), (2,)])
+        self.assertEqual(sleep.call_count, 1)
+
+
+class ReplicaAuditTest(TestCase):
+    """
+    Tests of the query plan audit of the pages reading from the replica
+    """
+    databases: set = {'default', 'replica'}
+
+    def test_queries_are_explained_on_the_database_which_executed_them(self) -> None:
+        with audit.collect() as queries:
+            for alias in ('replica', 'default'):
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("SELECT name FROM sqlite_master WHERE name = %s", ['insurance_app_product'])
+        self.assertEqual([alias for alias, sql, params in queries], ['replica', 'default'])
+        alias, sql, params = queries[0]
+        self.assertTrue(audit.plan(sql, params, alias)[0].startswith('SCAN'))
+
+
+class ReplicaRouterTest(TestCase):
+    """
+    Tests of the routing of the heavy read views to the replica
+    """
+    def setUp(self) -> None:
+        patcher = mock.patch.object(routers, 'replica_alias', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def _get(self, view, **cookies) -> HttpResponse:
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        return routers.ReplicaMiddleware(view)(request)
+
+    @staticmethod
+    @routers.replica_reads
+    def _reading_view(request: HttpRequest) -> HttpResponse:
+        return HttpResponse(router.db_for_read(models.Product))
+
+    @staticmethod
+    @routers.replica_reads
+    def _writing_view(request: HttpRequest) -> HttpResponse:
+        models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+        return HttpResponse(router.db_for_read(models.Product))
+
+    def test_decorated_view_reads_from_replica(self) -> None:
+        response = self._get(self._reading_view)
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn(routers.config()['COOKIE'], response.cookies)
+        response = self._get(lambda request: HttpResponse(router.db_for_read(models.Product)))
+        self.assertEqual(response.content, b'default')
+
+    def test_client_reads_its_writes(self) -> None:
+        response = self._get(self._writing_view)
+        self.assertEqual(response.content, b'default')
+        cookie = response.cookies[routers.config()['COOKIE']]
+        self.assertEqual(cookie['max-age'], routers.config()['STICKY_SECONDS'])
+        response = self._get(self._reading_view, **{cookie.key: cookie.value})
+        self.assertEqual(response.content, b'default')
+
+    def test_sticky_window_covers_replica_lag(self) -> None:
+        options = routers.config()
+        self.assertGreater(options['STICKY_SECONDS'], options['REFRESH_INTERVAL'] + options['COPY_SECONDS'])
+        with override_settings(REPLICA={'STICKY_SECONDS': 30, 'REFRESH_INTERVAL': 30}):
+            with self.assertRaises(ImproperlyConfigured):
+                routers.config()
+
+    def test_session_write_does_not_make_client_sticky(self) -> None:
+        def view(request: HttpRequest) -> HttpResponse:
+            request.session['key'] = 'value'
+            request.session.save()
+            return HttpResponse()
+
+        request = self.factory.get('/')
+        request.session = models.Session.get_session_store_class()()
+        response = routers.ReplicaMiddleware(routers.replica_reads(view))(request)
+        self.assertNotIn(routers.config()['COOKIE'], response.cookies)
+
+
+class ReplicaRefreshTest(TransactionTestCase):
+    """
+    Tests of the local stand-in of the replica, the copy can't be made inside the transaction of a TestCase
+    """
+    def test_refresh_copies_primary_database(self) -> None:
+        models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            with mock.patch.dict(connections['replica'].settings_dict, {'NAME': path}):
+                routers.refresh()
+            with sqlite3.connect(path) as replica:
+                names = replica.execute("SELECT name FROM insurance_app_product").fetchall()
+        self.assertEqual(names, [('Produkt',)])
+
+
+class AdjudicationTest(TestCase):
+    """
+    Tests of the automatic adjudication of the pending insured events by the rules of the products
+    """
+    TODAY: datetime.date = datetime.date.today()
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        cls.product, cls.other_product = (
+            models.Product.objects.create(name=f'Produkt {i}', image='images/962830.jpg') for i in range(2)
+        )
+        cls.contract, cls.late_contract, cls.new_contract, cls.other_contract = (
+            models.Contract.objects.create(product=product, insured=person, payment=1000)
+            for product in (cls.product, cls.product, cls.product, cls.other_product)
+        )
+        models.Contract.objects.exclude(pk=cls.new_contract.pk)\
+            .update(conclusion_date=cls.TODAY - datetime.timedelta(days=365))
+        reporting.rebuild()  # the conclusion dates were updated around the summaries
+        cls.waiting = models.AdjudicationRule.objects.create(
+            product=cls.product, name='Čekací doba', priority=0, approve=False, max_contract_age=29
+        )
+        cls.small = models.AdjudicationRule.objects.create(
+            product=cls.product, name='Drobná škoda', priority=1, approve=True, payout=3000, max_report_delay=14,
+            max_prior_claims=1
+        )
+
+    def _event(self, contract: models.Contract, days_before: int = 1) -> models.InsuredEvent:
+        return models.InsuredEvent.objects.create(
+            contract=contract, event_date=self.TODAY - datetime.timedelta(days=days_before), description='Popis'
+        )
+
+    def test_first_matching_rule_decides(self) -> None:
+        waiting = self._event(self.new_contract)
+        small = self._event(self.contract)
+        second = self._event(self.contract)
+        third = self._event(self.contract)  # two prior claims
+        late = self._event(self.late_contract, days_before=30)
+        other = self._event(self.other_contract)
+        result = adjudication.run(chunk_size=2)
+        self.assertEqual(result.evaluated, 6)
+        self.assertEqual(result.decided, {self.waiting: 1, self.small: 2})
+        events = models.InsuredEvent.objects.in_bulk()
+        self.assertEqual((events[waiting.pk].approved, events[waiting.pk].rule), (False, self.waiting))
+        for event in (small, second):
+            self.assertEqual(
+                (events[event.pk].approved, events[event.pk].payout, events[event.pk].rule), (True, 3000, self.small)
+            )
+        for event in (third, late, other):
+            self.assertFalse(events[event.pk].processed)
+
+    def test_summaries_and_dry_run(self) -> None:
+        for _ in range(3):
+            self._event(self.contract)
+        self.assertEqual(adjudication.run(dry_run=True).decided, {self.small: 2})
+        self.assertFalse(models.InsuredEvent.objects.filter(processed=True).exists())
+        adjudication.run()
+        summaries = list(models.ProductMonthSummary.objects.order_by('product', 'month').values_list(
+            'product', 'month', 'approved_count', 'approved_payout', 'rejected_count'
+        ))
+        reporting.rebuild()
+        self.assertEqual(summaries, list(models.ProductMonthSummary.objects.order_by('product', 'month').values_list(
+            'product', 'month', 'approved_count', 'approved_payout', 'rejected_count'
+        )))
+        self.assertEqual(adjudication.run().decided, {})
+
+    def test_prior_claims_follow_the_reporting_date(self) -> None:
+        first, second = self._event(self.contract), self._event(self.contract)
+        models.InsuredEvent.objects.filter(pk=first.pk).update(reporting_date=self.TODAY)
+        models.InsuredEvent.objects.filter(pk=second.pk).update(reporting_date=self.TODAY - datetime.timedelta(days=2))
+        third = self._event(self.contract)  # reported the same day as the first one
+        columns = adjudication.load(models.InsuredEvent.objects.order_by('pk'))
+        self.assertEqual(columns.pk, [first.pk, second.pk, third.pk])
+        self.assertEqual(columns.prior_claims, [1, 0, 2])
+
+    def test_columns_are_evaluated_together(self) -> None:
+        columns = adjudication.Columns(
+            pk=[1, 2, 3, 4], product=[self.product.pk] * 4, contract_age=[5, 40, 40, 40], report_delay=[0, 0, 20, 0],
+            prior_claims=[0, 0, 0, 2]
+        )
+        self.assertEqual(
+            adjudication.decide(columns, {self.product.pk: [self.waiting, self.small]}),
+            {self.waiting: [1], self.small: [2]}
+        )
+
+
+class BillingTest(TestCase):
+    """
+    Tests of the annual billing run
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        product = models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+        cls.contracts = [
+            models.Contract.objects.create(product=product, insured=person, payment=1000 * (i + 1)) for i in range(5)
+        ]
+        models.Contract.objects.filter(pk=cls.contracts[-1].pk).update(conclusion_date=datetime.date(2031, 1, 1))
+
+    def test_invoices_of_the_contracts_concluded_by_the_end_of_the_period(self) -> None:
+        created = billing.run(2030, datetime.date(2030, 1, 15), chunk_size=2)
+        self.assertEqual(created, 4)
+        self.assertEqual(
+            list(models.Invoice.objects.order_by('contract').values_list('contract', 'amount', 'due_date')),
+            [(contract.pk, contract.payment, datetime.date(2030, 2, 14)) for contract in self.contracts[:4]]
+        )
+
+    def test_repeated_and_resumed_runs_dont_duplicate_invoices(self) -> None:
+        billing.run(2030, chunk_size=2)
+        self.assertEqual(billing.run(2030), 0)
+        models.Contract.objects.filter(pk=self.contracts[-1].pk).update(conclusion_date=datetime.date(2030, 6, 1))
+        self.assertEqual(billing.run(2030), 0)  # behind the checkpoint
+        billing.reset(2030)
+        self.assertEqual(billing.run(2030), 1)
+        self.assertEqual(models.Invoice.objects.filter(period=2030).count(), 5)
+        self.assertEqual(billing.run(2031), 5)
+
+
+class NumberingTest(TestCase):
+    """
+    Tests of the contract numbers allocated by the leased blocks of the sequence
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        cls.product = models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+
+    def test_check_digit_and_legacy_numbers(self) -> None:
+        numbers = [numbering.contract_number(value) for value in range(1000)]
+        self.assertEqual(len(set(numbers)), 1000)
+        self.assertTrue(all(len(str(number)) == 10 and numbering.is_valid(number) for number in numbers))
+        self.assertFalse(numbering.is_valid(numbers[0] + 1))
+        self.assertFalse(numbering.is_valid(numbers[0] + 10))
+        self.assertTrue(numbering.is_valid(10_000_001 + 42 * 127 ** 2))
+        self.assertFalse(numbering.is_valid(10_000_002 + 42 * 127 ** 2))
+        # a new number never takes the form of a legacy number
+        skipped = [value for value in range(100_000) if numbering.contract_number(value) is None]
+        self.assertTrue(skipped)
+        for value in skipped:
+            core = numbering.FIRST_CORE + value * numbering.MULTIPLIER % numbering.CORE_RANGE
+            self.assertTrue(numbering.is_legacy(core * 10 + numbering.luhn_digit(core)))
+
+    def test_block_is_leased_once(self) -> None:
+        allocator = numbering.BlockAllocator('test', numbering.contract_number, block_size=10)
+        numbers = allocator.take(25)  # one block of all the numbers
+        self.assertEqual(models.NumberSequence.objects.get(name='test').value, 25)
+        numbers.append(allocator.allocate())
+        with self.assertNumQueries(0):
+            numbers += [allocator.allocate() for _ in range(9)]
+        self.assertEqual(len(set(numbers)), 35)
+        self.assertEqual(models.NumberSequence.objects.get(name='test').value, 35)
+
+    def test_rolled_back_lease_is_dropped(self) -> None:
+        allocator = numbering.BlockAllocator('test', numbering.contract_number, block_size=10)
+        try:
+            with transaction.atomic():
+                allocator.allocate()
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertFalse(models.NumberSequence.objects.filter(name='test').exists())
+        allocator.allocate()
+        self.assertEqual(models.NumberSequence.objects.get(name='test').value, 10)
+
+    def test_contract_is_found_by_its_number(self) -> None:
+        contract = models.Contract.objects.create(product=self.product, insured=self.person, payment=1000)
+        self.assertTrue(numbering.is_valid(contract.contract_number))
+        self.assertEqual(models.Contract.get_object_by_contract_number(contract.contract_number), contract)
+        legacy = 10_000_001 + contract.pk * 127 ** 2
+        models.Contract.objects.filter(pk=contract.pk).update(contract_number=legacy)
+        self.assertEqual(models.Contract.get_object_by_contract_number(legacy), contract)
+        path = reverse('contract-detail', kwargs={'contract_number': legacy})
+        self.assertEqual(resolve(path).kwargs, {'contract_number': legacy})
+        with self.assertNumQueries(0):
+            with self.assertRaises(models.Contract.DoesNotExist):
+                models.Contract.get_object_by_contract_number(legacy + 1)
+            with self.assertRaises(Resolver404):
+                resolve(path.replace(str(legacy), str(legacy + 1)))
+
+
+class CachedUserTest(TestCase):
+    """
+    Tests of the authenticated user loaded from the cache of the header fields
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.person = models.Person.objects.create_user(
+            email='klient@test.cz', password='heslo-123', first_name='Petr', last_name='Dvořák',
+            date_of_birth=datetime.date(1990, 1, 1)
+        )
+
+    def setUp(self) -> None:
+        self.client.force_login(self.person)
+
+    def _user(self):
+        request = HttpRequest()
+        request.session = self.client.session
+        return authentication.get_user(request)
+
+    def test_header_is_answered_without_query(self) -> None:
+        self.assertIsInstance(self._user(), models.Person)
+        user = self._user()
+        with self.assertNumQueries(0):
+            self.assertIsInstance(user, models.Person)
+            self.assertEqual(
+                (user.pk, str(user), user.is_authenticated, user.is_staff), (self.person.pk, 'Dvořák Petr', True, False)
+            )
+            self.assertEqual(
+                engines['django'].from_string('{{ user }} {{ user.is_staff }}').render({'user': user}),
+                'Dvořák Petr False'
+            )
+        with self.assertNumQueries(1):
+            self.assertEqual(user.date_of_birth, datetime.date(1990, 1, 1))
+
+    def test_save_and_password_change_invalidate_the_user(self) -> None:
+        self._user()
+        self.person.is_staff = True
+        self.person.save()
+        self.assertTrue(self._user().is_staff)
+        self.person.set_password('nove-heslo-456')
+        self.person.save()
+        self.assertFalse(self._user().is_authenticated)
+
+    def test_deleted_user_is_anonymous(self) -> None:
+        self._user()
+        self.person.delete()
+        self.assertFalse(self._user().is_authenticated)
+
+
+class WarmupTest(TestCase):
+    """
+    Tests of the warm-up of a worker process
+    """
+    def test_referenced_templates(self) -> None:
+        template = engines['django'].from_string(
+            "{% extends 'main.html' %}{% block content %}{% include 'header.html' %}{% include name %}{% endblock %}"
+        )
+        self.assertEqual(set(warmup.referenced_templates(template.template)), {'main.html', 'header.html'})
+
+    def test_run_compiles_templates_and_urls(self) -> None:
+        steps = {step.name: step for step in warmup.run()}
+        self.assertEqual(set(steps), {'templates', 'urls', 'modules'})
+        self.assertGreater(steps['urls'].count, 0)
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertLessEqual({'main.html', 'header.html'}, set(loader.get_template_cache))
+        with override_settings(WARMUP={'ENABLED': False}):
+            self.assertEqual(warmup.run(), [])
+
+    def test_parse_importtime(self) -> None:
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       250 |        250 |   django.utils\n"
+            "import time:      1500 |       1750 | django\n"
+        )
+        self.assertEqual(parse_importtime(output), {'django.utils': (0.25, 0.25), 'django': (1.5, 1.75)})
+
+
+class SearchTest(TestCase):
+    """
+    Tests of the diacritics-insensitive full-text search of the clients
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.person = models.Person.objects.create_user(
+            email='nova@test.cz', first_name='Šárka', last_name='Nováčková', date_of_birth=datetime.date(1990, 1, 1),
+            city='Plzeň'
+        )
+        models.Person.objects.create_user(
+            email='jiny@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+
+    def _found(self, query: str) -> list:
+        return list(search.search(models.Person.objects.order_by('pk'), query))
+
+    def test_fold(self) -> None:
+        self.assertEqual(search.fold('Nováčková Šárka'), 'novackova sarka')
+        self.assertEqual(search.tokens(' Žluťoučký, KŮŇ '), ['zlutoucky', 'kun'])
+
+    def test_search_ignores_diacritics_and_case(self) -> None:
+        self.assertEqual(self._found('novac'), [self.person])
+        self.assertEqual(self._found('NOVÁČ šár'), [self.person])
+        self.assertEqual(self._found('plzen'), [self.person])
+        self.assertEqual(self._found('novac petr'), [])
+        self.assertEqual(self._found('!?'), [])
+
+    def test_index_is_matched_once(self) -> None:
+        models.Person.objects.create_user(
+            email='novak@test.cz', first_name='Jan', last_name='Novák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            found = self._found('nova')
+        self.assertEqual(len(found), 2)
+        self.assertEqual(queries[0]['sql'].count('MATCH'), 1)
+        self.assertEqual(sorted(found, key=lambda person: person.search_rank), found)
+
+    def test_index_follows_save_and_delete(self) -> None:
+        self.person.last_name = 'Svobodová'
+        self.person.save()
+        self.assertEqual(self._found('novac'), [])
+        self.assertEqual(self._found('svobod'), [self.person])
+        self.person.delete()
+        self.assertEqual(self._found('svobod'), [])
+
+    def test_save_of_not_indexed_fields_does_not_reindex(self) -> None:
+        with mock.patch.object(search, 'index') as index:
+            self.person.save(update_fields=['last_login'])
+        index.assert_not_called()
+        self.person.first_name = 'Jana'
+        self.person.save(update_fields=['first_name'])
+        self.assertEqual(self._found('jana'), [self.person])
+        self.assertEqual(models.Person.objects.get(pk=self.person.pk).search_name, 'novackova jana')
+
+
+class PortfolioImportTest(TestCase):
+    """
+    Tests of the resumable import of the client portfolios
+    """
+    HEADER: str = "email,first_name,last_name,date_of_birth,phone,city,product,payment,conclusion_date\n"
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.product = models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+
+    def _file(self, *lines: str) -> str:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'portfolio.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(self.HEADER + ''.join(f"{line}\n" for line in lines))
+        return path
+
+    def test_clients_and_contracts_are_imported(self) -> None:
+        path = self._file(
+            "nova@test.cz,Šárka,Nováková,1.2.1990,,Plzeň,Produkt,1200,2020-05-01",
+            "nova@test.cz,Šárka,Nováková,1990-02-01,,Plzeň,Produkt,800,",
+            "dvorak@test.cz,Petr,Dvořák,1985-03-04,,Brno,,,",
+        )
+        call_command('import_portfolio', path, stdout=io.StringIO())
+        person = models.Person.objects.get(email='nova@test.cz')
+        self.assertEqual(person.slug, f'{person.pk}-novakova-sarka')
+        self.assertFalse(person.has_usable_password())
+        self.assertEqual(
+            sorted(person.contract_set.values_list('payment', 'conclusion_date')),
+            [(800, datetime.date.today()), (1200, datetime.date(2020, 5, 1))]
+        )
+        self.assertFalse(models.Contract.objects.filter(insured__email='dvorak@test.cz').exists())
+        self.assertEqual(list(search.search(models.Person.objects.all(), 'novak')), [person])
+
+    def test_invalid_records_are_reported_and_skipped(self) -> None:
+        path = self._file(
+            "spatny-email,Petr,Dvořák,1985-03-04,,,,,",
+            "dvorak@test.cz,Petr,Dvořák,4.13.1985,,,,,",
+            "novak@test.cz,Jan,Novák,1985-03-04,,,Neznámý,100,",
+            "svoboda@test.cz,Jan,Svoboda,1985-03-04,,,,,",
+        )
+        stderr = io.StringIO()
+        call_command('import_portfolio', path, stdout=io.StringIO(), stderr=stderr)
+        self.assertEqual(list(models.Person.objects.values_list('email', flat=True)), ['svoboda@test.cz'])
+        errors = stderr.getvalue().splitlines()
+        self.assertEqual([error.split(':')[0] for error in errors], ['Record 1', 'Record 2', 'Record 3'])
+        self.assertIn("Invalid date '4.13.1985'", errors[1])
+        self.assertIn("Unknown product 'Neznámý'", errors[2])
+
+    def test_interrupted_import_is_resumed(self) -> None:
+        path = self._file(*(f"klient{i}@test.cz,Petr,Dvořák,1985-03-04,,,Produkt,100," for i in range(5)))
+        with mock.patch.object(
+            portfolio.PortfolioImporter, '_create_contracts', autospec=True,
+            side_effect=[None, OperationalError('interrupted')]
+        ):
+            with self.assertRaises(OperationalError):
+                call_command('import_portfolio', path, chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(models.Person.objects.count(), 2)  # the second chunk was rolled back
+        stdout = io.StringIO()
+        call_command('import_portfolio', path, chunk_size=2, stdout=stdout)
+        self.assertIn('Resuming after record 2', stdout.getvalue())
+        self.assertEqual(models.Person.objects.count(), 5)
+        self.assertEqual(models.Contract.objects.count(), 3)  # the contracts of the first chunk were mocked away
+        call_command('import_portfolio', path, stdout=io.StringIO())
+        self.assertEqual(models.Person.objects.count(), 5)
+
+    def test_primary_keys_are_assigned_by_the_database(self) -> None:
+        deleted = models.Person.objects.create_user(
+            email='smazany@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        deleted_pk = deleted.pk
+        deleted.delete()
+        with transaction.atomic():
+            persons = models.Person.objects.bulk_insert([
+                models.Person(
+                    email=f'klient{i}@test.cz', first_name='Petr', last_name='Dvořák',
+                    date_of_birth=datetime.date(1990, 1, 1)
+                ) for i in range(3)
+            ])
+        self.assertTrue(all(person.pk > deleted_pk for person in persons))
+        self.assertEqual(
+            list(models.Person.objects.order_by('pk').values_list('slug', flat=True)),
+            [f'{person.pk}-dvorak-petr' for person in persons]
+        )
+
+    def test_constraint_violation_is_not_retried(self) -> None:
+        models.Person.objects.create_user(
+            email='Klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        importer = portfolio.PortfolioImporter('test')
+        with mock.patch.object(models.PersonManager, 'bulk_insert', side_effect=IntegrityError) as bulk_insert:
+            with self.assertRaises(IntegrityError):
+                importer.import_chunk([(1, {
+                    'email': 'klient@test.cz', 'first_name': 'Petr', 'last_name': 'Dvořák',
+                    'date_of_birth': '1990-01-01'
+                })])
+        self.assertEqual(bulk_insert.call_count, 1)
+        self.assertEqual(importer.position, 0)
+
+
+class BulkUserProvisioningTest(TestCase):
+    """
+    Tests of the provisioning of many users with the passwords hashed in parallel
+    """
+    def _users(self, count: int, password: str | None = 'heslo-123') -> list:
+        return [
+            {
+                'email': f'Klient{i}@TEST.cz', 'password': password, 'first_name': 'Petr', 'last_name': 'Dvořák',
+                'date_of_birth': datetime.date(1990, 1, 1)
+            }
+            for i in range(count)
+        ]
+
+    def test_pool_hashes_in_the_order_of_the_passwords(self) -> None:
+        with hashing.PasswordHasherPool(2) as pool:
+            self.assertIsNotNone(pool.executor)
+            hashes = list(pool.map(['prvni', None, 'druhe']))
+        self.assertTrue(check_password('prvni', hashes[0]))
+        self.assertFalse(is_password_usable(hashes[1]))
+        self.assertTrue(check_password('druhe', hashes[2]))
+        self.assertNotEqual(hashing.unusable_password(), hashing.unusable_password())
+
+    def test_users_are_created_in_batches(self) -> None:
+        users = list(models.Person.objects.bulk_create_users(self._users(5), batch_size=2, processes=2))
+        self.assertEqual([user.email for user in users], [f'Klient{i}@test.cz' for i in range(5)])
+        self.assertEqual(len({user.pk for user in users}), 5)
+        person = models.Person.objects.get(pk=users[3].pk)
+        self.assertTrue(person.check_password('heslo-123'))
+        self.assertEqual((person.slug, person.is_staff), (f'{person.pk}-dvorak-petr', False))
+        with self.assertRaisesMessage(ValueError, 'E-mail musí být zadán.'):
+            list(models.Person.objects.bulk_create_users([{'first_name': 'Petr'}]))
+
+    def test_user_without_password_sets_it_on_first_login(self) -> None:
+        user, = models.Person.objects.bulk_create_users(self._users(1), usable_passwords=False)
+        self.assertFalse(user.has_usable_password())
+        url = user.get_set_password_url()
+        response = self.client.get(url, follow=True)  # the token is moved to the session
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            response.redirect_chain[-1][0], {'new_password1': 'Nove-heslo-456', 'new_password2': 'Nove-heslo-456'},
+            follow=True
+        )
+        self.assertRedirects(response, reverse('my-contracts'))
+        self.assertContains(response, 'Heslo bylo úspěšně nastaveno')
+        self.assertTrue(models.Person.objects.get(pk=user.pk).check_password('Nove-heslo-456'))
+        self.client.logout()
+        response = self.client.get(url, follow=True)  # the link can't be used again
+        self.assertFalse(response.context['validlink'])
+
+
+@override_settings(LOGIN_THROTTLE={
+    'CACHE': 'default', 'EMAIL_RATE': (3, 60), 'IP_RATE': (5, 60), 'BACKOFF_AFTER': 2, 'BACKOFF_BASE': 2,
+    'TRUSTED_PROXIES': ['10.0.0.0/8'],
+})
+class LoginThrottleTest(TestCase):
+    """
+    Tests of the throttling of the login attempts before the password hashing
+    """
+    NOW: float = 1_000_040.0  # 20 s into a window of 60 s
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.person = models.Person.objects.create_user(
+            email='klient@test.cz', password='heslo-123', first_name='Petr', last_name='Dvořák',
+            date_of_birth=datetime.date(1990, 1, 1)
+        )
+
+    def setUp(self) -> None:
+        caches['default'].clear()
+        self.throttle = throttling.LoginThrottle()
+        patcher = mock.patch.object(backends, 'throttle', self.throttle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = self.NOW
+        patcher = mock.patch.object(throttling, 'time')
+        patcher.start().time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def _login(self, password: str, email: str = 'klient@test.cz', ip: str = '192.0.2.1'):
+        return self.client.post(reverse('login'), {'username': email, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_window_of_the_email(self) -> None:
+        for _ in range(3):
+            self.assertIsNone(self.throttle.check('klient@test.cz', None).retry_after or None)
+        decision = self.throttle.check('KLIENT@test.cz ', None)
+        self.assertEqual(decision.retry_after, 40)
+        self.now += 39
+        self.assertEqual(self.throttle.check('klient@test.cz', None).retry_after, 1)  # blocked in the process
+        self.now += 1
+        self.assertEqual(self.throttle.check('klient@test.cz', None).retry_after, 0)
+        self.assertEqual(self.throttle.counters()['rejected_email'], 2)
+
+    def test_window_is_shared_by_the_processes(self) -> None:
+        other = throttling.LoginThrottle()
+        for i in range(5):
+            process = self.throttle if i % 2 else other
+            self.assertEqual(process.check(f'klient{i}@test.cz', '192.0.2.1').retry_after, 0)
+        self.assertEqual(self.throttle.check('klient9@test.cz', '192.0.2.1').retry_after, 40)
+        self.assertEqual(other.check('klient9@test.cz', '192.0.2.1').retry_after, 40)  # the block is shared
+        self.assertEqual(other.check('klient9@test.cz', '192.0.2.2').retry_after, 0)
+
+    def test_failures_start_the_backoff(self) -> None:
+        other = throttling.LoginThrottle()
+        decision = self.throttle.check('klient@test.cz', None)
+        # concurrent failures of two processes are both counted
+        self.throttle.failed('klient@test.cz', decision)
+        other.failed('klient@test.cz', decision)
+        self.now += 1
+        self.assertEqual(other.check('klient@test.cz', None), throttling.Decision(1, 2))
+        self.now += 1
+        decision = self.throttle.check('klient@test.cz', None)
+        self.assertEqual(decision, throttling.Decision(0, 2))
+        self.throttle.failed('klient@test.cz', decision)
+        self.assertEqual(other.check('klient@test.cz', None).retry_after, 4)
+        self.now += 4
+        decision = other.check('klient@test.cz', None)
+        other.succeeded('klient@test.cz', decision)
+        self.now += 60  # the window of the e-mail is used up
+        self.assertEqual(self.throttle.check('klient@test.cz', None), throttling.Decision(0, 0))
+
+    def test_rejected_attempt_is_not_hashed(self) -> None:
+        self.assertEqual(self._login('spatne').status_code, 200)
+        self.assertEqual(self._login('spatne').status_code, 200)
+        with mock.patch.object(models.Person, 'check_password') as check_password, \
+                mock.patch.object(models.Person, 'set_password') as set_password:
+            response = self._login('heslo-123')
+            self._login('heslo-123', email='neexistuje@test.cz')
+        check_password.assert_not_called()
+        set_password.assert_called_once()  # the unknown e-mail is not throttled
+        self.assertContains(response, 'Příliš mnoho pokusů o přihlášení. Zkuste to prosím znovu za 2 s.')
+        self.now += 2
+        self.assertRedirects(self._login('heslo-123'), reverse('my-contracts'), fetch_redirect_response=False)
+
+    def test_client_address_behind_trusted_proxy(self) -> None:
+        def address(remote: str, forwarded: str | None = None) -> str:
+            request = RequestFactory().get('/', REMOTE_ADDR=remote)
+            if forwarded is not None:
+                request.META['HTTP_X_FORWARDED_FOR'] = forwarded
+            return self.throttle.client_ip(request)
+
+        self.assertEqual(address('192.0.2.1', '198.51.100.7'), '192.0.2.1')  # not from a proxy
+        self.assertEqual(address('10.0.0.1', '198.51.100.7'), '198.51.100.7')
+        self.assertEqual(address('10.0.0.1', '203.0.113.9, 198.51.100.7, 10.0.0.2'), '198.51.100.7')
+        self.assertEqual(address('10.0.0.1'), '10.0.0.1')
+        with override_settings(LOGIN_THROTTLE={'TRUSTED_PROXIES': []}):
+            self.assertEqual(address('10.0.0.1', '198.51.100.7'), '10.0.0.1')
+
+
+class SharedCacheTest(TransactionTestCase):
+    """
+    Tests of the database cache shared by the processes, as configured for the login throttle
+    """
+    def setUp(self) -> None:
+        self.cache = caches[throttling.throttle.config['CACHE']]
+        self.cache.clear()
+
+    def _expires(self, key: str):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT expires FROM shared_cache WHERE cache_key = %s", [self.cache.make_key(key)])
+            return cursor.fetchone()[0]
+
+    def test_concurrent_increments_are_not_lost(self) -> None:
+        self.cache.set('counter', 0, 60)
+
+        def increment() -> None:
+            try:
+                for _ in range(20):
+                    caches[throttling.throttle.config['CACHE']].incr('counter')
+            finally:
+                connection.close()
+
+        def slow_get(cache, *args, **kwargs):
+            value = get(cache, *args, **kwargs)
+            time.sleep(0.001)  # widens the window between reading and writing a value
+            return value
+
+        get = DatabaseCache.get
+        threads = [threading.Thread(target=increment) for _ in range(5)]
+        with mock.patch.object(DatabaseCache, 'get', slow_get):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.cache.get('counter'), 100)
+
+    def test_increment_keeps_the_expiry(self) -> None:
+        self.cache.set('counter', 1, 60)
+        expires = self._expires('counter')
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self._expires('counter'), expires)
+        self.cache.set('counter', 1, -1)
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+
+
+class SessionStoreTest(TestCase):
+    """
+    Tests of the session engine with the in-process read-through cache
+    """
+    def setUp(self) -> None:
+        self.store_class = models.Session.get_session_store_class()
+        self.store_class._local.clear()
+        self.addCleanup(self.store_class._local.clear)
+        session = self.store_class()
+        session['key'] = 'value'
+        session.save()
+        self.session_key = session.session_key
+
+    def test_cached_session_is_read_without_query(self) -> None:
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store_class(self.session_key)['key'], 'value')
+        self.store_class._local.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store_class(self.session_key)['key'], 'value')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store_class(self.session_key)['key'], 'value')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store_class('neexistuje')._get_session(), {})
+
+    def test_unchanged_session_is_not_written(self) -> None:
+        session = self.store_class(self.session_key)
+        session['key'] = 'value'
+        with self.assertNumQueries(0):
+            session.save()
+        session['key'] = 'other'
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['SAVEPOINT', 'UPDATE', 'RELEASE'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store_class(self.session_key)['key'], 'other')
+
+    def test_change_of_another_process_is_seen_after_ttl(self) -> None:
+        models.Session.objects.filter(session_key=self.session_key).delete()  # e.g. logout in another process
+        self.assertEqual(self.store_class(self.session_key)['key'], 'value')
+        now = time.monotonic()
+        with mock.patch('insurance_app.session_store.time.monotonic', return_value=now + 5):
+            self.assertEqual(self.store_class(self.session_key)._get_session(), {})
+        self.assertNotIn(self.session_key, self.store_class._local)
+        # the deletion in this process is seen immediately
+        session = self.store_class()
+        session['key'] = 'value'
+        session.save()
+        session.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store_class(session.session_key)._get_session(), {})
+
+    def test_expired_sessions(self) -> None:
+        expired = timezone.now() - datetime.timedelta(seconds=1)
+        models.Session.objects.filter(session_key=self.session_key).update(expire_date=expired)
+        self.store_class._remember(
+            self.session_key, models.Session.objects.get(session_key=self.session_key).session_data, expired
+        )
+        self.assertEqual(self.store_class(self.session_key)._get_session(), {})
+        session = self.store_class()
+        session.save()
+        self.store_class.clear_expired()
+        self.assertEqual(list(models.Session.objects.values_list('session_key', flat=True)), [session.session_key])
+        self.assertEqual(list(self.store_class._local), [session.session_key])
+
+
+class PrerenderTest(TestCase):
+    """
+    Tests of the pre-rendered public pages
+    """
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(PRERENDER_ROOT=directory.name, PRERENDER_MAX_AGE=60)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.root = directory.name
+        prerender._snapshots.clear()
+
+    def test_product_change_regenerates_pages_on_commit(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            product = models.Product.objects.create(name='Úrazové pojištění', image='images/962830.jpg')
+            self.assertFalse(os.path.exists(os.path.join(self.root, 'home.html')))
+        self.assertEqual(len(callbacks), 1)
+        with open(os.path.join(self.root, 'home.html'), encoding='utf-8') as file:
+            self.assertIn('Úrazové pojištění', file.read())
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'about.html.gz')))
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        with open(os.path.join(self.root, 'home.html'), encoding='utf-8') as file:
+            self.assertNotIn('Úrazové pojištění', file.read())
+
+    def test_snapshot_is_served_to_anonymous_visitors_only(self) -> None:
+        prerender.store('about', b'snapshot')
+        response = self.client.get(reverse('about'))
+        self.assertEqual(response.content, b'snapshot')
+        etag = response.headers['ETag']
+        self.assertEqual(self.client.get(reverse('about'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(reverse('about'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual((response.headers['Content-Encoding'], response.headers['ETag']), ('gzip', f'{etag[:-1]}-gz"'))
+        self.assertNotEqual(self.client.get(reverse('about'), {'q': 1}).content, b'snapshot')
+        person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        self.client.force_login(person)
+        self.assertNotEqual(self.client.get(reverse('about')).content, b'snapshot')
+        self.assertEqual(prerender._load('about')[1], b'snapshot')  # the page of the user is not stored
+
+    def test_stale_snapshot_is_rendered_live(self) -> None:
+        prerender.store('about', b'snapshot')
+        path = os.path.join(self.root, 'about.html')
+        self.assertEqual(self.client.get(reverse('about')).content, b'snapshot')
+        os.utime(path, (time.time() - 61, time.time() - 61))
+        response = self.client.get(reverse('about'))
+        self.assertNotEqual(response.content, b'snapshot')
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), response.content)  # the live page is the new snapshot
+        prerender.store('about', b'snapshot')
+        with mock.patch.object(prerender, '_templates_mtime', time.time() + 60):  # templates deployed later
+            self.assertNotEqual(self.client.get(reverse('about')).content, b'snapshot')
+
+
+class ImageVariantsTest(TestCase):
+    """
+    Tests of the responsive derivatives of the product images
+    """
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(MEDIA_ROOT=directory.name, PRERENDER_ROOT=os.path.join(directory.name, 'pages'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.product = models.Product.objects.create(name='Produkt', image=self._upload('produkt.png', 800, 400))
+
+    @staticmethod
+    def _upload(name: str, width: int, height: int) -> str:
+        buffer = io.BytesIO()
+        Image.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, format='PNG')
+        return default_storage.save(f'images/{name}', ContentFile(buffer.getvalue()))
+
+    def test_variants_are_generated(self) -> None:
+        images.process(self.product.pk)
+        self.product.refresh_from_db()
+        variants = self.product.image_variants
+        self.assertEqual(
+            (variants['source'], variants['width'], variants['height']), (self.product.image.name, 800, 400)
+        )
+        self.assertEqual(
+            [(variant['format'], variant['width']) for variant in variants['variants']],
+            [(extension, width) for extension in ('webp', 'jpg') for width in (320, 480, 640, 800)]
+        )
+        for variant in variants['variants']:
+            self.assertRegex(variant['name'], rf"^images/variants/produkt-{variant['width']}w\.[0-9a-f]{{12}}\.")
+            with default_storage.open(variant['name']) as file, Image.open(file) as image:
+                self.assertEqual(image.format, images.FORMATS[variant['format']]['format'])
+                self.assertEqual(image.size, (variant['width'], variant['width'] // 2))
+        # a replaced image gets its own derivatives and the previous ones are deleted
+        self.product.image = self._upload('mensi.png', 400, 300)
+        self.product.save()
+        images.process(self.product.pk)
+        self.product.refresh_from_db()
+        self.assertEqual(
+            [variant['width'] for variant in self.product.image_variants['variants']], [320, 400, 320, 400]
+        )
+        self.assertFalse(any(default_storage.exists(variant['name']) for variant in variants['variants']))
+
+    def test_tag_offers_the_variants_of_the_current_image(self) -> None:
+        template = engines['django'].from_string(
+            '{% load responsive_images %}{% responsive_image product sizes="50vw" class="img-fluid" %}'
+        )
+        html = template.render({'product': self.product})
+        self.assertHTMLEqual(
+            html, f'<img src="{self.product.image.url}" alt="Produkt" loading="lazy" class="img-fluid">'
+        )
+        images.process(self.product.pk)
+        self.product.refresh_from_db()
+        html = template.render({'product': self.product})
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn('sizes="50vw" width="800" height="400" alt="Produkt"', html)
+        variants = self.product.image_variants['variants']
+        self.assertIn(f"{default_storage.url(variants[0]['name'])} 320w, ", html)
+        self.assertIn(f"{default_storage.url(variants[-1]['name'])} 800w\"", html)
+
+    def test_command_processes_missing_variants(self) -> None:
+        other = models.Product.objects.create(name='Jiný produkt', image=self._upload('jiny.png', 300, 300))
+        images.process(self.product.pk)
+        self.product.refresh_from_db()
+        with mock.patch.object(images, 'process', wraps=images.process) as process:
+            stdout = io.StringIO()
+            call_command('generate_image_variants', missing=True, stdout=stdout)
+        process.assert_called_once_with(other.pk)
+        self.assertIn('Jiný produkt: derivatives created', stdout.getvalue())
+        self.assertIn('Home page images at 640 px', stdout.getvalue())
+        other.refresh_from_db()
+        self.assertEqual(other.image_variants['source'], other.image.name)
+
+
+class AssetPipelineTest(TestCase):
+    """
+    Tests of the storage and the serving of the collected static assets
+    """
+    CSS: bytes = b"body { color: #333; }\n" * 50
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.storage = assets.AssetStorage(location=self.root, base_url='/static/')
+
+    def _middleware(self, hashed_names: set) -> assets.AssetMiddleware:
+        with override_settings(STATIC_ROOT=self.root, STATIC_URL='static/'):
+            middleware = assets.AssetMiddleware(lambda request: HttpResponse('page'))
+        middleware.hashed_names = hashed_names
+        return middleware
+
+    def test_compressible_files_get_gzip_siblings(self) -> None:
+        self.storage.save('css/style.1a2b3c4d5e6f.css', ContentFile(self.CSS))
+        self.storage.save('js/tiny.js', ContentFile(b'x'))
+        self.storage.compress('css/style.1a2b3c4d5e6f.css')
+        self.storage.compress('js/tiny.js')
+        with self.storage.open('css/style.1a2b3c4d5e6f.css.gz') as file:
+            self.assertEqual(gzip.decompress(file.read()), self.CSS)
+        self.assertFalse(self.storage.exists('js/tiny.js.gz'))  # the compressed file would be larger
+        self.assertEqual(self.storage.stored_name('css/style.css'), 'css/style.css')  # not collected yet
+
+    def test_middleware_negotiates_gzip(self) -> None:
+        self.storage.save('css/style.1a2b3c4d5e6f.css', ContentFile(self.CSS))
+        self.storage.compress('css/style.1a2b3c4d5e6f.css')
+        middleware = self._middleware({'css/style.1a2b3c4d5e6f.css'})
+        factory = RequestFactory()
+        response = middleware(factory.get('/static/css/style.1a2b3c4d5e6f.css', HTTP_ACCEPT_ENCODING='gzip, br'))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.CSS)
+        self.assertEqual(response.headers['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        response = middleware(factory.get('/static/css/style.1a2b3c4d5e6f.css'))
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(b''.join(response.streaming_content), self.CSS)
+        response = middleware(factory.get('/static/css/style.1a2b3c4d5e6f.css', HTTP_IF_MODIFIED_SINCE=(
+            response.headers['Last-Modified']
+        )))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(middleware(factory.get('/static/../secret.txt')).content, b'page')
+        self.assertEqual(middleware(factory.get('/static/css/missing.css')).content, b'page')
+
+    def test_prune_keeps_the_previous_build(self) -> None:
+        for name in ('css/style.111111111111.css', 'css/style.222222222222.css', 'css/style.333333333333.css',
+                     'css/style.css', 'staticfiles.json'):
+            self.storage.save(name, ContentFile(self.CSS))
+        self.storage.compress('css/style.111111111111.css')
+        deleted = assets.prune(self.storage, {'css/style.222222222222.css', 'css/style.333333333333.css'})
+        self.assertEqual(sorted(deleted), ['css/style.111111111111.css', 'css/style.111111111111.css.gz'])
+        self.assertEqual(
+            sorted(self.storage.listdir('css')[1]),
+            ['style.222222222222.css', 'style.333333333333.css', 'style.css']
+        )
+
+
+class MediaServingTest(TestCase):
+    """
+    Tests of the serving of the media files with conditional and range requests
+    """
+    CONTENT: bytes = bytes(range(256)) * 4
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(MEDIA_ROOT=os.path.join(directory.name, 'media'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        os.makedirs(os.path.join(directory.name, 'media', 'images'))
+        with open(os.path.join(directory.name, 'media', 'images', 'obrazek.jpg'), 'wb') as file:
+            file.write(self.CONTENT)
+        open(os.path.join(directory.name, 'media', 'images', 'prazdny.jpg'), 'wb').close()
+        with open(os.path.join(directory.name, 'tajne.txt'), 'wb') as file:
+            file.write(b'secret')
+        self.url = reverse('media', kwargs={'path': 'images/obrazek.jpg'})
+
+    def _content(self, response: HttpResponse) -> bytes:
+        return b''.join(response.streaming_content)
+
+    def test_whole_file_and_conditional_requests(self) -> None:
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        self.assertEqual(self._content(response), self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"jiny"').status_code, 200)
+
+    def test_ranges(self) -> None:
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 10-19/1024'))
+        self.assertEqual(self._content(response), self.CONTENT[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-24')
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 1000-1023/1024', '24'))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(self._content(response), self.CONTENT[1000:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-6')  # multiple ranges get the whole file
+        self.assertEqual(response.status_code, 200)
+        empty = reverse('media', kwargs={'path': 'images/prazdny.jpg'})
+        for header in ('bytes=-5', 'bytes=0-'):
+            response = self.client.get(empty, HTTP_RANGE=header)
+            self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */0'))
+
+    def test_if_range(self) -> None:
+        tag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=tag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"zmeneny"')
+        self.assertEqual((response.status_code, self._content(response)), (200, self.CONTENT))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='Thu, 01 Jan 1970 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_traversal_and_access_rules(self) -> None:
+        request = RequestFactory().get('/')
+        for path in ('../tajne.txt', 'images/../../tajne.txt', '/../tajne.txt'):
+            with self.assertRaises(Http404):
+                media.serve(request, path)
+        rules = dict(media._rules)
+        self.addCleanup(setattr, media, '_rules', rules)
+        media.access_rule('images/')(lambda request, path: request.user.is_staff)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('media', kwargs={'path': 'images/chybi.jpg'})).status_code, 403)
+
+    def test_offload_headers(self) -> None:
+        with override_settings(MEDIA_OFFLOAD='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.client.get(reverse('media', kwargs={'path': 'images/obrazek.jpg'}))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/images/obrazek.jpg')
+        self.assertEqual((response.content, response['Content-Type']), (b'', 'image/jpeg'))
+        self.assertIn('ETag', response)
+        with override_settings(MEDIA_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Sendfile'], os.path.join(os.path.realpath(settings.MEDIA_ROOT), 'images', 'obrazek.jpg')
+        )
+
+
+class ReportingTest(TestCase):
+    """
+    Tests of the reporting summaries maintained by the saves and deletions of the contracts and insured events
+    """
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.person = models.Person.objects.create_user(
+            email='klient@test.cz', first_name='Petr', last_name='Dvořák', date_of_birth=datetime.date(1990, 1, 1)
+        )
+        cls.product = models.Product.objects.create(name='Produkt', image='images/962830.jpg')
+        cls.contract = models.Contract.objects.create(product=cls.product, insured=cls.person, payment=1000)
+        cls.event = models.InsuredEvent.objects.create(
+            contract=cls.contract, event_date=datetime.date(2023, 1, 15), description='Popis'
+        )
+
+    @staticmethod
+    def _summaries() -> list:
+        return list(models.ProductMonthSummary.objects.order_by('product', 'month').values_list(
+            'product', 'month', 'approved_count', 'approved_payout', 'rejected_count', 'contracts_count', 'premium'
+        ))
+
+    def assertSummariesRebuilt(self) -> None:
+        # the incremental updates leave the rows whose contributions were all subtracted, the rebuild drops them
+        summaries = [row for row in self._summaries() if any(row[2:])]
+        reporting.rebuild()
+        self.assertEqual(summaries, self._summaries())
+
+    def _approve(self, event: models.InsuredEvent, payout: int) -> None:
+        event.processed = event.approved = True
+        event.payout = payout
+        event.save()
+
+    def test_saves_and_deletions_keep_the_summaries(self) -> None:
+        self._approve(self.event, 5000)
+        self.assertSummariesRebuilt()
+        event = models.InsuredEvent.objects.get(pk=self.event.pk)
+        event.approved = False
+        event.event_date = datetime.date(2023, 2, 1)  # moved to another month
+        event.save()
+        self.assertSummariesRebuilt()
+        contract = models.Contract.objects.create(product=self.product, insured=self.person, payment=500)
+        contract.payment = 700
+        contract.save()
+        self.assertSummariesRebuilt()
+        event.delete()
+        self.assertSummariesRebuilt()
+        self.contract.delete()
+        self.assertSummariesRebuilt()
+        self.assertEqual(self._summaries()[-1][-2:], (1, 700))
+
+    def test_event_moved_to_another_product(self) -> None:
+        self._approve(self.event, 5000)
+        other = models.Contract.objects.create(
+            product=models.Product.objects.create(name='Jiný produkt', image='images/962830.jpg'),
+            insured=self.person, payment=1000
+        )
+        event = models.InsuredEvent.objects.get(pk=self.event.pk)
+        event.contract_id = other.pk
+        event.save()
+        summary = models.ProductMonthSummary.objects.get(product=self.product, month=datetime.date(2023, 1, 1))
+        self.assertEqual((summary.approved_count, summary.approved_payout), (0, 0))
+        self.assertSummariesRebuilt()
+
+    def test_save_does_not_load_the_contract(self) -> None:
+        self._approve(self.event, 5000)
+        event = models.InsuredEvent.objects.get(pk=self.event.pk)
+        event.payout = 6000
+        with CaptureQueriesContext(connection) as queries:
+            event.save()
+        self.assertNotIn('FROM "insurance_app_contract" WHERE', ' '.join(query['sql'] for query in queries))
+        self.assertSummariesRebuilt()
+
+    def test_concurrent_saves_of_the_same_event_are_counted_once(self) -> None:
+        first = models.InsuredEvent.objects.get(pk=self.event.pk)
+        second = models.InsuredEvent.objects.get(pk=self.event.pk)  # loaded before the first one is saved
+        self._approve(first, 5000)
+        self._approve(second, 6000)
+        self.assertSummariesRebuilt()
+        summary = models.ProductMonthSummary.objects.get(product=self.product, month=datetime.date(2023, 1, 1))
+        self.assertEqual((summary.approved_count, summary.approved_payout), (1, 6000))
+        # the bulk processing changed the event after it was loaded
+        stale = models.InsuredEvent.objects.get(pk=self.event.pk)
+        claims = models.InsuredEvent.objects.filter(pk=self.event.pk)
+        reporting.apply(reporting.events_deltas(claims, -1))
+        claims.update(approved=False, payout=None)
+        reporting.apply(reporting.events_deltas(claims))
+        stale.delete()
+        self.assertSummariesRebuilt()
+        self.assertEqual([row[2:5] for row in self._summaries()], [(0, 0, 0)])  # the contract only
+
+    def test_rebuild_summaries_command(self) -> None:
+        self._approve(self.event, 5000)
+        expected = self._summaries()
+        models.ProductMonthSummary.objects.update(approved_count=F('approved_count') + 10, premium=0)
+        models.ProductMonthSummary.objects.create(product=self.product, month=datetime.date(2000, 1, 1))
+        stdout = io.StringIO()
+        call_command('rebuild_summaries', stdout=stdout)
+        self.assertEqual(self._summaries(), expected)
+        self.assertIn(f'{len(expected)} summary rows rebuilt', stdout.getvalue())
@@ -0,0 +1,292 @@
+"""
+Module containing the login throttling which protects the password hashing in EmailBackend against credential
+stuffing. Attempts are limited by counters of fixed time windows per e-mail and per client IP address and repeated
+failures of one e-mail are punished by an exponential backoff. Rejected attempts never reach the password hasher.
+
+The counters, blocks and failure counts are shared by all processes through the cache configured in
+settings.LOGIN_THROTTLE['CACHE'] and incremented by cache.add() and cache.incr(), which are atomic in Memcached, Redis
+and insurance_app.cache.DatabaseCache, but not in Django's DatabaseCache. Blocks are also remembered in the memory of
+the process, so a blocked client doesn't reach the shared cache. When the cache is not available, the attempts are
+limited by token buckets in the memory of the process.
+
+Behind a front proxy every request comes from the address of the proxy, so the client address is taken from the
+X-Forwarded-For header added by the proxies listed in settings.LOGIN_THROTTLE['TRUSTED_PROXIES'].
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+from .utils import LRUDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: dict = {
+    'CACHE': 'default',
+    'EMAIL_RATE': (5, 60),  # (attempts, seconds) allowed for one e-mail
+    'IP_RATE': (20, 60),  # (attempts, seconds) allowed for one IP address
+    'BACKOFF_AFTER': 3,  # failed attempts of one e-mail before the backoff starts
+    'BACKOFF_BASE': 2,  # seconds of the first backoff, doubled with each further failure
+    'BACKOFF_MAX': 15 * 60,
+    'COUNTERS_FLUSH': 10,  # seconds between flushing the counters of the process into the shared cache
+    'LOCAL_KEYS': 10_000,  # maximal number of buckets and blocks kept in the process memory
+    'TRUSTED_PROXIES': (),  # addresses or networks of the front proxies whose X-Forwarded-For header is trusted
+}
+KEY_PREFIX: str = 'login-throttle'
+COUNTERS: tuple = ('attempts', 'allowed', 'rejected_email', 'rejected_ip', 'rejected_backoff', 'failures', 'successes')
+
+
+class Decision(NamedTuple):
+    """
+    Result of checking a login attempt
+    """
+    retry_after: float  # seconds until the next attempt is allowed, 0 if this attempt is allowed
+    failures: int  # failed attempts of the e-mail so far
+
+
+class LoginThrottle:
+    """
+    Throttle of the login attempts, one instance per process
+    """
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._buckets: LRUDict = LRUDict(DEFAULTS['LOCAL_KEYS'])  # key: (tokens, updated)
+        self._blocks: LRUDict = LRUDict(DEFAULTS['LOCAL_KEYS'])  # key: blocked until
+        self._counters: defaultdict = defaultdict(int)
+        self._flushed: float = time.time()
+
+    @property
+    def config(self) -> dict:
+        return {**DEFAULTS, **getattr(settings, 'LOGIN_THROTTLE', {})}
+
+    def client_ip(self, request: HttpRequest) -> str | None:
+        """
+        Return the address of the client. If the request comes from a trusted proxy, the address is the last one in the
+        X-Forwarded-For header which was not added by a trusted proxy; the addresses before it are supplied by the
+        client and can't be trusted.
+        :param HttpRequest request:
+        :return str: client IP address, None if unknown
+        """
+        address = request.META.get('REMOTE_ADDR')
+        proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in self.config['TRUSTED_PROXIES']]
+        if not address or not proxies:
+            return address
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        for hop in reversed([part for part in forwarded if part]):
+            try:
+                trusted = any(ipaddress.ip_address(address) in proxy for proxy in proxies)
+            except ValueError:
+                return address  # malformed address added behind the last trusted proxy
+            if not trusted:
+                return address
+            address = hop
+        return address
+
+    def check(self, email: str, ip: str | None) -> Decision:
+        """
+        Check whether the login attempt is allowed and count it in the e-mail and the IP address windows
+        :param str email:
+        :param str ip: client IP address, None if unknown
+        :return Decision:
+        """
+        config = self.config
+        now = time.time()
+        values = {'email': email}
+        if ip:
+            values['ip'] = ip
+        keys = {kind: self._key('block', kind, value) for kind, value in values.items()}
+        keys['backoff'] = self._key('backoff', email)
+        self._count('attempts')
+        with self._lock:
+            local = {kind: self._blocks.get(key, 0) for kind, key in keys.items()}
+        for kind, blocked_until in local.items():
+            if blocked_until > now:
+                # known in this process, the shared cache is not touched at all
+                self._count(f'rejected_{kind}')
+                return Decision(blocked_until - now, 0)
+        failures_key = self._key('fail', email)
+        shared = self._get_shared([*keys.values(), failures_key])
+        failures = shared.get(failures_key, 0)
+        for kind, key in keys.items():
+            until = shared.get(key, 0)
+            if until > now:
+                with self._lock:
+                    self._blocks[key] = until
+                self._count(f'rejected_{kind}')
+                return Decision(until - now, failures)
+        for kind, value in values.items():
+            retry_after = self._consume(self._key('count', kind, value), *config[f'{kind.upper()}_RATE'], now)
+            if retry_after:
+                with self._lock:
+                    self._blocks[keys[kind]] = now + retry_after
+                self._set_shared(keys[kind], now + retry_after, retry_after)
+                self._count(f'rejected_{kind}')
+                return Decision(retry_after, failures)
+        self._count('allowed')
+        return Decision(0, failures)
+
+    def failed(self, email: str, decision: Decision) -> None:
+        """
+        Record a failed login attempt of an e-mail and start the backoff if there were too many of them
+        :param str email:
+        :param Decision decision: result of checking the attempt
+        :return None:
+        """
+        config = self.config
+        now = time.time()
+        failures = self._incr_shared(self._key('fail', email), config['BACKOFF_MAX'] * 2)
+        if failures is None:
+            failures = decision.failures + 1  # the cache is not available
+        if failures >= config['BACKOFF_AFTER']:
+            delay = min(config['BACKOFF_MAX'], config['BACKOFF_BASE'] * 2 ** (failures - config['BACKOFF_AFTER']))
+            self._set_shared(self._key('backoff', email), now + delay, delay)
+        self._count('failures')
+
+    def succeeded(self, email: str, decision: Decision) -> None:
+        """
+        Record a successful login, which resets the failures of the e-mail
+        :param str email:
+        :param Decision decision: result of checking the attempt
+        :return None:
+        """
+        if decision.failures:
+            try:
+                caches[self.config['CACHE']].delete_many([self._key('fail', email), self._key('backoff', email)])
+            except Exception:
+                logger.exception("Login throttle cache is not available")
+        self._count('successes')
+
+    def counters(self) -> dict[str, int]:
+        """
+        Return the counters of all processes for monitoring, including the not yet flushed counters of this process
+        :return dict:
+        """
+        self._flush_counters(force=True)
+        try:
+            shared = caches[self.config['CACHE']].get_many([self._counter_key(name) for name in COUNTERS])
+        except Exception:
+            logger.exception("Login throttle cache is not available")
+            shared = {}
+        return {name: shared.get(self._counter_key(name), 0) for name in COUNTERS}
+
+    def _consume(self, key: str, capacity: int, period: float, now: float) -> float:
+        """
+        Count the attempt in the current window of the period. Return 0 if the window has room for it, otherwise the
+        seconds until the next window. A client can make up to twice the capacity across the boundary of two windows.
+        :param str key:
+        :param int capacity: attempts allowed in a window
+        :param float period: seconds of a window
+        :param float now:
+        :return float:
+        """
+        window = int(now // period)
+        count = self._incr_shared(f"{key}:{window}", period + 1)
+        if count is None:
+            return self._consume_local(key, capacity, period, now)
+        if count <= capacity:
+            return 0
+        return (window + 1) * period - now
+
+    def _consume_local(self, key: str, capacity: int, period: float, now: float) -> float:
+        """
+        Take a token from the bucket in the memory of the process. Return 0 if the bucket had a token, otherwise the
+        seconds until it refills one.
+        :param str key:
+        :param int capacity: size of the bucket
+        :param float period: seconds to refill the whole bucket
+        :param float now:
+        :return float:
+        """
+        rate = capacity / period
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+        self._flush_counters()
+
+    def _flush_counters(self, force: bool = False) -> None:
+        """
+        Add the counters of this process to the shared counters, at most once per the COUNTERS_FLUSH interval
+        :param bool force: flush regardless of the interval
+        :return None:
+        """
+        now = time.time()
+        if not force and now - self._flushed < self.config['COUNTERS_FLUSH']:
+            return
+        with self._lock:
+            counters, self._counters = self._counters, defaultdict(int)
+            self._flushed = now
+        for name, value in counters.items():
+            self._incr_shared(self._counter_key(name), None, value)
+
+    def _get_shared(self, keys) -> dict:
+        try:
+            return caches[self.config['CACHE']].get_many(list(keys))
+        except Exception:
+            # throttling must not make the login unavailable
+            logger.exception("Login throttle cache is not available")
+            return {}
+
+    def _incr_shared(self, key: str, timeout: float | None, delta: int = 1) -> int | None:
+        """
+        Atomically add the delta to a counter in the shared cache, a missing counter is created with the timeout
+        :param str key:
+        :param float timeout: seconds, None for a counter which doesn't expire
+        :param int delta:
+        :return int: new value of the counter, None if the cache is not available
+        """
+        timeout = math.ceil(timeout) if timeout is not None else None
+        try:
+            cache = caches[self.config['CACHE']]
+            if cache.add(key, delta, timeout=timeout):
+                return delta
+            try:
+                return cache.incr(key, delta)
+            except ValueError:
+                # the counter expired between add() and incr()
+                cache.add(key, delta, timeout=timeout)
+                return delta
+        except Exception:
+            logger.exception("Login throttle cache is not available")
+            return None
+
+    def _set_shared(self, key: str, value, timeout: float) -> None:
+        try:
+            caches[self.config['CACHE']].set(key, value, timeout=math.ceil(timeout))
+        except Exception:
+            logger.exception("Login throttle cache is not available")
+
+    @staticmethod
+    def _key(*parts: str) -> str:
+        """
+        Return a cache key for the value given as the last part. The value is supplied by the user, so it is hashed to
+        keep the key valid for every cache backend.
+        :param parts:
+        :return str:
+        """
+        *names, value = parts
+        digest = hashlib.sha256(str(value).strip().lower().encode()).hexdigest()[:32]
+        return f"{KEY_PREFIX}:{':'.join(names)}:{digest}"
+
+    @staticmethod
+    def _counter_key(name: str) -> str:
+        return f"{KEY_PREFIX}:counter:{name}"
+
+
+throttle = LoginThrottle()
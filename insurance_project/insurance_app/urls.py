@@ -9,5 +9,6 @@ urlpatterns = [
     path("", views.IndexView.as_view(), name="home"),
     path("register/", views.RegisterUserView.as_view(), name="register"),
     path("login/", views.LoginView.as_view(), name="login"),
-    path('about/', views.AboutView.as_view(), name='about')
+    path('about/', views.AboutView.as_view(), name='about'),
+    path('nastaveni-hesla/<uidb64>/<token>/', views.SetPasswordView.as_view(), name='set-password'),
 ]
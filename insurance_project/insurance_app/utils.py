@@ -0,0 +1,46 @@
+"""
+Module containing small helpers shared by the modules of this app
+"""
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+
+def chunks(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Split an iterable into lists of the given size, the last list may be shorter
+    :param Iterable items:
+    :param int size:
+    :return Iterator:
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class LRUDict(OrderedDict):
+    """
+    Dictionary forgetting the least recently used keys above the given size
+    """
+    def __init__(self, size: int) -> None:
+        super().__init__()
+        self.size: int = size
+
+    def __getitem__(self, key):
+        self.move_to_end(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.size:
+            self.popitem(last=False)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
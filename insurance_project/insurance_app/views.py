@@ -11,13 +11,14 @@ from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from django.views import generic
 
-from . import forms, models
+from . import forms, models, prerender
 from insurance_project import template_names as template
 
 
-class IndexView(generic.ListView):
+@prerender.register('home', 'home')
+class IndexView(prerender.PrerenderedMixin, generic.ListView):
     """
-    View for the index page
+    View for the index page, pre-rendered for anonymous visitors
     """
     model: models.Product = models.Product
     template_name: str = template.HOME
@@ -77,9 +78,10 @@ class RegisterUserView(generic.CreateView):
             return render(request, self.template_name, {"form": form, 'title': self.title})
 
 
-class AboutView(generic.TemplateView):
+@prerender.register('about', 'about')
+class AboutView(prerender.PrerenderedMixin, generic.TemplateView):
     """
-    View displaying a static 'About us' page
+    View displaying a static 'About us' page, pre-rendered for anonymous visitors
     """
     template_name = template.ABOUT
 
@@ -89,4 +91,25 @@ class LoginView(auth_views.LoginView):
     The default django login view is used, this class only sets a page where the client is redirected after login
     """
     template_name = template.FORM
+    form_class = forms.LoginForm
     next_page = "my-contracts"
+
+
+class SetPasswordView(auth_views.PasswordResetConfirmView):
+    """
+    View where a user provisioned without a password sets their password and is logged in
+    """
+    template_name: str = template.FORM
+    title: str = 'Nastavení hesla'
+    post_reset_login: bool = True
+    success_url = reverse_lazy('my-contracts')
+
+    def form_valid(self, form: Form) -> HttpResponse:
+        """
+        Adds a message about successfully setting the password
+        :param Form form:
+        :return HttpResponse:
+        """
+        response = super().form_valid(form)
+        messages.success(self.request, 'Heslo bylo úspěšně nastaveno')
+        return response
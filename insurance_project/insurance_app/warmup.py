@@ -0,0 +1,190 @@
+"""
+Module containing the warm-up of a worker process, run by insurance_project.wsgi and insurance_project.asgi when the
+application is loaded. Without it the first request of each page in a fresh worker compiles its templates, the first
+request at all populates the URL resolvers, reads the manifest of the static files and loads the translations, which
+shows up as latency spikes after every deploy or scale-up.
+
+The warm-up compiles the templates of insurance_project.template_names, the templates configured in
+settings.WARMUP['TEMPLATES'] and the form widgets into the cached template loaders, including their parents and their
+included templates, compiles the patterns of all URLs and reverses the named ones, and imports the lazily loaded
+modules and objects. It doesn't touch the database. The steps are measured, `python manage.py startup_profile`
+compares the boot with and without the warm-up.
+"""
+import importlib
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple
+
+import django.forms
+from django.conf import settings
+from django.contrib.auth import get_backends
+from django.contrib.auth.hashers import get_hashers
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.forms.renderers import get_default_renderer
+from django.template import Template, TemplateDoesNotExist, engines
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.urls import NoReverseMatch, URLPattern, URLResolver, get_resolver, reverse
+from django.utils import translation
+
+from insurance_project import template_names
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS: dict = {
+    'ENABLED': True,
+    # templates loaded by the views or the tags by a name not listed in insurance_project.template_names
+    'TEMPLATES': (
+        'registration/login.html',
+        '{pack}/uni_form.html',  # {pack} is settings.CRISPY_TEMPLATE_PACK, the templates of the crispy filter
+        '{pack}/field.html',
+        '{pack}/errors.html',
+    ),
+    'LANGUAGES': ('cs',),  # translations loaded besides settings.LANGUAGE_CODE
+    'MODULES': (),  # further modules imported at the boot
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'WARMUP', {})}
+
+
+class Step(NamedTuple):
+    """
+    Measured step of the warm-up
+    """
+    name: str
+    count: int  # templates, URLs or modules warmed up
+    duration: float  # milliseconds
+
+
+completed: list[Step] = []  # steps of the warm-up of this process
+
+
+def template_names_to_compile() -> list[str]:
+    """
+    Return the names of the templates compiled by the warm-up
+    :return list:
+    """
+    names = [value for name, value in vars(template_names).items() if name.isupper() and isinstance(value, str)]
+    pack = getattr(settings, 'CRISPY_TEMPLATE_PACK', 'bootstrap4')
+    names += [name.format(pack=pack) for name in config()['TEMPLATES']]
+    return list(dict.fromkeys(names))
+
+
+def referenced_templates(template: Template) -> Iterator[str]:
+    """
+    Return the names of the parent and the included templates given by a constant in the template
+    :param Template template: compiled template of the Django engine
+    :return Iterator[str]:
+    """
+    for node in template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode)):
+        expression = node.parent_name if isinstance(node, ExtendsNode) else node.template
+        if isinstance(getattr(expression, 'var', None), str) and not expression.filters:
+            yield expression.var
+
+
+def compile_templates(names: list[str], get_template: Callable[[str], Template]) -> int:
+    """
+    Compile the templates and the templates they reference into the cached loader
+    :param list names: names of the templates
+    :param Callable get_template: get_template() of the Django template engine
+    :return int: number of the compiled templates
+    """
+    pending, compiled = list(names), set()
+    while pending:
+        name = pending.pop()
+        if name in compiled:
+            continue
+        compiled.add(name)
+        try:
+            template = get_template(name)
+        except TemplateDoesNotExist:
+            logger.warning("Template '%s' of the warm-up doesn't exist", name)
+            continue
+        pending.extend(referenced_templates(template))
+    return len(compiled)
+
+
+def templates() -> int:
+    """
+    Compile the templates of the pages and of the form widgets
+    :return int: number of the compiled templates
+    """
+    count = 0
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is not None:
+            count += compile_templates(template_names_to_compile(), engine.get_template)
+    renderer = get_default_renderer()
+    root = Path(django.forms.__file__).parent / 'templates'
+    widgets = sorted(str(path.relative_to(root)) for path in (root / 'django' / 'forms').rglob('*.html'))
+    return count + compile_templates(widgets, lambda name: renderer.get_template(name).template)
+
+
+def urls() -> int:
+    """
+    Compile the patterns of all URLs, populate the reverse lookups and reverse the named URLs without parameters
+    :return int: number of the named URLs
+    """
+    resolver = get_resolver()
+
+    def walk(patterns: list, namespace: str) -> Iterator[str]:
+        for pattern in patterns:
+            pattern.pattern.regex  # compiled lazily by the first resolve()
+            if isinstance(pattern, URLResolver):
+                child = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+                yield from walk(pattern.url_patterns, child)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                yield namespace + pattern.name
+
+    names = list(walk(resolver.url_patterns, ''))
+    resolver.reverse_dict  # populates the lookups of all namespaces
+    for name in names:
+        try:
+            reverse(name)
+        except NoReverseMatch:
+            pass  # the URL has parameters
+    return len(names)
+
+
+def modules() -> int:
+    """
+    Import the modules and create the objects which Django loads on their first use
+    :return int: number of the imported modules
+    """
+    names = [settings.SESSION_ENGINE, settings.MESSAGE_STORAGE.rsplit('.', 1)[0], *config()['MODULES']]
+    for name in names:
+        importlib.import_module(name)
+    get_hashers()
+    get_backends()
+    for alias in settings.CACHES:
+        caches[alias]
+    staticfiles_storage.base_url  # reads the manifest of the static files
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+    for language in config()['LANGUAGES']:
+        with translation.override(language):
+            translation.gettext('')
+    return len(names)
+
+
+def run() -> list[Step]:
+    """
+    Warm up the process, unless disabled by settings.WARMUP['ENABLED']
+    :return list: the measured steps
+    """
+    if not config()['ENABLED']:
+        return []
+    steps = []
+    for name, step in (('templates', templates), ('urls', urls), ('modules', modules)):
+        start = time.perf_counter()
+        count = step()
+        steps.append(Step(name, count, (time.perf_counter() - start) * 1000))
+    completed.extend(steps)
+    logger.info(
+        "Worker warmed up in %.1f ms: %s", sum(step.duration for step in steps),
+        ', '.join(f"{step.count} {step.name} {step.duration:.1f} ms" for step in steps)
+    )
+    return steps
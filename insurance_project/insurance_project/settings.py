@@ -51,12 +51,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'insurance_app.profiling.ProfilingMiddleware',
+    'insurance_app.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'insurance_app.assets.AssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'insurance_app.authentication.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,7 +68,8 @@ ROOT_URLCONF = 'insurance_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'insurance_app.profiling.ProfiledTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,6 +87,29 @@ AUTHENTICATION_BACKENDS = [
     'insurance_app.backends.EmailBackend'
 ]
 
+# Login throttling, see insurance_app/throttling.py for all options. The counters are exact only in a cache with atomic
+# increments (Memcached, Redis, insurance_app.cache.DatabaseCache), Django's database cache loses concurrent increments.
+LOGIN_THROTTLE = {
+    'CACHE': 'shared',
+    'EMAIL_RATE': (5, 60),
+    'IP_RATE': (20, 60),
+    'TRUSTED_PROXIES': [],  # e.g. ['127.0.0.1'] behind the nginx serving the media (MEDIA_OFFLOAD = 'x-accel')
+}
+
+# Cached header fields of the authenticated user, see insurance_app/authentication.py for all options
+USER_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 5,
+}
+
+# Per-request query and rendering budgets, see insurance_app/profiling.py for all options
+PROFILING = {
+    'QUERY_BUDGET': 30,
+    'DB_TIME_BUDGET': 200,
+    'DURATION_BUDGET': 500,
+    'SERVER_TIMING': 'staff',  # the timings are not sent to the clients
+}
+
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 WSGI_APPLICATION = 'insurance_project.wsgi.application'
@@ -91,13 +118,58 @@ WSGI_APPLICATION = 'insurance_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# The WAL mode, the PRAGMAs, BEGIN IMMEDIATE and the retries of a locked database are configured by the OPTIONS,
+# see insurance_app/sqlite/base.py for all options
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'insurance_app.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000},
+        },
+    },
+    # Local stand-in of a read replica: a copy of the primary database refreshed by 'python manage.py refresh_replica'
+    'replica': {
+        'ENGINE': 'insurance_app.sqlite',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'OPTIONS': {'transaction_mode': 'DEFERRED', 'pragmas': {'query_only': 1}},
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# The heavy read views read from the replica, see insurance_app/routers.py for all options
+DATABASE_ROUTERS = ['insurance_app.routers.ReplicaRouter']
+
+REPLICA = {
+    'ALIAS': 'replica',
+    'STICKY_SECONDS': 60,  # longer than a refresh of the local copy lags behind: REFRESH_INTERVAL + COPY_SECONDS
+    'REFRESH_INTERVAL': 30,
+    'COPY_SECONDS': 10,
+}
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# The 'shared' cache is visible to all worker processes, create its table by 'python manage.py createcachetable'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'insurance_app.cache.DatabaseCache',  # atomic incr() of the login throttle counters
+        'LOCATION': 'shared_cache',
+    },
 }
 
+# Sessions
+# https://docs.djangoproject.com/en/4.1/topics/http/sessions/
+# See insurance_app/session_store.py, expired sessions are deleted by 'python manage.py clearsessions'
+
+SESSION_ENGINE = 'insurance_app.session_store'
+SESSION_LOCAL_CACHE_TTL = 5  # seconds a session is read from the memory of the worker without checking the database
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -138,8 +210,16 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # built by 'python manage.py build_assets'
+STATICFILES_STORAGE = 'insurance_app.assets.AssetStorage'
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'insurance_app.assets.ReferencedAssetsFinder',
+]
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_OFFLOAD = None  # 'x-accel' behind nginx, 'x-sendfile' behind Apache; see insurance_app/media.py
+MEDIA_ACCEL_PREFIX = '/protected-media/'  # internal nginx location with the alias of MEDIA_ROOT
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -153,3 +233,7 @@ MESSAGE_TAGS = {
     messages.WARNING: 'alert-warning',
     messages.ERROR: 'alert-danger',
 }
+
+# Snapshots of the public pages served to anonymous visitors, see insurance_app/prerender.py
+PRERENDER_ROOT = os.path.join(BASE_DIR, 'prerendered')
+PRERENDER_MAX_AGE = 60 * 60  # seconds after which a snapshot is rendered again
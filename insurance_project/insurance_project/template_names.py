@@ -13,3 +13,4 @@ PRODUCT_FORM = 'insurance_app/product_update_form.html'
 EVENT_LIST = 'insurance_app/event_list.html'
 PENDING_EVENT_LIST = 'insurance_app/pending_event_list.html'
 EVENT_DETAIL = 'insurance_app/event_detail.html'
+ANALYTICS = 'insurance_app/analytics.html'
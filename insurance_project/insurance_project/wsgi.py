@@ -1,7 +1,8 @@
 """
 WSGI config for insurance_project project.
 
-It exposes the WSGI callable as a module-level variable named ``application``.
+It exposes the WSGI callable as a module-level variable named ``application``. The worker is warmed up before
+it serves the first request, see insurance_app/warmup.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
@@ -14,3 +15,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'insurance_project.settings')
 
 application = get_wsgi_application()
+
+from insurance_app import warmup  # noqa: E402, the apps are loaded by get_wsgi_application()
+
+warmup.run()